@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from core.tenants import tenant_registry
+from apps.accounts.services.summary_service import rebuild_account_summary
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de comptes (account_summary) depuis les tables de comptes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', action='append', dest='banks', default=[],
+            help="Code de la banque à traiter (répétable). Par défaut : toutes les banques.",
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+        for code in options['banks'] or sorted(tenant_registry.codes()):
+            if tenant_registry.get(code) is None:
+                failures.append(code)
+                self.stderr.write(f"Banque inconnue : {code}")
+                continue
+            try:
+                rows = rebuild_account_summary(code)
+            except DatabaseError as e:
+                failures.append(code)
+                self.stderr.write(f"Échec du recalcul sur {code}: {str(e)}")
+                continue
+            self.stdout.write(self.style.SUCCESS(f"{code}: {rows} compteur(s) recalculé(s)"))
+
+        if failures:
+            raise CommandError(f"Recalcul en échec pour : {', '.join(failures)}")
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_reserved_amount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agencyaccount',
+            index=models.Index(fields=['user', 'status'], name='agencyaccount_usr_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessaccount',
+            index=models.Index(fields=['user', 'status'], name='businessaccount_usr_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='internaccount',
+            index=models.Index(fields=['user', 'status'], name='internaccount_usr_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalaccount',
+            index=models.Index(fields=['user', 'status'], name='personalaccount_usr_st_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_index_pack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_type', models.CharField(max_length=30)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Actif'), ('PENDING', 'En attente'), ('BLOCKED', 'Bloqué'), ('CLOSED', 'Fermé')], max_length=10)),
+                ('created_day', models.DateField()),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('balance_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'db_table': 'account_summary',
+                'constraints': [models.UniqueConstraint(fields=('account_type', 'status', 'created_day', 'shard'), name='account_summary_key_uniq')],
+            },
+        ),
+    ]
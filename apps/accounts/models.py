@@ -1,7 +1,9 @@
 
 from django.db import models
+from django.utils import timezone
 from apps.users.models import User
 import random
+from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class AccountManager(models.Manager):
@@ -25,6 +27,9 @@ class AbstractAccount(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)  
     account_number = models.CharField(max_length=30, unique=True)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Somme des réservations actives (pré-transactions non utilisées) ;
+    # solde disponible = balance - reserved_amount
+    reserved_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -34,9 +39,34 @@ class AbstractAccount(models.Model):
 
     class Meta:
         abstract = True
+        indexes = [
+            # Compte d'un utilisateur par statut (connexion, profils, permissions)
+            models.Index(fields=['user', 'status'], name='%(class)s_usr_st_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type_account} - {self.account_number} - {self.status}"  
+
+    # Champs comptés dans account_summary (voir summary_state)
+    SUMMARY_FIELDS = ('status', 'balance', 'created_at')
+    _summary_state = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État tel que lu en base : les signaux de apps.accounts.signals en
+        # déduisent la variation des compteurs à l'enregistrement suivant
+        if instance.get_deferred_fields().isdisjoint(cls.SUMMARY_FIELDS):
+            instance._summary_state = instance.summary_state()
+        return instance
+
+    def summary_state(self):
+        """(statut, solde, jour de création) tels que comptés dans account_summary"""
+        return self.status, Decimal(self.balance), timezone.localdate(self.created_at)
+
+    @property
+    def available_balance(self):
+        return self.balance - self.reserved_amount
       
     @staticmethod
     def generate_account_number():
@@ -51,7 +81,7 @@ class AbstractAccount(models.Model):
     
 
 class PersonalAccount(AbstractAccount):
-    class Meta:
+    class Meta(AbstractAccount.Meta):
         app_label = 'accounts'
 
 
@@ -60,7 +90,7 @@ class BusinessAccount(AbstractAccount):
     tax_id = models.CharField(max_length=50, null=True, blank=True)
     code = models.CharField(max_length=6, null=True, blank=True, unique=True)
 
-    class Meta:
+    class Meta(AbstractAccount.Meta):
         app_label = 'accounts'
 
 class AgencyAccount(AbstractAccount):
@@ -70,7 +100,7 @@ class AgencyAccount(AbstractAccount):
     deposit_porcentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     retrai_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
 
-    class Meta:
+    class Meta(AbstractAccount.Meta):
         app_label = 'accounts'
 
 class InternAccount(AbstractAccount):
@@ -83,5 +113,35 @@ class InternAccount(AbstractAccount):
 
     purpose = models.CharField(max_length=50, choices=PURPOSE_CHOICES, null=True, blank=True)
 
+    class Meta(AbstractAccount.Meta):
+        app_label = 'accounts'
+
+
+class AccountSummary(models.Model):
+    """
+    Compteurs de comptes par type, statut et jour de création, tenus à jour à
+    la création, au changement de statut et à chaque mouvement de solde. Les
+    statistiques de comptes sont des sommes sur ces quelques lignes au lieu
+    d'agrégats sur les tables de comptes ; recalculables par la commande
+    rebuild_account_summary. Chaque clé est répartie sur
+    ACCOUNT_SUMMARY_SHARDS lignes (shard) pour étaler la contention.
+    """
+    account_type = models.CharField(max_length=30)
+    status = models.CharField(max_length=10, choices=AbstractAccount.STATUS_CHOICES)
+    created_day = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+    balance_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
     class Meta:
-        app_label = 'accounts'
\ No newline at end of file
+        app_label = 'accounts'
+        db_table = 'account_summary'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account_type', 'status', 'created_day', 'shard'],
+                name='account_summary_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.account_type} {self.status} {self.created_day} : {self.count}"
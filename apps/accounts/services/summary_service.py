@@ -0,0 +1,94 @@
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models import AccountSummary, AgencyAccount, BusinessAccount, InternAccount, PersonalAccount
+
+ACCOUNT_MODELS = (PersonalAccount, BusinessAccount, AgencyAccount, InternAccount)
+
+
+def account_type(model):
+    """Valeur de account_summary.account_type d'un modèle (ou d'une instance) de compte"""
+    return model._meta.model_name
+
+
+def apply_summary_deltas(bank_db, deltas):
+    """
+    Ajoute {(account_type, statut, jour de création): [nombre, solde]} aux
+    compteurs : un seul INSERT ... ON CONFLICT DO UPDATE, dans la transaction
+    de l'écriture. Clés triées et shard tiré au hasard, comme pour les
+    agrégats de transactions.
+    """
+    keys = sorted(key for key, (count, balance) in deltas.items() if count or balance)
+    if not keys:
+        return
+
+    shard = random.randrange(settings.ACCOUNT_SUMMARY_SHARDS)
+    connection = connections[bank_db]
+    table = connection.ops.quote_name(AccountSummary._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(keys))
+    params = [
+        value
+        for key in keys
+        for value in (*key, shard, *deltas[key])
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} AS summary (account_type, status, created_day, shard, count, balance_sum) "
+            f"VALUES {values} "
+            f"ON CONFLICT (account_type, status, created_day, shard) DO UPDATE SET "
+            f"count = summary.count + EXCLUDED.count, "
+            f"balance_sum = summary.balance_sum + EXCLUDED.balance_sum",
+            params,
+        )
+
+
+def record_account_change(bank_db, account, previous, current):
+    """
+    Reporte aux compteurs le passage d'un compte de l'état previous à l'état
+    current, chacun (statut, solde, jour de création) ou None (compte absent :
+    création, suppression).
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    name = account_type(account)
+    if previous is not None:
+        status, balance, day = previous
+        deltas[(name, status, day)][0] -= 1
+        deltas[(name, status, day)][1] -= balance
+    if current is not None:
+        status, balance, day = current
+        deltas[(name, status, day)][0] += 1
+        deltas[(name, status, day)][1] += balance
+    apply_summary_deltas(bank_db, deltas)
+
+
+def rebuild_account_summary(bank_db):
+    """
+    Recalcule tous les compteurs depuis les tables de comptes. La table des
+    compteurs est verrouillée en écriture le temps du recalcul : créations et
+    mouvements de solde attendent au lieu d'être comptés deux fois. Retourne
+    le nombre de lignes de compteurs écrites.
+    """
+    connection = connections[bank_db]
+    quote = connection.ops.quote_name
+    summary_table = quote(AccountSummary._meta.db_table)
+    tz_name = timezone.get_current_timezone_name()
+
+    rows = 0
+    with transaction.atomic(using=bank_db), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {summary_table} IN SHARE ROW EXCLUSIVE MODE")
+        AccountSummary.objects.using(bank_db).all().delete()
+        for model in ACCOUNT_MODELS:
+            cursor.execute(
+                f"INSERT INTO {summary_table} (account_type, status, created_day, shard, count, balance_sum) "
+                f"SELECT %s, a.status, (a.created_at AT TIME ZONE %s)::date, 0, COUNT(*), SUM(a.balance) "
+                f"FROM {quote(model._meta.db_table)} a "
+                f"GROUP BY 2, 3",
+                [account_type(model), tz_name],
+            )
+            rows += cursor.rowcount
+    return rows
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .services.summary_service import ACCOUNT_MODELS, record_account_change
+
+
+def load_summary_state(sender, instance, using, **kwargs):
+    """État compté d'un compte existant que l'ORM n'a pas lu (instance construite à la main, champs différés)"""
+    if instance._state.adding or instance._summary_state is not None:
+        return
+    row = sender.objects.using(using).filter(pk=instance.pk).values_list(*sender.SUMMARY_FIELDS).first()
+    if row is not None:
+        instance._summary_state = sender(status=row[0], balance=row[1], created_at=row[2]).summary_state()
+
+
+def count_saved_account(sender, instance, created, using, **kwargs):
+    """Création, changement de statut ou de solde : variation des compteurs"""
+    previous = None if created else instance._summary_state
+    current = instance.summary_state()
+    if previous != current:
+        record_account_change(using, instance, previous, current)
+    instance._summary_state = current
+
+
+def count_deleted_account(sender, instance, using, **kwargs):
+    record_account_change(using, instance, instance._summary_state or instance.summary_state(), None)
+    instance._summary_state = None
+
+
+for model in ACCOUNT_MODELS:
+    pre_save.connect(load_summary_state, sender=model)
+    post_save.connect(count_saved_account, sender=model)
+    post_delete.connect(count_deleted_account, sender=model)
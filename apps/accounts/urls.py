@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import CreateCommissionAccountView,FeeCalculatorAPI
+from .views import CreateCommissionAccountView,FeeCalculatorAPI,FeeQuoteBatchAPI,FeeScheduleAPI
 
 urlpatterns = [
     path('create-commission/', CreateCommissionAccountView.as_view(), name='create-commission-account'),
     path('calculate_fee/', FeeCalculatorAPI.as_view(), name='calculate_fee'),
+    path('calculate_fee/batch/', FeeQuoteBatchAPI.as_view(), name='calculate_fee_batch'),
+    path('fee-schedule/', FeeScheduleAPI.as_view(), name='fee_schedule'),
 ]
\ No newline at end of file
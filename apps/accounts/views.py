@@ -2,7 +2,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import  status
 from .serializer import InternalAccountSerializer
-from apps.transactions.models import FeeRule
+from apps.transactions.services.fee_schedule import fee_schedules, to_decimal
 
 class CreateCommissionAccountView(APIView):
     def post(self, request, *args, **kwargs):
@@ -14,15 +14,9 @@ class CreateCommissionAccountView(APIView):
 
 class FeeCalculatorAPI(APIView):
     def get_fee_from_db(self,bank_db, transaction_type, amount):
-      rules = FeeRule.objects.using(bank_db).filter(
-        transaction_type=transaction_type
-       ).order_by('max_amount')
+        """Frais en Decimal depuis le barème compilé en mémoire, ou None"""
+        return fee_schedules.fee_for(bank_db, transaction_type, amount)
 
-      for rule in rules:
-        if amount <= rule.max_amount:
-            return float(rule.fee_amount)
-
-      return None 
     def post(self, request):
         #bank_db = getattr(request, 'bank_db')  
         bank_db = request.source_bank_db
@@ -33,7 +27,7 @@ class FeeCalculatorAPI(APIView):
             return Response({'error': 'Paramètres manquants.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            amount = float(amount)
+            amount = to_decimal(amount)
         except ValueError:
             return Response({'error': 'Format du montant invalide.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -43,4 +37,83 @@ class FeeCalculatorAPI(APIView):
             return Response({'fee': fee}, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Aucune règle de frais trouvée.'}, status=status.HTTP_404_NOT_FOUND)
-    
\ No newline at end of file
+
+
+class FeeQuoteBatchAPI(APIView):
+    """
+    Calcule les frais de plusieurs (type, montant) en une seule requête :
+    {"items": [{"type": "transfer", "montant": "1500"}, ...]}
+    """
+    MAX_ITEMS = 200
+
+    def post(self, request):
+        bank_db = request.source_bank_db
+        items = request.data.get('items')
+
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Paramètres manquants.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.MAX_ITEMS:
+            return Response(
+                {'error': f'{self.MAX_ITEMS} éléments au maximum par requête.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        schedule = fee_schedules.get(bank_db)
+        quotes = []
+        for item in items:
+            transaction_type = item.get('type') if isinstance(item, dict) else None
+            amount = item.get('montant') if isinstance(item, dict) else None
+            quote = {'type': transaction_type, 'montant': amount, 'fee': None}
+            if not transaction_type or amount in (None, ''):
+                quote['error'] = 'Paramètres manquants.'
+            else:
+                try:
+                    quote['fee'] = schedule.fee_for(transaction_type, to_decimal(amount))
+                    if quote['fee'] is None:
+                        quote['error'] = 'Aucune règle de frais trouvée.'
+                except ValueError:
+                    quote['error'] = 'Format du montant invalide.'
+            quotes.append(quote)
+
+        return Response({'version': schedule.etag, 'quotes': quotes}, status=status.HTTP_200_OK)
+
+
+class FeeScheduleAPI(APIView):
+    """
+    Barème de frais publié pour calcul local côté client : le frais d'un montant
+    est celui de la première règle (triée par max_amount) telle que
+    montant <= max_amount. Réponse 304 tant que If-None-Match correspond à l'ETag.
+    """
+
+    @staticmethod
+    def _matches(if_none_match, etag):
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(',')]
+        return '*' in candidates or any(
+            candidate.removeprefix('W/') == etag for candidate in candidates
+        )
+
+    def get(self, request):
+        schedule = fee_schedules.get(request.source_bank_db)
+        etag = f'"{schedule.etag}"'
+
+        if self._matches(request.headers.get('If-None-Match'), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                'version': schedule.etag,
+                'rules': {
+                    transaction_type: [
+                        {'max_amount': str(max_amount), 'fee_amount': str(fee_amount)}
+                        for max_amount, fee_amount in rules
+                    ]
+                    for transaction_type, rules in schedule.rules().items()
+                },
+            }, status=status.HTTP_200_OK)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Vary'] = 'Authorization, X-Source-Bank-Code'
+        return response
+
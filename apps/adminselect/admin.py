@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django import forms
 from django.http import HttpResponseRedirect
-from apps.banks.models import Bank
+from core.tenants import tenant_registry
 from django.utils.html import format_html
 from .models import  AdminBankSelector
 from django.middleware.csrf import get_token
@@ -29,7 +29,7 @@ class AdminBankSelectorAdmin(admin.ModelAdmin):
         csrf_token = get_token(request)
 
         bank_options = "".join(
-            f'<option value="{b.code}">{b.name}</option>' for b in Bank.objects.all()
+            f'<option value="{b.code}">{b.name}</option>' for b in tenant_registry.all()
         )
 
         form_html = format_html("""
@@ -1,6 +1,7 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken
 from django.contrib.auth import get_user_model
+from core.tenants import resolve_bank
 
 User = get_user_model()
 
@@ -20,6 +21,10 @@ class MultiDatabaseJWTAuthentication(JWTAuthentication):
             if not user_id:
                 raise InvalidToken('Token ne contient pas user_id')
             
+            # Vérifier la banque via le registre en mémoire (sans requête SQL)
+            if bank_db != 'default' and resolve_bank(bank_db) is None:
+                raise InvalidToken('Banque inconnue')
+            
             # Récupérer l'utilisateur depuis la bonne DB
             user = User.objects.using(bank_db).get(id=user_id)
             
@@ -99,4 +99,19 @@ class ApiAccessPermission(permissions.BasePermission):
     #     ).exists()
     
     def has_object_permission(self, request, view, obj):
-        return self.has_permission(request, view)
\ No newline at end of file
+        return self.has_permission(request, view)
+
+
+class PlatformAdminPermission(permissions.BasePermission):
+    """
+    Vues de la plateforme (toutes banques confondues) : réservées aux
+    superutilisateurs de la base de la plateforme. Le jeton doit avoir été
+    émis pour la base 'default' : un superutilisateur d'une banque n'administre
+    que sa banque.
+    """
+
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated and request.user.is_superuser):
+            return False
+        token = request.auth
+        return token is not None and token.get('bank_db') == 'default'
@@ -1,10 +1,11 @@
 # serializers.py
+from django.db import models
 from rest_framework import serializers
 
 from apps.transactions.models import Transaction
 from ..accounts.models import PersonalAccount, BusinessAccount, AgencyAccount, InternAccount
 from apps.users.models import User
-from django.contrib.contenttypes.models import ContentType
+from core.content_types import content_type_map
 
 class UserBasicSerializer(serializers.ModelSerializer):
     
@@ -188,11 +189,36 @@ class InternAccountListSerializer(serializers.ModelSerializer):
         model = InternAccount
         fields = ['id', 'account_number', 'balance', 'status', 'purpose', 'purpose_label', 'created_at']
         
-class SimpleAccountSerializer(serializers.Serializer):
-    """Serializer simplifié pour les comptes dans les transactions"""
-    account_number = serializers.CharField(read_only=True)
-    username = serializers.CharField(read_only=True, allow_null=True)
-    phone_number = serializers.CharField(read_only=True, allow_null=True)
+# Modèles de comptes référencés par les transactions (ContentType.model -> modèle)
+ACCOUNT_MODELS = {
+    'personalaccount': PersonalAccount,
+    'internaccount': InternAccount,
+    'businessaccount': BusinessAccount,
+    'agencyaccount': AgencyAccount,
+}
+
+
+def _account_placeholder(account_number, error=None):
+    details = {'account_number': account_number, 'username': None, 'phone_number': None}
+    if error:
+        details['error'] = error
+    return details
+
+
+class TransactionAccountsListSerializer(serializers.ListSerializer):
+    """
+    Résout les comptes de toute la page en une fois avant de sérialiser les
+    lignes : nombre de requêtes constant quelle que soit la taille de la page.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        transactions = list(iterable)
+        self.child.prefetched_accounts = self.child.resolve_accounts(transactions)
+        try:
+            return [self.child.to_representation(item) for item in transactions]
+        finally:
+            self.child.prefetched_accounts = None
 
 
 class TransactionListSerializer(serializers.ModelSerializer):
@@ -208,75 +234,81 @@ class TransactionListSerializer(serializers.ModelSerializer):
             'id', 'type', 'date', 'status', 'amount',
             'source_account', 'destination_account'
         ]
+        list_serializer_class = TransactionAccountsListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefetched_accounts = None
+        self._accounts = {}
+
+    def resolve_accounts(self, transactions):
+        """
+        Détails des comptes source et destination d'un lot de transactions :
+        ContentType lus dans la table de la banque (core.content_types), puis
+        une requête par modèle de compte avec l'utilisateur joint. Retourne {(content_type_id, account_id): détails}.
+        """
+        bank_db = self.context.get('bank_db', 'default')
+        wanted = {}
+        for transaction in transactions:
+            for content_type_id, account_id in (
+                (transaction.source_account_type_id, transaction.source_account_id),
+                (transaction.destination_account_type_id, transaction.destination_account_id),
+            ):
+                if content_type_id and account_id:
+                    wanted.setdefault(content_type_id, set()).add(account_id)
+        if not wanted:
+            return {}
+
+        accounts = {}
+        for content_type_id, account_ids in wanted.items():
+            content_type = content_type_map.get_by_id(bank_db, content_type_id)
+            if content_type is None:
+                error = f'ContentType ID {content_type_id} introuvable'
+                for account_id in account_ids:
+                    accounts[(content_type_id, account_id)] = _account_placeholder('CONTENTTYPE INTROUVABLE', error)
+                continue
+
+            model_class = ACCOUNT_MODELS.get(content_type.model)
+            if model_class is None:
+                error = f'Model: {content_type.model} non supporté'
+                for account_id in account_ids:
+                    accounts[(content_type_id, account_id)] = _account_placeholder('MODELE INTROUVABLE', error)
+                continue
+
+            rows = model_class.objects.using(bank_db).filter(id__in=account_ids).values_list(
+                'id', 'account_number', 'user__username', 'user__phone_number'
+            )
+            for account_id, account_number, username, phone_number in rows:
+                # Les comptes internes n'exposent pas d'utilisateur
+                if model_class is InternAccount:
+                    username = phone_number = None
+                accounts[(content_type_id, account_id)] = {
+                    'account_number': account_number,
+                    'username': username,
+                    'phone_number': phone_number,
+                }
+            for account_id in account_ids:
+                accounts.setdefault((content_type_id, account_id), _account_placeholder(
+                    'ERREUR',
+                    f'ContentType ID: {content_type_id}, Account ID: {account_id}, Erreur: compte introuvable',
+                ))
+        return accounts
+
+    def to_representation(self, instance):
+        # Hors liste (une seule transaction), les comptes sont résolus pour elle seule
+        if self.prefetched_accounts is not None:
+            self._accounts = self.prefetched_accounts
+        else:
+            self._accounts = self.resolve_accounts([instance])
+        return super().to_representation(instance)
 
     def get_account_details(self, content_type_id_mod, account_id):
-        """Méthode pour récupérer les détails d’un compte à partir des IDs"""
+        """Détails d'un compte, lus dans les comptes résolus pour la page"""
         if not content_type_id_mod or not account_id:
-            return {
-                'account_number': 'DONNEES MANQUANTES',
-                'username': None,
-                'phone_number': None,
-                'error': f'ContentType ID: {content_type_id_mod}, Account ID: {account_id}'
-            }
-
-        try:
-            bank_db = self.context.get('bank_db', 'default')
-            content_type_mod = ContentType.objects.using(bank_db).get(id=content_type_id_mod)
-             # Import des modèles
-            from apps.accounts.models import PersonalAccount, InternAccount, BusinessAccount, AgencyAccount
-
-            model_mapping = {
-                'personalaccount': PersonalAccount,
-                'internaccount': InternAccount,
-                'businessaccount': BusinessAccount,
-                'agencyaccount': AgencyAccount,
-            }
-
-            model_name = content_type_mod.model.lower()
-            model_class = model_mapping.get(model_name)
-
-            if not model_class:
-                return {
-                    'account_number': 'MODELE INTROUVABLE',
-                    'username': None,
-                    'phone_number': None,
-                    'error': f'Model: {content_type_mod.model} non supporté'
-                }
-
-            account_obj = model_class.objects.using(bank_db).get(id=account_id)
-
-            if model_name == 'internaccount':
-                return {
-                    'account_number': account_obj.account_number,
-                    'username': None,
-                    'phone_number': None
-                }
-
-            account_obj = model_class.objects.using(bank_db).select_related('user').get(id=account_id)
-
-            account_data = {
-                'account_number': account_obj.account_number,
-                'username': account_obj.user.username if account_obj.user else None,
-                'phone_number': account_obj.user.phone_number if account_obj.user else None
-            }
-
-            serializer = SimpleAccountSerializer(account_data)
-            return serializer.data
-
-        except ContentType.DoesNotExist:
-            return {
-                'account_number': 'CONTENTTYPE INTROUVABLE',
-                'username': None,
-                'phone_number': None,
-                'error': f'ContentType ID {content_type_id_mod} introuvable'
-            }
-        except Exception as e:
-            return {
-                'account_number': 'ERREUR',
-                'username': None,
-                'phone_number': None,
-                'error': f'ContentType ID: {content_type_id_mod}, Account ID: {account_id}, Erreur: {str(e)}'
-            }
+            return _account_placeholder(
+                'DONNEES MANQUANTES', f'ContentType ID: {content_type_id_mod}, Account ID: {account_id}'
+            )
+        return self._accounts[(content_type_id_mod, account_id)]
 
     def get_source_account(self, obj):
         return self.get_account_details(obj.source_account_type_id, obj.source_account_id)
@@ -29,6 +29,7 @@ urlpatterns = [
     path("api/accounts/busniss/register/with-user/", views.RegisterBusnissWithUserView.as_view(), name='create-busniss-with-user-accounts'),
     path("api/internalaccounts/create/", views.InternAccountCreateView.as_view(), name='create-internal-accounts'),
     path("api/transactions/", views.TransactionListView.as_view(), name='list-transactions'),
+    path('api/platform/overview/', views.PlatformOverviewView.as_view(), name='platform-overview'),
     path('api/', include(router.urls)),
     path('api/users/<int:pk>/update-phone/', views.UpdatePhoneNumberView.as_view(), name='update-phone'),
     path('api/accounts/<int:account_id>/statement/',views.AccountStatementView.as_view(),name='account-statement'),
@@ -2,21 +2,26 @@ import re
 from rest_framework import viewsets, status, filters,generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from apps.accounts.models import  InternAccount, PersonalAccount, BusinessAccount, AgencyAccount
+from apps.accounts.models import  AccountSummary, InternAccount, PersonalAccount, BusinessAccount, AgencyAccount
+from apps.accounts.services.summary_service import ACCOUNT_MODELS, account_type
 from apps.adminselect.authentication import MultiDatabaseJWTAuthentication
 from apps.adminselect.paginations import CustomPageNumberPagination
-from apps.adminselect.permissions import ApiAccessPermission
+from apps.adminselect.permissions import ApiAccessPermission, PlatformAdminPermission
 from apps.adminselect.serializers import CustomRefreshToken, DashboardLoginSerializer, FeeRuleSerializer
 from django.db import models
 from .serializer import AgencyAccountListSerializer, AgencyAccountSerializer, BusinessAccountListSerializer, BusinessAccountSerializer, ClientAccountListSerializer, InternAccountListSerializer, InternAccountSerializer, TransactionListSerializer
-from apps.transactions.models import Fee, FeeRule, PaymentRequest, PreTransaction, Transaction
+from apps.transactions.models import DailyTransactionRollup, Fee, FeeRule, PaymentRequest, PreTransaction, Transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Sum, Count,Avg
+from django.db.models import Q, Sum, Count,Avg, Case, When
 from django.utils import timezone
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from django.contrib.contenttypes.models import ContentType
-from django.db.models.functions import TruncMonth
+from core.dates import day_range, day_start, to_date
+from core.response_cache import response_cache
+from core.tenant_fanout import fan_out, statement_timeout
+from core.tenants import tenant_registry
+from django.conf import settings
+from django.db.models.functions import TruncDate, TruncMonth
 
 from apps.users.models import User
 from django.core.exceptions import ObjectDoesNotExist
@@ -225,6 +230,25 @@ class BaseAccountListViewWithStats(generics.ListAPIView):
         # Sinon, comportement normal
         return super().list(request, *args, **kwargs)
     
+    # Paramètres sans effet sur les comptes comptés (pagination, tri)
+    STATISTICS_IGNORED_PARAMS = {'action', 'page', 'page_size', 'ordering'}
+    # Filtre de get_queryset() reproduit sur les compteurs (account_summary)
+    summary_filter = {}
+
+    def get_summary(self, request):
+        """
+        Compteurs du type de compte équivalents à la liste filtrée, ou None si
+        un paramètre (recherche, filtre autre que le statut) ne s'y reproduit pas
+        """
+        params = {key for key, value in request.query_params.items() if value} - self.STATISTICS_IGNORED_PARAMS
+        if params - {'status'}:
+            return None
+        bank_db = getattr(request, 'source_bank_db', 'default')
+        summary = AccountSummary.objects.using(bank_db).filter(account_type=account_type(self.model), **self.summary_filter)
+        if 'status' in params:
+            summary = summary.filter(status=request.query_params['status'])
+        return summary
+
     def get_statistics(self, request):
         """Statistiques des comptes"""
         queryset = self.get_queryset()
@@ -232,19 +256,28 @@ class BaseAccountListViewWithStats(generics.ListAPIView):
         # Appliquer les mêmes filtres que pour la liste
         queryset = self.filter_queryset(queryset)
         
-        # Par statut
-        by_status = queryset.values('status').annotate(
-            count=Count('id'),
-            total_balance=Sum('balance')
-        )
-        
-        # Comptes récents
+        # Par statut, avec les comptes créés depuis un mois : compteurs si
+        # possible, sinon une seule agrégation sur la table de comptes
         last_month = timezone.now() - timedelta(days=30)
-        new_accounts = queryset.filter(created_at__gte=last_month).count()
+        summary = self.get_summary(request)
+        if summary is not None:
+            # count en dernier : l'annotation masque ensuite la colonne du même nom
+            by_status = list(summary.values('status').annotate(
+                total_balance=Sum('balance_sum'),
+                recent=Sum('count', filter=Q(created_day__gte=timezone.localdate(last_month))),
+                count=Sum('count'),
+            ).filter(count__gt=0).order_by('status'))
+        else:
+            by_status = list(queryset.order_by().values('status').annotate(
+                count=Count('id'),
+                total_balance=Sum('balance'),
+                recent=Count('id', filter=Q(created_at__gte=last_month)),
+            ).order_by('status'))
+        new_accounts = sum(row.pop('recent') or 0 for row in by_status)
         
         # Balance moyenne
-        total_count = queryset.count()
-        total_balance = queryset.aggregate(Sum('balance'))['balance__sum'] or 0
+        total_count = sum(row['count'] for row in by_status)
+        total_balance = sum(row['total_balance'] or 0 for row in by_status)
         average_balance = (total_balance / total_count) if total_count > 0 else 0
         
         response_data = {
@@ -252,16 +285,16 @@ class BaseAccountListViewWithStats(generics.ListAPIView):
             'total_accounts': total_count,
             'total_balance': float(total_balance),
             'average_balance': float(average_balance),
-            'by_status': list(by_status),
+            'by_status': by_status,
             'new_accounts_last_month': new_accounts
         }
         
         # Ajouter des stats spécifiques selon le type de compte
-        response_data.update(self.get_specific_statistics(queryset))
+        response_data.update(self.get_specific_statistics(queryset, total_count))
         
         return Response(response_data)
     
-    def get_specific_statistics(self, queryset):
+    def get_specific_statistics(self, queryset, total_count):
         """Méthode à override pour des statistiques spécifiques par type de compte"""
         return {}
 
@@ -290,17 +323,17 @@ class InternAccountListView(BaseAccountListViewWithStats, generics.CreateAPIView
     def perform_create(self, serializer):
         serializer.save()
     
-    def get_specific_statistics(self, queryset):
+    def get_specific_statistics(self, queryset, total_count):
         """Statistiques spécifiques aux comptes internes"""
         # Par objectif/purpose
-        by_purpose = queryset.values('purpose').annotate(
+        by_purpose = list(queryset.order_by().values('purpose').annotate(
             count=Count('id'),
             total_balance=Sum('balance')
-        )
+        ))
         
         return {
-            'by_purpose': list(by_purpose),
-            'purposes_count': queryset.values('purpose').distinct().count()
+            'by_purpose': by_purpose,
+            'purposes_count': len(by_purpose)
         }
 
 
@@ -311,11 +344,11 @@ class ClientAccountListView(BaseAccountListViewWithStats):
     model = PersonalAccount
     search_fields = ['account_number', 'user__email', 'user__phone_number']
     
-    def get_specific_statistics(self, queryset):
+    def get_specific_statistics(self, queryset, total_count):
         """Statistiques spécifiques aux comptes personnels"""
         # Comptes avec/sans utilisateur
         with_user = queryset.filter(user__isnull=False).count()
-        without_user = queryset.filter(user__isnull=True).count()
+        without_user = max(total_count - with_user, 0)
         
         # Top balances
         top_balances = queryset.order_by('-balance')[:5].values(
@@ -375,6 +408,8 @@ class ClientAccountNonValiderListView(BaseAccountListViewWithStats):
     model = PersonalAccount
     search_fields = ['account_number', 'user__email', 'user__phone_number']
 
+    summary_filter = {'status': 'PENDING'}
+
     def get_queryset(self):
         bank_db = getattr(self.request, 'source_bank_db', 'default')
         return PersonalAccount.objects.using(bank_db).filter(status='PENDING')
@@ -431,18 +466,19 @@ class AgencyAccountListCreateView(BaseAccountListViewWithStats, generics.CreateA
     def perform_create(self, serializer):
         serializer.save()
 
-    def get_specific_statistics(self, queryset):
+    def get_specific_statistics(self, queryset, total_count):
         """Statistiques spécifiques aux comptes d'agence"""
-        avg_deposit = queryset.aggregate(avg_deposit=Avg('deposit_porcentage'))['avg_deposit'] or 0
-        avg_retrait = queryset.aggregate(avg_retrait=Avg('retrai_percentage'))['avg_retrait'] or 0
-        with_code = queryset.filter(code__isnull=False).count()
-        without_code = queryset.filter(code__isnull=True).count()
+        stats = queryset.aggregate(
+            avg_deposit=Avg('deposit_porcentage'),
+            avg_retrait=Avg('retrai_percentage'),
+            with_code=Count('id', filter=Q(code__isnull=False)),
+        )
 
         return {
-            'average_deposit_percentage': float(avg_deposit),
-            'average_retrait_percentage': float(avg_retrait),
-            'accounts_with_code': with_code,
-            'accounts_without_code': without_code,
+            'average_deposit_percentage': float(stats['avg_deposit'] or 0),
+            'average_retrait_percentage': float(stats['avg_retrait'] or 0),
+            'accounts_with_code': stats['with_code'],
+            'accounts_without_code': max(total_count - stats['with_code'], 0),
         }
 
 class BlockUnblockAgencyAccountView(APIView):
@@ -543,24 +579,25 @@ class BusinessAccountListCreateView(BaseAccountListViewWithStats, generics.Creat
     def perform_create(self, serializer):
         serializer.save()
 
-    def get_specific_statistics(self, queryset):
+    def get_specific_statistics(self, queryset, total_count):
         """Statistiques spécifiques aux comptes business"""
-        with_registration = queryset.filter(registration_number__isnull=False).count()
-        with_tax_id = queryset.filter(tax_id__isnull=False).count()
-        with_code = queryset.filter(code__isnull=False).count()
-
-        complete_accounts = queryset.filter(
-            registration_number__isnull=False,
-            tax_id__isnull=False,
-            code__isnull=False
-        ).count()
+        with_registration = Q(registration_number__isnull=False)
+        with_tax_id = Q(tax_id__isnull=False)
+        with_code = Q(code__isnull=False)
+        stats = queryset.aggregate(
+            with_registration=Count('id', filter=with_registration),
+            with_tax_id=Count('id', filter=with_tax_id),
+            with_code=Count('id', filter=with_code),
+            complete=Count('id', filter=with_registration & with_tax_id & with_code),
+        )
+        complete_accounts = stats['complete']
 
         return {
-            'accounts_with_registration': with_registration,
-            'accounts_with_tax_id': with_tax_id,
-            'accounts_with_code': with_code,
+            'accounts_with_registration': stats['with_registration'],
+            'accounts_with_tax_id': stats['with_tax_id'],
+            'accounts_with_code': stats['with_code'],
             'complete_accounts': complete_accounts,
-            'completion_rate': round((complete_accounts / queryset.count() * 100), 2) if queryset.count() > 0 else 0
+            'completion_rate': round((complete_accounts / total_count * 100), 2) if total_count > 0 else 0
         }
 class BlockUnblockBusinessAccountView(APIView):
     permission_classes = [ApiAccessPermission]
@@ -783,25 +820,69 @@ class TransactionListView(generics.ListAPIView):
             return self.get_statistics(request)
         return super().list(request, *args, **kwargs)
 
-    def get_statistics(self, request):
-        queryset = self.get_queryset()
-        queryset = self.filter_queryset(queryset)
+    # Paramètres sans effet sur les statistiques (pagination, action)
+    STATISTICS_IGNORED_PARAMS = {'action', 'page', 'page_size'}
 
-        last_week = timezone.now() - timedelta(days=7)
-
-        total_transactions = queryset.count()
-        total_amount = queryset.aggregate(Sum('amount'))['amount__sum'] or 0
-        recent_transactions = queryset.filter(date__gte=last_week).count()
+    def get_statistics(self, request):
+        """Statistiques en cache par banque et par filtre (core.response_cache)"""
+        bank_db = getattr(request, 'source_bank_db', 'default')
+        params = [
+            (key, value) for key, values in request.query_params.lists()
+            if key not in self.STATISTICS_IGNORED_PARAMS for value in values
+        ]
+        queryset = self.filter_queryset(self.get_queryset())
+        data = response_cache.get_or_compute(
+            'transaction-statistics', bank_db, lambda: self.compute_statistics(queryset), params=params,
+        )
+        return Response(data)
 
-        by_type = list(queryset.values('type').annotate(
+    def compute_statistics(self, queryset):
+        """
+        Deux requêtes : un agrégat groupé par (type, statut, jour des 7 derniers
+        jours) avec comptages conditionnels, dont on dérive totaux, répartitions
+        et évolution quotidienne ; puis les 5 plus gros montants.
+        """
+        now = timezone.now()
+        last_week = now - timedelta(days=7)
+        today = timezone.localdate(now)
+        first_day = today - timedelta(days=6)
+
+        queryset = queryset.order_by()
+        groups = list(queryset.values(
+            'type', 'status',
+            day=Case(
+                When(date__gte=day_start(first_day), then=TruncDate('date')),
+                default=None,
+                output_field=models.DateField(),
+            ),
+        ).annotate(
             count=Count('id'),
-            total_amount=Sum('amount')
-        ).order_by('-total_amount'))
+            total_amount=Sum('amount'),
+            recent=Count('id', filter=Q(date__gte=last_week)),
+        ))
 
-        by_status = list(queryset.values('status').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        ).order_by('-total_amount'))
+        total_transactions = 0
+        total_amount = 0
+        recent_transactions = 0
+        success_count = 0
+        by_type = {}
+        by_status = {}
+        by_day = {}
+        for group in groups:
+            amount = group['total_amount'] or 0
+            total_transactions += group['count']
+            total_amount += amount
+            recent_transactions += group['recent']
+            if group['status'] == 'success':
+                success_count += group['count']
+            for key, buckets in (('type', by_type), ('status', by_status)):
+                bucket = buckets.setdefault(group[key], {key: group[key], 'count': 0, 'total_amount': 0})
+                bucket['count'] += group['count']
+                bucket['total_amount'] += amount
+            if group['day'] is not None:
+                day = by_day.setdefault(group['day'], {'count': 0, 'total_amount': 0})
+                day['count'] += group['count']
+                day['total_amount'] += amount
 
         top_amounts = list(queryset.order_by('-amount')[:5].values(
             'id', 'amount', 'type', 'status', 'date'
@@ -809,33 +890,30 @@ class TransactionListView(generics.ListAPIView):
 
         daily_stats = []
         for i in range(7):
-            date = timezone.now().date() - timedelta(days=i)
-            day_stats = queryset.filter(date__date=date).aggregate(
-                count=Count('id'),
-                total_amount=Sum('amount')
-            )
+            date = today - timedelta(days=i)
+            day = by_day.get(date, {'count': 0, 'total_amount': 0})
             daily_stats.append({
                 'date': date.isoformat(),
-                'count': day_stats['count'] or 0,
-                'total_amount': day_stats['total_amount'] or 0
+                'count': day['count'],
+                'total_amount': day['total_amount']
             })
 
         average_amount = total_amount / total_transactions if total_transactions > 0 else 0
 
-        return Response({
+        return {
             'total_transactions': total_transactions,
             'total_amount': float(total_amount),
             'average_amount': round(average_amount, 2),
             'recent_transactions': recent_transactions,
-            'by_type': by_type,
-            'by_status': by_status,
+            'by_type': sorted(by_type.values(), key=lambda item: item['total_amount'], reverse=True),
+            'by_status': sorted(by_status.values(), key=lambda item: item['total_amount'], reverse=True),
             'top_amounts': top_amounts,
             'daily_evolution': daily_stats,
             'success_rate': round(
-                (queryset.filter(status='success').count() / total_transactions * 100)
+                (success_count / total_transactions * 100)
                 if total_transactions > 0 else 0, 2
             )
-        })
+        }
 
     
     
@@ -891,8 +969,17 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
     # authentication_classes = [MultiDatabaseJWTAuthentication]
     
     def get_all_accounts_data(self, db, queryset_filter=None):
-        """Helper pour récupérer les données de tous les types de comptes"""
-        account_models = [PersonalAccount, BusinessAccount, AgencyAccount, InternAccount]
+        """Helper pour récupérer les données de tous les types de comptes (compteurs account_summary)"""
+        summary = AccountSummary.objects.using(db).filter(**(queryset_filter or {}))
+        by_account_type = {
+            row['account_type']: row
+            for row in summary.values('account_type').annotate(
+                active=Sum('count', filter=Q(status='ACTIVE')),
+                pending=Sum('count', filter=Q(status='PENDING')),
+                balance=Sum('balance_sum'),
+                count=Sum('count'),
+            )
+        }
         
         total_count = 0
         active_count = 0
@@ -900,35 +987,24 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
         total_balance = 0
         accounts_by_type = []
         
-        for model in account_models:
-            model_name = model.__name__
-            
-            # Queryset de base
-            qs = model.objects.using(db)
-            
-            # Appliquer les filtres si fournis
-            if queryset_filter:
-                qs = qs.filter(**queryset_filter)
-            
-            # Compter les comptes
-            model_total = qs.count()
-            model_active = qs.filter(status='ACTIVE').count()
-            model_pending = qs.filter(status='PENDING').count()
-            model_balance = qs.aggregate(Sum('balance'))['balance__sum'] or 0
+        for model in ACCOUNT_MODELS:
+            row = by_account_type.get(account_type(model))
+            if not row or not row['count']:  # Seulement si il y a des comptes
+                continue
+            model_balance = row['balance'] or 0
             
             # Ajouter aux totaux
-            total_count += model_total
-            active_count += model_active
-            pending_count += model_pending
+            total_count += row['count']
+            active_count += row['active'] or 0
+            pending_count += row['pending'] or 0
             total_balance += model_balance
             
             # Ajouter aux stats par type
-            if model_total > 0:  # Seulement si il y a des comptes
-                accounts_by_type.append({
-                    'type': model_name,
-                    'count': model_total,
-                    'total_balance': float(model_balance)
-                })
+            accounts_by_type.append({
+                'type': model.__name__,
+                'count': row['count'],
+                'total_balance': float(model_balance)
+            })
         
         return {
             'total_count': total_count,
@@ -939,61 +1015,19 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
         }
     
     def get_accounts_by_status(self, db, queryset_filter=None):
-        """Helper pour récupérer les comptes par statut"""
-        account_models = [PersonalAccount, BusinessAccount, AgencyAccount, InternAccount]
-        
-        status_counts = {}
-        
-        for model in account_models:
-            qs = model.objects.using(db)
-            
-            if queryset_filter:
-                qs = qs.filter(**queryset_filter)
-            
-            # Compter par statut pour ce modèle
-            model_status_counts = qs.values('status').annotate(count=Count('id'))
-            
-            for item in model_status_counts:
-                status = item['status']
-                count = item['count']
-                
-                if status in status_counts:
-                    status_counts[status] += count
-                else:
-                    status_counts[status] = count
-        
-        # Convertir en format attendu
-        return [{'status': k, 'count': v} for k, v in status_counts.items()]
+        """Helper pour récupérer les comptes par statut, tous types confondus"""
+        summary = AccountSummary.objects.using(db).filter(**(queryset_filter or {}))
+        return list(summary.values('status').annotate(
+            count=Sum('count')
+        ).filter(count__gt=0).order_by('status'))
     
     def get_daily_account_creation(self, db, queryset_filter=None):
         """Helper pour l'évolution quotidienne des créations de comptes"""
-        account_models = [PersonalAccount, BusinessAccount, AgencyAccount, InternAccount]
-        
-        daily_data = {}
-        
-        for model in account_models:
-            qs = model.objects.using(db)
-            
-            if queryset_filter:
-                qs = qs.filter(**queryset_filter)
-            
-            # Grouper par jour pour ce modèle
-            model_daily = qs.extra(
-                select={'day': 'date(created_at)'}
-            ).values('day').annotate(count=Count('id'))
-            
-            for item in model_daily:
-                day = item['day']
-                count = item['count']
-                
-                if day in daily_data:
-                    daily_data[day] += count
-                else:
-                    daily_data[day] = count
-        
-        # Convertir en format attendu et trier par jour
-        result = [{'day': k, 'count': v} for k, v in daily_data.items()]
-        return sorted(result, key=lambda x: x['day'])
+        summary = AccountSummary.objects.using(db).filter(**(queryset_filter or {}))
+        daily = summary.values('created_day').annotate(
+            count=Sum('count')
+        ).filter(count__gt=0).order_by('created_day')
+        return [{'day': row['created_day'], 'count': row['count']} for row in daily]
     
     @action(detail=False, methods=['get'])
     def overview(self, request):
@@ -1008,58 +1042,40 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
         #     )
         
         db = self.get_database()
-        
+        data = response_cache.get_or_compute('dashboard-overview', db, lambda: self.compute_overview(db))
+        return Response(data)
+
+    def compute_overview(self, db):
+        """Données de la vue d'ensemble (mises en cache par overview)"""
         # Données générales
         today = timezone.now().date()
         last_7_days = today - timedelta(days=7)
         last_30_days = today - timedelta(days=30)
         
-        # Transactions
-        total_transactions = Transaction.objects.using(db).count()
-        transactions_today = Transaction.objects.using(db).filter(date__date=today).count()
-        transactions_7_days = Transaction.objects.using(db).filter(date__date__gte=last_7_days).count()
+        # Transactions, volumes et frais : agrégats quotidiens (une requête sur
+        # quelques centaines de lignes au lieu du grand livre)
+        success = Q(status='success')
+        totals = DailyTransactionRollup.objects.using(db).aggregate(
+            total_transactions=Sum('count'),
+            transactions_today=Sum('count', filter=Q(day__gte=today)),
+            transactions_7_days=Sum('count', filter=Q(day__gte=last_7_days)),
+            total_volume=Sum('amount_sum', filter=success),
+            volume_7_days=Sum('amount_sum', filter=success & Q(day__gte=last_7_days)),
+            total_fees=Sum('fee_sum', filter=success),
+            fees_7_days=Sum('fee_sum', filter=success & Q(day__gte=last_7_days)),
+        )
+        total_transactions = totals['total_transactions'] or 0
+        transactions_today = totals['transactions_today'] or 0
+        transactions_7_days = totals['transactions_7_days'] or 0
+        total_volume = totals['total_volume'] or 0
+        volume_7_days = totals['volume_7_days'] or 0
+        total_fees = totals['total_fees'] or 0
+        fees_7_days = totals['fees_7_days'] or 0
         
         # Comptes - utiliser la nouvelle méthode
         accounts_data = self.get_all_accounts_data(db)
         
-        # Montants
-        total_volume = Transaction.objects.using(db).filter(
-            status='success'
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        volume_7_days = Transaction.objects.using(db).filter(
-            date__date__gte=last_7_days,
-            status='success'
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        # Frais - adapter selon votre modèle Fee si il existe
-        try:
-            intern_type = ContentType.objects.using(db).get(pk=18)  # get, pas filter
-            intern_compt = InternAccount.objects.using(db).get(purpose='commission')  # get, pas filter
-
-            # print(f"Intern account type: {intern_type.id}, ID: {intern_compt.id}")  
-
-            fees_7_days = Transaction.objects.using(db).filter(
-                date__date__gte=last_7_days,
-                status='success',
-                destination_account_type=intern_type,
-                destination_account_id=intern_compt.id
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            total_fees = Transaction.objects.using(db).filter(
-                status='success',
-                destination_account_type=intern_type,
-                destination_account_id=intern_compt.id
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-        except Exception as e:
-            print(f"Erreur fallback fees: {str(e)}")
-            total_fees = Transaction.objects.using(db).aggregate(Sum('fee'))['fee__sum'] or 0
-            fees_7_days = Transaction.objects.using(db).filter(
-                date__date__gte=last_7_days
-            ).aggregate(Sum('fee'))['fee__sum'] or 0
-        
-        return Response({
+        return {
              
             'transactions': {
                 'total': total_transactions,
@@ -1081,7 +1097,7 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
                 'total': float(total_fees),
                 'last_7_days': float(fees_7_days)
             }
-        })
+        }
     
     @action(detail=False, methods=['get'])
     def financial_report(self, request):
@@ -1100,35 +1116,48 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
-        # Base queryset pour les transactions
-        transactions_queryset = Transaction.objects.using(db).filter(status='success')
-        
-        if start_date:
-            transactions_queryset = transactions_queryset.filter(date__date__gte=start_date)
-        if end_date:
-            transactions_queryset = transactions_queryset.filter(date__date__lte=end_date)
-        
-        # Filtre pour les comptes basé sur les dates
+        try:
+            start_day = to_date(start_date) if start_date else None
+            end_day = to_date(end_date) if end_date else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = response_cache.get_or_compute(
+            'dashboard-financial-report', db,
+            lambda: self.compute_financial_report(db, start_date, end_date, start_day, end_day),
+            params=[('start_date', start_date or ''), ('end_date', end_date or '')],
+        )
+        return Response(data)
+
+    def compute_financial_report(self, db, start_date, end_date, start_day, end_day):
+        """Données du rapport financier (mises en cache par financial_report)"""
+        # Transactions réussies : lues dans les agrégats quotidiens
+        rollups = DailyTransactionRollup.objects.using(db).filter(status='success')
+
+        # Filtre pour les comptes basé sur les dates (jour de création des compteurs)
         accounts_filter = {}
-        if start_date:
-            accounts_filter['created_at__date__gte'] = start_date
-        if end_date:
-            accounts_filter['created_at__date__lte'] = end_date
+        if start_day:
+            rollups = rollups.filter(day__gte=start_day)
+            accounts_filter['created_day__gte'] = start_day
+        if end_day:
+            rollups = rollups.filter(day__lte=end_day)
+            accounts_filter['created_day__lte'] = end_day
         
         # === DONNÉES TRANSACTIONS ===
         # Analyse par type de transaction
-        by_type = transactions_queryset.values('type').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        )
+        by_type = list(rollups.values('type').annotate(
+            count=Sum('count'),
+            total_amount=Sum('amount_sum')
+        ).order_by('type'))
         
         # Évolution quotidienne des transactions
-        daily_evolution = transactions_queryset.extra(
-            select={'day': 'date(date)'}
-        ).values('day').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        ).order_by('day')
+        daily_evolution = list(rollups.values('day').annotate(
+            count=Sum('count'),
+            total_amount=Sum('amount_sum')
+        ).order_by('day'))
+        totals = rollups.aggregate(count=Sum('count'), amount=Sum('amount_sum'))
+        total_transactions = totals['count'] or 0
+        total_amount = float(totals['amount'] or 0)
         
         # === DONNÉES COMPTES ===
         # Utiliser les nouvelles méthodes helpers
@@ -1174,7 +1203,7 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
         
         total_users_with_accounts = len(all_user_ids)
         
-        return Response({
+        return {
              
             'period': {
                 'start_date': start_date,
@@ -1183,10 +1212,10 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
             
             # === TRANSACTIONS ===
             'transactions': {
-                'by_type': list(by_type),
-                'daily_evolution': list(daily_evolution),
-                'total_transactions': transactions_queryset.count(),
-                'total_amount': float(transactions_queryset.aggregate(Sum('amount'))['amount__sum'] or 0)
+                'by_type': by_type,
+                'daily_evolution': daily_evolution,
+                'total_transactions': total_transactions,
+                'total_amount': total_amount
             },
             
             # === COMPTES ===
@@ -1208,10 +1237,62 @@ class DashboardViewSet(MultiDatabaseViewSetMixin, viewsets.ViewSet):
             },
             
             # === COMPATIBILITÉ AVEC L'ANCIEN FORMAT ===
-            'by_type': list(by_type),  # Pour la compatibilité
-            'daily_evolution': list(daily_evolution),  # Pour la compatibilité
-            'total_transactions': transactions_queryset.count(),
-            'total_amount': float(transactions_queryset.aggregate(Sum('amount'))['amount__sum'] or 0)
+            'by_type': by_type,  # Pour la compatibilité
+            'daily_evolution': daily_evolution,  # Pour la compatibilité
+            'total_transactions': total_transactions,
+            'total_amount': total_amount
+        }
+
+
+class PlatformOverviewView(APIView):
+    """
+    Vue d'ensemble consolidée de toutes les banques : la vue d'ensemble de
+    chaque banque (DashboardViewSet.overview, même cache) est calculée en
+    parallèle. Une banque lente ou en erreur est rapportée comme telle et
+    exclue des totaux, sans bloquer les autres.
+    """
+    permission_classes = [PlatformAdminPermission]
+    authentication_classes = [MultiDatabaseJWTAuthentication]
+
+    def get(self, request):
+        dashboard = DashboardViewSet()
+
+        def compute(code, remaining):
+            # Requêtes bornées par le temps restant avant l'échéance commune
+            with statement_timeout(code, remaining):
+                return dashboard.compute_overview(code)
+
+        def bank_overview(code, remaining):
+            return response_cache.get_or_compute('dashboard-overview', code, lambda: compute(code, remaining))
+
+        results = fan_out(bank_overview, sorted(tenant_registry.codes()), timeout=settings.PLATFORM_TENANT_TIMEOUT)
+
+        totals = {
+            'transactions': {'total': 0, 'today': 0, 'last_7_days': 0},
+            'accounts': {'total': 0, 'active': 0, 'pending': 0, 'total_balance': 0.0},
+            'volume': {'total': 0.0, 'last_7_days': 0.0},
+            'fees': {'total': 0.0, 'last_7_days': 0.0},
+        }
+        banks = {}
+        for code, result in results.items():
+            banks[code] = {
+                'status': result.status,
+                'duration_ms': round(result.duration * 1000) if result.duration is not None else None,
+                'data': result.data,
+                'error': result.error,
+            }
+            if result.status != 'ok':
+                continue
+            for section, values in totals.items():
+                for key in values:
+                    values[key] += result.data[section][key]
+
+        unavailable = [code for code, result in results.items() if result.status != 'ok']
+        return Response({
+            'complete': not unavailable,
+            'unavailable_banks': unavailable,
+            'totals': totals,
+            'banks': banks,
         })
 
 
@@ -1283,9 +1364,10 @@ class AccountStatementView(generics.GenericAPIView):
             bank_db = getattr(request, 'source_bank_db', 'default')
             
             # Construction du QuerySet de base pour les transactions
+            period_start, period_end = day_range(start_date_obj, end_date_obj)
             transactions_qs = Transaction.objects.using(bank_db).filter(
-                date__date__gte=start_date_obj,
-                date__date__lte=end_date_obj
+                date__gte=period_start,
+                date__lt=period_end
             )
             
             # Filtrage par compte (source ou destination)
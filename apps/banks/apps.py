@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BanksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.banks'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from core.tenants import install_tenant_databases
+
+        # Les alias des bases tenants sont construits depuis la table Bank
+        install_tenant_databases()
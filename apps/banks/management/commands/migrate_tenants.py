@@ -0,0 +1,34 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tenants import tenant_registry
+
+
+class Command(BaseCommand):
+    help = "Applique les migrations sur la base de chaque banque enregistrée dans la table Bank"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', action='append', dest='banks', default=[],
+            help="Code de la banque à migrer (répétable). Par défaut : toutes les banques.",
+        )
+
+    def handle(self, *args, **options):
+        tenant_registry.invalidate(broadcast=False)
+        codes = options['banks'] or sorted(tenant_registry.codes())
+
+        unknown = [code for code in codes if tenant_registry.get(code) is None]
+        if unknown:
+            raise CommandError(f"Banque(s) inconnue(s): {', '.join(unknown)}")
+
+        for code in codes:
+            self.stdout.write(f"Migration de la base {code}...")
+            call_command(
+                'migrate',
+                database=code,
+                interactive=False,
+                verbosity=options['verbosity'],
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(codes)} base(s) tenant migrée(s)"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='db_host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='bank',
+            name='db_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='bank',
+            name='db_port',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -4,6 +4,11 @@ from django.db import models
 class Bank(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10, unique=True)
+    # Connexion à la base du tenant : si vide, on retombe sur les variables
+    # DB_NAME_<CODE>, DB_HOST_<CODE>, DB_PORT_<CODE> puis sur la base 'default'
+    db_name = models.CharField(max_length=100, blank=True, default='')
+    db_host = models.CharField(max_length=255, blank=True, default='')
+    db_port = models.PositiveIntegerField(null=True, blank=True)
     
     def __str__(self):
         return self.name
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.tenants import tenant_registry
+from .models import Bank, BankFeature
+
+
+@receiver([post_save, post_delete], sender=Bank)
+@receiver([post_save, post_delete], sender=BankFeature)
+def invalidate_tenant_registry(sender, **kwargs):
+    """Toute modification d'une banque ou d'une fonctionnalité recharge le registre"""
+    tenant_registry.invalidate()
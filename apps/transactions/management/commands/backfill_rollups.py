@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from django.utils.dateparse import parse_date
+
+from core.tenants import tenant_registry
+from apps.transactions.services.rollup_service import iter_day_batches, ledger_bounds, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les agrégats quotidiens (transaction_daily_rollup) depuis le "
+        "grand livre, par périodes de --batch-days jours"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', action='append', dest='banks', default=[],
+            help="Code de la banque à traiter (répétable). Par défaut : toutes les banques.",
+        )
+        parser.add_argument('--since', help="Premier jour (AAAA-MM-JJ). Par défaut : début du grand livre.")
+        parser.add_argument('--until', help="Dernier jour inclus (AAAA-MM-JJ). Par défaut : fin du grand livre.")
+        parser.add_argument('--batch-days', type=int, default=7,
+                            help="Jours recalculés par transaction (verrou sur les agrégats)")
+
+    def handle(self, *args, **options):
+        since = self._parse_day(options['since'], '--since')
+        until = self._parse_day(options['until'], '--until')
+        if options['batch_days'] < 1:
+            raise CommandError("--batch-days doit être positif")
+
+        failures = []
+        for code in options['banks'] or sorted(tenant_registry.codes()):
+            if tenant_registry.get(code) is None:
+                failures.append(code)
+                self.stderr.write(f"Banque inconnue : {code}")
+                continue
+            try:
+                self._backfill_bank(code, since, until, options['batch_days'])
+            except DatabaseError as e:
+                failures.append(code)
+                self.stderr.write(f"Échec du recalcul sur {code}: {str(e)}")
+
+        if failures:
+            raise CommandError(f"Recalcul en échec pour : {', '.join(failures)}")
+
+    def _parse_day(self, value, option):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{option} : date invalide {value}")
+        return day
+
+    def _backfill_bank(self, code, since, until, batch_days):
+        first_day, last_day = ledger_bounds(code)
+        if first_day is None:
+            self.stdout.write(f"{code}: grand livre vide")
+            return
+        first_day = since or first_day
+        last_day = until or last_day
+
+        rows = 0
+        for batch_start, batch_end in iter_day_batches(first_day, last_day, batch_days):
+            rows += rebuild_rollups(code, batch_start, batch_end)
+        self.stdout.write(self.style.SUCCESS(
+            f"{code}: {rows} agrégat(s) recalculé(s) du {first_day} au {last_day}"
+        ))
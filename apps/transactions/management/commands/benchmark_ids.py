@@ -0,0 +1,60 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ids import generate_id, id_generator
+
+
+def _generate(count):
+    # Exécuté dans un processus séparé : chaque processus loue son propre nœud
+    started = time.perf_counter()
+    ids = [generate_id('TR') for _ in range(count)]
+    return id_generator.node, ids, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit du générateur d'identifiants (core.ids) sur plusieurs "
+        "processus et vérifie l'unicité et la monotonie par nœud"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--count', type=int, default=250000, help="Identifiants par processus")
+        parser.add_argument('--target-rate', type=int, default=50000,
+                            help="Débit minimal attendu (identifiants/s, tous processus)")
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        context = multiprocessing.get_context('spawn')
+
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.map(_generate, [options['count']] * processes)
+        elapsed = time.perf_counter() - started
+
+        nodes = [node for node, _, _ in results]
+        total = sum(len(ids) for _, ids, _ in results)
+        unique = len({value for _, ids, _ in results for value in ids})
+        unordered = sum(ids != sorted(ids) for _, ids, _ in results)
+        longest = max(len(value) for _, ids, _ in results for value in ids)
+        generation_rate = total / max(seconds for _, _, seconds in results)
+
+        self.stdout.write(f"Nœuds: {sorted(nodes)}")
+        self.stdout.write(
+            f"{total} identifiants, {unique} uniques, {total - unique} doublons, "
+            f"longueur max {longest}"
+        )
+        self.stdout.write(
+            f"Débit de génération: {generation_rate:,.0f} id/s "
+            f"({total / elapsed:,.0f} id/s en incluant le démarrage des processus)"
+        )
+
+        if len(set(nodes)) != len(nodes):
+            raise CommandError("Deux processus partagent le même nœud : ne pas fixer ID_GENERATOR_NODE pour ce test.")
+        if unique != total or unordered:
+            raise CommandError("Identifiants en double ou non monotones détectés.")
+        if generation_rate < options['target_rate']:
+            raise CommandError(f"Débit inférieur à {options['target_rate']} id/s.")
+        self.stdout.write(self.style.SUCCESS("Identifiants uniques et monotones par nœud"))
@@ -0,0 +1,100 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+PATH = re.compile(r'^/api/sms/validation/(?P<key>[^/]+)/?$')
+
+
+class FakeChinguisoftServer(ThreadingHTTPServer):
+    """Serveur local qui imite l'API de validation Chinguisoft (benchmarks hors ligne)"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, balance=1000):
+        super().__init__(address, FakeChinguisoftHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.balance = balance
+        self.lock = threading.Lock()
+        self.counts = {'200': 0, '401': 0, '422': 0, '503': 0}
+
+    def count(self, status):
+        with self.lock:
+            self.counts[str(status)] += 1
+
+
+class FakeChinguisoftHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, payload):
+        self.server.count(status)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if not PATH.match(self.path) or not self.headers.get('Validation-token'):
+            return self._reply(401, {'message': 'Unauthorized'})
+        try:
+            data = json.loads(raw or b'{}')
+        except ValueError:
+            data = {}
+        if not data.get('phone') or not data.get('code'):
+            return self._reply(422, {'message': 'The given data was invalid.'})
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            return self._reply(503, {'message': 'Service Unavailable'})
+
+        with self.server.lock:
+            self.server.balance -= 1
+            balance = self.server.balance
+        self._reply(200, {'code': data['code'], 'balance': balance})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Démarre un faux serveur Chinguisoft (POST /api/sms/validation/<clé>) "
+        "avec latence et taux d'erreur configurables. Pointer CHINGUISOFT_BASE_URL "
+        "sur http://<hôte>:<port>/api/sms/validation pour l'utiliser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--latency', type=float, default=0.2, help="Délai de réponse (secondes)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Part des réponses 503 (0..1)")
+        parser.add_argument('--balance', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        server = FakeChinguisoftServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            balance=options['balance'],
+        )
+        self.stdout.write(
+            f"Faux Chinguisoft sur http://{options['host']}:{options['port']}/api/sms/validation "
+            f"(latence {options['latency']}s, erreurs {options['error_rate']:.0%})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Réponses: {server.counts}")
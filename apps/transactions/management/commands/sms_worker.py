@@ -0,0 +1,108 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from core.metrics import metrics, serve_metrics
+from core.tenants import tenant_registry
+from apps.transactions.models import SmsOutbox
+from apps.transactions.services.sms_outbox import (
+    claim_due_messages, deliver, expire_message, record_result,
+)
+from apps.transactions.services.sms_gateway import sms_gateway
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les SMS de la file sms_outbox de chaque banque avec un pool de "
+        "threads, reprises et backoff exponentiel"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', action='append', dest='banks', default=[],
+            help="Code de la banque à traiter (répétable). Par défaut : toutes les banques.",
+        )
+        parser.add_argument('--workers', type=int, default=settings.SMS_WORKER_THREADS,
+                            help="Envois HTTP simultanés")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Messages traités par banque avant de passer à la suivante")
+        parser.add_argument('--idle-interval', type=float, default=1.0,
+                            help="Attente quand la file est vide (secondes)")
+        parser.add_argument('--drain', action='store_true',
+                            help="S'arrêter quand la file est vide et afficher le débit")
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Exposer les métriques Prometheus du worker sur ce port")
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+
+        totals = {'sent': 0, 'pending': 0, 'failed': 0, 'lost': 0}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                processed = 0
+                for code in options['banks'] or sorted(tenant_registry.codes()):
+                    try:
+                        processed += self._process_bank(
+                            code, executor, options['workers'], options['batch_size'], totals,
+                        )
+                    except DatabaseError as e:
+                        logger.error(f"File SMS indisponible pour {code}: {str(e)}")
+                        connections[code].close()
+                if processed:
+                    continue
+                if options['drain']:
+                    break
+                time.sleep(options['idle_interval'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{totals['sent']} envoyé(s), {totals['failed']} en échec, {totals['pending']} reprise(s), "
+            f"{totals['lost']} bail(s) perdu(s) "
+            f"en {elapsed:.1f}s ({totals['sent'] / elapsed if elapsed else 0:,.1f} SMS/s)"
+        )
+
+    def _process_bank(self, bank_db, executor, workers, batch_size, totals):
+        """
+        Traite jusqu'à batch_size messages par lots de workers messages : chaque
+        lot est réclamé juste avant son envoi, son bail ne couvre qu'une vague
+        d'appels à la passerelle.
+        """
+        processed = 0
+        while processed < batch_size:
+            # Passerelle hors service : les messages restent en file, sans tentative consommée
+            if not sms_gateway.available():
+                break
+            messages = claim_due_messages(bank_db, min(workers, batch_size - processed), threads=workers)
+            if not messages:
+                break
+            processed += len(messages)
+
+            now = timezone.now()
+            live = []
+            for message in messages:
+                if message.expires_at <= now:
+                    status = expire_message(bank_db, message)
+                    totals[status or 'lost'] += 1
+                else:
+                    live.append(message)
+
+            # Les envois HTTP se font en parallèle ; les écritures restent dans ce thread
+            for message, result in zip(live, executor.map(deliver, live)):
+                status = record_result(bank_db, message, *result)
+                totals[status or 'lost'] += 1
+
+        metrics.set(
+            'sms_outbox_backlog',
+            SmsOutbox.objects.using(bank_db).filter(status__in=['pending', 'sending']).count(),
+            bank=bank_db,
+        )
+        return processed
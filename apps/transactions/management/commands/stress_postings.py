@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from apps.accounts.models import PersonalAccount
+from apps.transactions.models import Transaction
+from apps.transactions.services import posting_service
+from apps.transactions.services.posting_service import InsufficientFundsError
+from apps.transactions.services.rollup_service import rebuild_rollups
+from core.content_types import content_type_map
+from core.metrics import metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de concurrence : transferts aléatoires en parallèle entre "
+        "quelques comptes de test, puis vérification qu'aucune mise à jour n'est perdue"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bank', required=True, help="Code de la banque (alias de la base)")
+        parser.add_argument('--accounts', type=int, default=10,
+                            help="Nombre de comptes de test (peu de comptes = forte contention)")
+        parser.add_argument('--workers', type=int, default=16, help="Nombre de threads")
+        parser.add_argument('--transfers', type=int, default=2000, help="Nombre total de transferts")
+        parser.add_argument('--balance', type=Decimal, default=Decimal('1000.00'),
+                            help="Solde initial de chaque compte")
+        parser.add_argument('--max-amount', type=int, default=50, help="Montant maximal d'un transfert")
+        parser.add_argument('--keep', action='store_true',
+                            help="Conserver les comptes et transactions de test")
+
+    def handle(self, *args, **options):
+        bank_db = options['bank']
+        if options['accounts'] < 2:
+            raise CommandError("Il faut au moins 2 comptes.")
+
+        run_id = uuid.uuid4().hex[:8].upper()
+        # save() ligne par ligne plutôt que bulk_create : les comptes sont
+        # comptés dans account_summary, comme leur suppression en fin de série
+        accounts = [
+            PersonalAccount(account_number=f"STRESS{run_id}{index:04d}", balance=options['balance'])
+            for index in range(options['accounts'])
+        ]
+        with transaction.atomic(using=bank_db):
+            for account in accounts:
+                account.save(using=bank_db)
+        account_ct = content_type_map.get_for_model(bank_db, PersonalAccount)
+
+        deltas = defaultdict(Decimal)
+        counters = {'success': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        retries_before = self._retries(bank_db)
+
+        def transfer():
+            source, destination = random.sample(accounts, 2)
+            amount = Decimal(random.randint(1, options['max_amount']))
+
+            posting = posting_service.Posting([
+                posting_service.Leg('transfer', amount, source, destination)
+            ])
+
+            try:
+                posting_service.post(bank_db, posting)
+            except InsufficientFundsError:
+                outcome = 'rejected'
+            except Exception as e:
+                self.stderr.write(f"Erreur: {str(e)}")
+                outcome = 'errors'
+            else:
+                outcome = 'success'
+
+            with lock:
+                counters[outcome] += 1
+                if outcome == 'success':
+                    deltas[source.pk] -= amount
+                    deltas[destination.pk] += amount
+
+        def worker(count):
+            # Une connexion par thread, gardée pendant toute la série
+            try:
+                for _ in range(count):
+                    transfer()
+            finally:
+                connections.close_all()
+
+        workers = options['workers']
+        shares = [
+            options['transfers'] // workers + (1 if index < options['transfers'] % workers else 0)
+            for index in range(workers)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(worker, shares))
+        elapsed = time.perf_counter() - started
+
+        final = dict(
+            PersonalAccount.objects.using(bank_db)
+            .filter(pk__in=[account.pk for account in accounts])
+            .values_list('pk', 'balance')
+        )
+        lost = [
+            pk for pk in final
+            if final[pk] != options['balance'] + deltas[pk]
+        ]
+        negative = [pk for pk, balance in final.items() if balance < 0]
+        total_expected = options['balance'] * len(accounts)
+        total_final = sum(final.values(), Decimal('0'))
+
+        self.stdout.write(
+            f"{counters['success']} transferts réussis, {counters['rejected']} refusés "
+            f"(solde insuffisant), {counters['errors']} erreurs, "
+            f"{self._retries(bank_db) - retries_before:.0f} rejeux"
+        )
+        self.stdout.write(
+            f"{counters['success'] / elapsed:.1f} transferts/s avec {options['workers']} threads "
+            f"sur {len(accounts)} comptes ({elapsed:.2f}s)"
+        )
+        self.stdout.write(
+            f"Somme des soldes : attendue {total_expected}, obtenue {total_final} ; "
+            f"mises à jour perdues : {len(lost)} compte(s) ; soldes négatifs : {len(negative)}"
+        )
+
+        if not options['keep']:
+            ids = [account.pk for account in accounts]
+            stress_transactions = Transaction.objects.using(bank_db).filter(
+                Q(source_account_type=account_ct, source_account_id__in=ids)
+                | Q(destination_account_type=account_ct, destination_account_id__in=ids)
+            )
+            bounds = stress_transactions.aggregate(first=Min('date'), last=Max('date'))
+            stress_transactions.delete()
+            # Les transactions supprimées restent comptées dans les agrégats
+            # quotidiens : recalcul des jours de la série
+            if bounds['first'] is not None:
+                rebuild_rollups(bank_db, timezone.localdate(bounds['first']), timezone.localdate(bounds['last']))
+            PersonalAccount.objects.using(bank_db).filter(pk__in=ids).delete()
+
+        if lost or negative or total_final != total_expected:
+            raise CommandError("Incohérence détectée : des mises à jour ont été perdues.")
+        self.stdout.write(self.style.SUCCESS("Aucune mise à jour perdue"))
+
+    @staticmethod
+    def _retries(bank_db):
+        return sum(
+            value for name, labels, value in metrics.collect()
+            if name == 'posting_retries_total' and labels.get('bank') == bank_db
+        )
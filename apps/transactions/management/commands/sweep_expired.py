@@ -0,0 +1,66 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+
+from core.metrics import metrics, serve_metrics
+from core.tenants import tenant_registry
+from apps.transactions.services.expiry_sweeper import sweep_bank
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Libère les réservations expirées et purge les pré-transactions expirées "
+        "de toutes les banques, par lots bornés (une fois, ou en boucle avec --loop)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', action='append', dest='banks', default=[],
+            help="Code de la banque à purger (répétable). Par défaut : toutes les banques.",
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.EXPIRY_SWEEP_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=settings.EXPIRY_SWEEP_MAX_BATCHES,
+                            help="Lots maximum par table et par passage")
+        parser.add_argument('--loop', action='store_true', help="Recommencer toutes les --interval secondes")
+        parser.add_argument('--interval', type=float, default=settings.EXPIRY_SWEEP_INTERVAL)
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Exposer les métriques Prometheus du worker sur ce port")
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+
+        while True:
+            failures = self._sweep_all(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        if failures:
+            raise CommandError(f"Purge en échec pour : {', '.join(failures)}")
+
+    def _sweep_all(self, options):
+        codes = options['banks'] or sorted(tenant_registry.codes())
+        failures = []
+        for code in codes:
+            if tenant_registry.get(code) is None:
+                failures.append(code)
+                self.stderr.write(f"Banque inconnue : {code}")
+                continue
+            try:
+                results = sweep_bank(code, options['batch_size'], options['max_batches'])
+            except DatabaseError as e:
+                failures.append(code)
+                metrics.inc('expiry_sweep_failures_total', bank=code)
+                logger.error(f"Échec de la purge sur {code}: {str(e)}")
+                continue
+            finally:
+                connections[code].close()
+            summary = ', '.join(f"{name}={count}" for name, count in results.items())
+            self.stdout.write(f"{code}: {summary}")
+        return failures
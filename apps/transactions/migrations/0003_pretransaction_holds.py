@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:16
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Durée de validité des codes de retrait avant cette migration (5 minutes après
+# la création, voir PreTransaction.is_active)
+LEGACY_TTL = timedelta(minutes=5)
+
+
+def set_legacy_expiry(apps, schema_editor):
+    """
+    Échéance des pré-transactions existantes : created_at + 5 minutes, comme
+    avant. Les codes émis dans les 5 minutes qui précèdent le déploiement
+    restent réclamables jusqu'à cette échéance, sans réservation (hold_amount
+    reste à 0 : le solde est contrôlé au retrait, comme avant) ; les autres
+    sont expirés et purgés par le balayage des pré-transactions expirées.
+    """
+    PreTransaction = apps.get_model('transactions', 'PreTransaction')
+    PreTransaction.objects.using(schema_editor.connection.alias).filter(expires_at__isnull=True).update(
+        expires_at=models.F('created_at') + LEGACY_TTL
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_reserved_amount'),
+        ('transactions', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pretransaction',
+            name='account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pretransactions', to='accounts.personalaccount'),
+        ),
+        migrations.AddField(
+            model_name='pretransaction',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pretransaction',
+            name='hold_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(set_legacy_expiry, migrations.RunPython.noop),
+    ]
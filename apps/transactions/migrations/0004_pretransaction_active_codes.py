@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_reserved_amount'),
+        ('transactions', '0003_pretransaction_holds'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pretransaction',
+            name='code',
+            field=models.CharField(max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='pretransaction',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['expires_at'], name='pretransaction_active_exp_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pretransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_used', False)), fields=('client_phone', 'code'), name='pretransaction_active_code_uniq'),
+        ),
+    ]
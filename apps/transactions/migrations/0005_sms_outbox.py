@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_pretransaction_active_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsOutbox',
+            fields=[
+                ('id', models.CharField(editable=False, max_length=20, primary_key=True, serialize=False)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('lang', models.CharField(default='fr', max_length=5)),
+                ('code', models.CharField(max_length=6)),
+                ('purpose', models.CharField(choices=[('verification', 'Verification'), ('password_reset', 'Password reset')], default='verification', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'sms_outbox',
+                'indexes': [models.Index(condition=models.Q(('status__in', ['pending', 'sending'])), fields=['next_attempt_at'], name='sms_outbox_due_idx')],
+            },
+        ),
+    ]
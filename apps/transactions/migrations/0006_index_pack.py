@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY : pas de verrou d'écriture sur les tables des
+    # banques en production, mais interdit dans une transaction
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0004_index_pack'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('transactions', '0005_sms_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='pretransaction',
+            index=models.Index(fields=['client_phone', 'created_at', 'id'], name='pretransaction_phone_crt_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pretransaction',
+            index=models.Index(fields=['created_at', 'id'], name='pretransaction_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pretransaction',
+            index=models.Index(fields=['user', 'is_used'], name='pretransaction_user_used_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['source_account_type', 'source_account_id', 'date', 'id'], name='transaction_src_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['destination_account_type', 'destination_account_id', 'date', 'id'], name='transaction_dst_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'id'], name='transaction_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'date'], name='transaction_type_date_idx'),
+        ),
+    ]
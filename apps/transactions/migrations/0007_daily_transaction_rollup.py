@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_index_pack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('transfer', 'Transfer'), ('withdrawal', 'Withdrawal'), ('deposit', 'Deposit'), ('paiement', 'Paiement')], max_length=10)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failure', 'Failure'), ('pending', 'Pending')], max_length=10)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('fee_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'db_table': 'transaction_daily_rollup',
+                'constraints': [models.UniqueConstraint(fields=('day', 'type', 'status', 'shard'), name='transaction_rollup_key_uniq')],
+            },
+        ),
+    ]
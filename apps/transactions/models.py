@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from apps.accounts.models import BusinessAccount 
 from django.utils import timezone
 import uuid
@@ -9,8 +9,14 @@ from datetime import timedelta
 import secrets
 import string
 from apps.users.models import User
+from core.ids import generate_id
 
 class PasswordResetOTP(models.Model):
+    """
+    Obsolète : les codes de réinitialisation sont dans l'OTPStore
+    (services.otp_store) et cette table n'est plus écrite. Conservée le temps
+    d'une version, puis supprimée par migration.
+    """
     user = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
@@ -73,6 +79,11 @@ class PasswordResetOTP(models.Model):
 
 #////////////////////////////////////////////
 class OTPVerification(models.Model):
+    """
+    Obsolète : les codes d'inscription sont dans l'OTPStore
+    (services.otp_store) et cette table n'est plus écrite. Conservée le temps
+    d'une version, puis supprimée par migration.
+    """
     phone_number = models.CharField(max_length=8)
     otp_code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -104,14 +115,64 @@ class OTPVerification(models.Model):
         """Supprime les OTP expirés"""
         expiry_time = timezone.now() - timedelta(minutes=1)
         cls.objects.using(db_alias).filter(created_at__lt=expiry_time).delete()
-    
+
+class SmsOutbox(models.Model):
+    """
+    SMS à envoyer (codes OTP) : mis en file par la requête après
+    l'enregistrement du code dans le stockage OTP, livré ensuite par la
+    commande sms_worker avec reprises et backoff.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    PURPOSE_CHOICES = [
+        ('verification', 'Verification'),
+        ('password_reset', 'Password reset'),
+    ]
+
+    id = models.CharField(primary_key=True, max_length=20, editable=False)
+    phone_number = models.CharField(max_length=20)
+    lang = models.CharField(max_length=5, default='fr')
+    # Effacé dès que le message est envoyé, en échec ou expiré
+    code = models.CharField(max_length=6)
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES, default='verification')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    # Prochaine tentative ; pour 'sending', fin du bail du worker qui l'a réclamé
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Au-delà, le code n'est plus valable : inutile de l'envoyer
+    expires_at = models.DateTimeField()
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'sms_outbox'
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status__in=['pending', 'sending']),
+                name='sms_outbox_due_idx',
+            ),
+        ]
+
     def save(self, *args, **kwargs):
-        
-        if not self.pk:
-            db_alias = kwargs.get('using', 'default')
-            self.__class__.cleanup_expired(db_alias)
+        if not self.id:
+            self.id = generate_id('SM')
         super().save(*args, **kwargs)
 
+    def __str__(self):
+        return f"{self.id} - {self.phone_number} - {self.purpose} - {self.status}"
+
+
+def generate_transaction_id():
+    """Identifiant "TR" trié dans le temps (core.ids), aussi utilisé par bulk_create"""
+    return generate_id('TR')
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
         ('transfer', 'Transfer'),
@@ -152,16 +213,38 @@ class Transaction(models.Model):
     #     if not self.id:
     #         self.id = f"TR{uuid.uuid4().int % 10**9:09d}"  
     #     super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # Historique d'un compte : émises / reçues, parcourues dans l'ordre (date, id)
+            models.Index(
+                fields=['source_account_type', 'source_account_id', 'date', 'id'],
+                name='transaction_src_date_idx',
+            ),
+            models.Index(
+                fields=['destination_account_type', 'destination_account_id', 'date', 'id'],
+                name='transaction_dst_date_idx',
+            ),
+            # Listes et statistiques par période, tri par date
+            models.Index(fields=['date', 'id'], name='transaction_date_idx'),
+            models.Index(fields=['type', 'date'], name='transaction_type_date_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.id:
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')  
-            random_number = f"{uuid.uuid4().int % 1000:03d}"  
-            self.id = f"TR{timestamp}{random_number}" 
+            self.id = generate_transaction_id()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.id} - {self.type} - {self.amount} - {self.date} - {self.status}"
 
+# Durée de validité d'un code de retrait
+PRE_TRANSACTION_TTL_MINUTES = 5
+# Codes à 4 chiffres, uniques par téléphone client parmi les pré-transactions non utilisées
+PRE_TRANSACTION_CODE_MIN = 1000
+PRE_TRANSACTION_CODE_MAX = 9999
+PRE_TRANSACTION_CODE_ATTEMPTS = 5
+
+
 class PreTransaction(models.Model):
     id = models.CharField(
         primary_key=True,
@@ -174,31 +257,87 @@ class PreTransaction(models.Model):
         on_delete=models.CASCADE, 
         related_name='pretransactions'
     )
-    code = models.CharField(max_length=4, unique=True)
+    code = models.CharField(max_length=4)
     client_phone = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     is_used = models.BooleanField(default=False)
+    # Réservation (montant + frais) portée par account.reserved_amount tant que
+    # hold_amount > 0 ; remise à 0 quand elle est consommée, annulée ou expirée
+    account = models.ForeignKey(
+        'accounts.PersonalAccount',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='pretransactions'
+    )
+    hold_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Un code n'identifie une pré-transaction qu'avec le téléphone du client
+            models.UniqueConstraint(
+                fields=['client_phone', 'code'],
+                condition=models.Q(is_used=False),
+                name='pretransaction_active_code_uniq',
+            ),
+        ]
+        indexes = [
+            # Liste paginée (curseur sur -created_at, -id), filtrée ou non par téléphone client
+            models.Index(fields=['client_phone', 'created_at', 'id'], name='pretransaction_phone_crt_idx'),
+            models.Index(fields=['created_at', 'id'], name='pretransaction_created_idx'),
+            # Pré-transactions actives d'un agent (annulation)
+            models.Index(fields=['user', 'is_used'], name='pretransaction_user_used_idx'),
+            # Expiration des réservations et purge des pré-transactions non utilisées
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(is_used=False),
+                name='pretransaction_active_exp_idx',
+            ),
+        ]
 
     def generate_unique_code(self, db_to_use=None):
-      
+        """
+        Tire un code libre pour ce client : seuls ses codes actifs sont lus
+        (index partiel), le tirage ne dépend donc pas du nombre total de
+        pré-transactions de la banque.
+        """
+        taken = set(
+            PreTransaction.objects.using(db_to_use)
+            .filter(client_phone=self.client_phone, is_used=False)
+            .values_list('code', flat=True)
+        )
+        if len(taken) > PRE_TRANSACTION_CODE_MAX - PRE_TRANSACTION_CODE_MIN:
+            raise ValueError("Trop de pré-transactions actives pour ce client.")
         while True:
-            code = f"{random.randint(1000, 9999)}"
-            if not PreTransaction.objects.using(db_to_use).filter(code=code).exists():
+            code = f"{random.randint(PRE_TRANSACTION_CODE_MIN, PRE_TRANSACTION_CODE_MAX)}"
+            if code not in taken:
                 return code
     
     def save(self, *args, **kwargs):
         db_to_use = kwargs.get('using', None)
         
         if not self.id:
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-            random_number = f"{uuid.uuid4().int % 1000:03d}"
-            self.id = f"PT{timestamp}{random_number}"
-        
-        if not self.code:
+            self.id = generate_id('PT')
+
+        if not self.expires_at:
+            self.expires_at = timezone.now() + timedelta(minutes=PRE_TRANSACTION_TTL_MINUTES)
+
+        if self.code:
+            return super().save(*args, **kwargs)
+
+        # Deux créations simultanées pour le même client peuvent tirer le même
+        # code : la contrainte partielle refuse la seconde, qui retire un code
+        for attempt in range(PRE_TRANSACTION_CODE_ATTEMPTS):
             self.code = self.generate_unique_code(db_to_use=db_to_use)
-        
-        super().save(*args, **kwargs)
+            try:
+                with transaction.atomic(using=db_to_use):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.code = ''
+                if attempt == PRE_TRANSACTION_CODE_ATTEMPTS - 1:
+                    raise
     
     def __str__(self):
         return f"{self.id} - Code: {self.code} - {self.client_phone} - {self.amount}"
@@ -207,7 +346,7 @@ class PreTransaction(models.Model):
         
         if self.is_used:
             return False
-        expiration_time = self.created_at + timezone.timedelta(minutes=5)
+        expiration_time = self.expires_at or self.created_at + timedelta(minutes=PRE_TRANSACTION_TTL_MINUTES)
         return timezone.now() <= expiration_time
     
 class FeeRule(models.Model):
@@ -242,4 +381,33 @@ class Fee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Fee of {self.amount} for Transaction {self.transaction.id}"    
\ No newline at end of file
+        return f"Fee of {self.amount} for Transaction {self.transaction.id}"    
+
+class DailyTransactionRollup(models.Model):
+    """
+    Agrégats quotidiens du grand livre par (jour, type, statut), tenus à jour
+    dans la transaction de chaque écriture (posting_service.post) et
+    recalculables par la commande backfill_rollups. Chaque clé est répartie
+    sur plusieurs lignes (shard) pour que les écritures simultanées ne se
+    bloquent pas sur une seule ligne : les lecteurs additionnent les shards.
+    fee_sum : montants versés au compte interne de commission.
+    """
+    day = models.DateField()
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    status = models.CharField(max_length=10, choices=Transaction.STATUS_CHOICES)
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveBigIntegerField(default=0)
+    amount_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    fee_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'transaction_daily_rollup'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'type', 'status', 'shard'],
+                name='transaction_rollup_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.type} - {self.status}: {self.count} / {self.amount_sum}"
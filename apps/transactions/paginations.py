@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+class PreTransactionCursorPagination(CursorPagination):
+    # Ordre chronologique inverse sur created_at : les anciens identifiants
+    # (PT2025...) et les nouveaux (base 36, PT0...) ne se comparent pas entre
+    # eux. id départage les créations du même instant.
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
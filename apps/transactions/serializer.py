@@ -1,16 +1,20 @@
+import logging
 from decimal import Decimal, InvalidOperation
 from rest_framework import serializers
 from apps.accounts.models import PersonalAccount,InternAccount,AgencyAccount,BusinessAccount
-from .models import Transaction,Fee,PreTransaction
+from .models import Transaction,PreTransaction
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from django.http import FileResponse
 from reportlab.lib.units import inch
 from apps.users.models import User
-from django.contrib.contenttypes.models import ContentType
 import io
 from ..accounts.views import FeeCalculatorAPI
-from django.db import transaction
+from .services import posting_service
+from .services.posting_service import InsufficientFundsError
+from .services.hold_service import claim_pre_transaction, place_hold, release_expired_holds
+
+logger = logging.getLogger(__name__)
 
 class TransferTransactionSerializer(serializers.ModelSerializer):
     source_phone = serializers.CharField()
@@ -52,7 +56,7 @@ class TransferTransactionSerializer(serializers.ModelSerializer):
             
             # Calcul des frais
             fee_amount = self.fee_calculator.get_fee_from_db(
-                self.bank_db, transaction_type, float(amount)
+                self.bank_db, transaction_type, amount
             )
             
             if fee_amount is None:
@@ -104,78 +108,23 @@ class TransferTransactionSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         source_account = validated_data['source_account']
-        destination_account = validated_data['destination_account']
-        commission_account = validated_data['commission_account']
-        amount = validated_data['amount']
         fee_amount = validated_data['fee_amount']
         
-        transfer_transaction = None
-        fee_transaction = None
-        
+        posting = posting_service.transfer(
+            source_account,
+            validated_data['destination_account'],
+            validated_data['commission_account'],
+            validated_data['amount'],
+            fee_amount,
+        )
         try:
-            with transaction.atomic(using=self.bank_db):
-                # ContentTypes pour les comptes
-                personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-                intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-                
-                # Transaction de transfert
-                transfer_transaction = Transaction.objects.using(self.bank_db).create(
-                    type='transfer',
-                    amount=amount,
-                    source_account_type=personal_account_ct,
-                    source_account_id=source_account.id,
-                    destination_account_type=personal_account_ct,
-                    destination_account_id=destination_account.id,
-                    status='pending'
-                )
-                
-                # Transaction de frais
-                if fee_amount > 0:
-                    fee_transaction = Transaction.objects.using(self.bank_db).create(
-                        type='paiement',
-                        amount=fee_amount,
-                        source_account_type=personal_account_ct,
-                        source_account_id=source_account.id,
-                        destination_account_type=intern_account_ct,
-                        destination_account_id=commission_account.id,
-                        status='pending'
-                    )
-                    
-                    Fee.objects.using(self.bank_db).create(
-                        transaction=transfer_transaction,
-                        amount=fee_amount
-                    )
-                
-                # Mise à jour des soldes
-                source_account.balance -= (amount + fee_amount)
-                source_account.save(using=self.bank_db)
-                
-                destination_account.balance += amount
-                destination_account.save(using=self.bank_db)
-                
-                if fee_amount > 0:
-                    commission_account.balance += fee_amount
-                    commission_account.save(using=self.bank_db)
-                
-                # Statut success
-                transfer_transaction.status = 'success'
-                transfer_transaction.save(using=self.bank_db)
-                
-                if fee_transaction:
-                    fee_transaction.status = 'success'
-                    fee_transaction.save(using=self.bank_db)
-                
-                return transfer_transaction
-                
+            # Les jambes en échec sont tracées avec le statut 'failure'
+            return posting_service.post(self.bank_db, posting, record_failure=True)[0]
+        except InsufficientFundsError:
+            raise serializers.ValidationError(
+                f"Solde insuffisant. Solde actuel : {source_account.balance}"
+            )
         except Exception as e:
-            if transfer_transaction:
-                transfer_transaction.status = 'failure'
-                transfer_transaction.save(using=self.bank_db)
-            
-            if fee_transaction:
-                fee_transaction.status = 'failure'
-                fee_transaction.save(using=self.bank_db)
-                
             raise serializers.ValidationError(f"Échec de la transaction de transfert : {str(e)}")
 
 class RetraitTransactionSerializer(serializers.ModelSerializer):
@@ -239,7 +188,7 @@ class RetraitTransactionSerializer(serializers.ModelSerializer):
 
             # Calcul des frais
             fee_amount = self.fee_calculator.get_fee_from_db(
-                self.bank_db, transaction_type, float(amount)
+                self.bank_db, transaction_type, amount
             )
 
             if fee_amount is None:
@@ -279,110 +228,124 @@ class RetraitTransactionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         client_account = validated_data['client_account']
-        agent_account = validated_data['agent_account']
-        commission_account = validated_data['commission_account']
         amount = validated_data['amount']
         fee_amount = validated_data['fee_amount']
         pre_transaction = validated_data['pre_transaction']
 
-        retrait_transaction = None
-        agent_fee_transaction = None
-        commission_fee_transaction = None
+        # La réservation de la pré-transaction est libérée par le retrait lui-même
+        hold = pre_transaction.hold_amount if pre_transaction.account_id == client_account.pk else Decimal('0')
+
+        def use_pre_transaction():
+            # Marquer la pré-transaction comme utilisée, une seule fois, et
+            # seulement si sa réservation n'a pas été libérée entre-temps
+            used = PreTransaction.objects.using(self.bank_db).filter(
+                pk=pre_transaction.pk, is_used=False, hold_amount=pre_transaction.hold_amount
+            ).update(is_used=True, hold_amount=0)
+            if not used:
+                raise serializers.ValidationError("Pré-transaction invalide, déjà utilisée ou expirée.")
+
+        posting = posting_service.withdrawal(
+            client_account,
+            validated_data['agent_account'],
+            validated_data['commission_account'],
+            amount,
+            fee_amount,
+            hold=hold,
+        )
+        try:
+            return posting_service.post(self.bank_db, posting, before=use_pre_transaction)[0]
+        except InsufficientFundsError:
+            total_debit = amount + fee_amount
+            raise serializers.ValidationError(
+                f"Solde insuffisant. Solde disponible: {client_account.balance}, "
+                f"Montant requis: {total_debit} (retrait: {amount} + frais: {fee_amount})"
+            )
+        except serializers.ValidationError:
+            raise
+        except Exception as e:
+            raise serializers.ValidationError(f"Échec de la transaction de retrait : {str(e)}")
+        
+class ClaimWithdrawalSerializer(serializers.Serializer):
+    """
+    Retrait en un seul appel de l'agent : la réclamation du code et l'écriture
+    du retrait sont faites dans la même transaction (voir claim_pre_transaction),
+    sans relecture préalable de la pré-transaction.
+    """
+    client_phone = serializers.CharField(max_length=15)
+    code = serializers.CharField(max_length=4)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bank_db = self.context.get('bank_db')
+        self.agent_user = self.context.get('agent_user')
+        self.fee_calculator = FeeCalculatorAPI()
 
+    def validate(self, attrs):
         try:
-            with transaction.atomic(using=self.bank_db):
-                # ContentTypes pour les comptes - récupération depuis la bonne base
-                try:
-                    personal_account_ct = ContentType.objects.using(self.bank_db).get(
-                        app_label='accounts', model='personalaccount'
-                    )
-                    agency_account_ct = ContentType.objects.using(self.bank_db).get(
-                        app_label='accounts', model='agencyaccount'
-                    )
-                    intern_account_ct = ContentType.objects.using(self.bank_db).get(
-                        app_label='accounts', model='internaccount'
-                    )
-                except ContentType.DoesNotExist:
-                    # Fallback vers la base principale si pas trouvé
-                    personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-                    agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-                    intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-                # Calcul de la répartition des frais
-                commission_percentage = Decimal(agent_account.retrai_percentage or 0)
-                agent_fee = (fee_amount * commission_percentage) / 100
-                commission_fee = fee_amount - agent_fee
-
-                # Vérification du solde client avant toute opération
-                total_debit = amount + fee_amount
-                if client_account.balance < total_debit:
-                    raise serializers.ValidationError(
-                        f"Solde insuffisant. Solde disponible: {client_account.balance}, "
-                        f"Montant requis: {total_debit} (retrait: {amount} + frais: {fee_amount})"
-                    )
-
-                # Marquer la pré-transaction comme utilisée
-                pre_transaction.is_used = True
-                pre_transaction.save(using=self.bank_db)
-                
-                # Mettre à jour les soldes
-                client_account.balance -= total_debit
-                client_account.save(using=self.bank_db)
-
-                agent_account.balance += (amount + agent_fee)
-                agent_account.save(using=self.bank_db)
-
-                if commission_fee > 0:
-                    commission_account.balance += commission_fee
-                    commission_account.save(using=self.bank_db)
-
-                # Transaction de retrait principal
-                retrait_transaction = Transaction.objects.using(self.bank_db).create(
-                    type='withdrawal',
-                    amount=amount,
-                    source_account_type=personal_account_ct,
-                    source_account_id=client_account.id,
-                    destination_account_type=agency_account_ct,
-                    destination_account_id=agent_account.id,
-                    status='success'
-                )
+            attrs['client_account'] = PersonalAccount.objects.using(self.bank_db).get(
+                user__phone_number=attrs['client_phone']
+            )
+            attrs['agent_account'] = AgencyAccount.objects.using(self.bank_db).get(user=self.agent_user)
+            attrs['commission_account'] = InternAccount.objects.using(self.bank_db).get(
+                purpose='commission',
+                user=None
+            )
+        except PersonalAccount.DoesNotExist:
+            raise serializers.ValidationError(
+                f"Le client n'a pas de compte personnel dans la base {self.bank_db}."
+            )
+        except AgencyAccount.DoesNotExist:
+            raise serializers.ValidationError(
+                f"L'agent n'a pas de compte d'agence dans la base {self.bank_db}."
+            )
+        except InternAccount.DoesNotExist:
+            raise serializers.ValidationError(
+                f"Le compte Commission n'existe pas dans la base {self.bank_db}."
+            )
+        return attrs
 
-                # Transaction des frais agent
-                if agent_fee > 0:
-                    agent_fee_transaction = Transaction.objects.using(self.bank_db).create(
-                        type='paiement',
-                        amount=agent_fee,
-                        source_account_type=personal_account_ct,
-                        source_account_id=client_account.id,
-                        destination_account_type=agency_account_ct,
-                        destination_account_id=agent_account.id,
-                        status='success'
-                    )
-
-                # Transaction des frais commission
-                if commission_fee > 0:
-                    commission_fee_transaction = Transaction.objects.using(self.bank_db).create(
-                        type='paiement',
-                        amount=commission_fee,
-                        source_account_type=personal_account_ct,
-                        source_account_id=client_account.id,
-                        destination_account_type=intern_account_ct,
-                        destination_account_id=commission_account.id,
-                        status='success'
-                    )
-
-                # Créer l'enregistrement des frais
-                Fee.objects.using(self.bank_db).create(
-                    transaction=retrait_transaction,
-                    amount=fee_amount
-                )
+    def create(self, validated_data):
+        client_account = validated_data['client_account']
 
-                return retrait_transaction
+        def operation():
+            claimed = claim_pre_transaction(
+                self.bank_db,
+                validated_data['client_phone'],
+                validated_data['code'],
+                validated_data.get('amount'),
+            )
+            if claimed is None:
+                raise serializers.ValidationError("Pré-transaction invalide, déjà utilisée ou expirée.")
+            _, amount, hold_amount, account_id = claimed
+            if account_id not in (None, client_account.pk):
+                raise serializers.ValidationError("Pré-transaction invalide, déjà utilisée ou expirée.")
+
+            fee_amount = self.fee_calculator.get_fee_from_db(self.bank_db, 'withdrawal', amount)
+            if fee_amount is None:
+                raise serializers.ValidationError("Ce type de transaction (withdrawal) est désactivé.")
+
+            posting = posting_service.withdrawal(
+                client_account,
+                validated_data['agent_account'],
+                validated_data['commission_account'],
+                amount,
+                fee_amount,
+                hold=hold_amount if account_id is not None else Decimal('0'),
+            )
+            return posting_service.post(self.bank_db, posting)[0]
 
+        try:
+            return posting_service.run_posting(self.bank_db, operation)
+        except InsufficientFundsError:
+            raise serializers.ValidationError(
+                f"Solde insuffisant. Solde disponible: {client_account.balance}"
+            )
+        except serializers.ValidationError:
+            raise
         except Exception as e:
-            # Les transactions seront automatiquement rollback grâce à transaction.atomic()
             raise serializers.ValidationError(f"Échec de la transaction de retrait : {str(e)}")
-        
+
 class MerchantPaymentSerializer(serializers.Serializer):
     client_phone = serializers.CharField()
     destination_phone = serializers.CharField()
@@ -426,51 +389,15 @@ class MerchantPaymentSerializer(serializers.Serializer):
         return attrs
 
     def create(self, validated_data):
-        client_account = validated_data['client_account']
-        merchant_account = validated_data['merchant_account']
-        amount = validated_data['amount']
-        
+        posting = posting_service.merchant_payment(
+            validated_data['client_account'],
+            validated_data['merchant_account'],
+            validated_data['amount'],
+        )
         try:
-            with transaction.atomic(using=self.bank_db):
-                # ContentTypes pour les comptes - récupération depuis la bonne base
-                try:
-                    personal_account_ct = ContentType.objects.using(self.bank_db).get(
-                        app_label='accounts', model='personalaccount'
-                    )
-                    business_account_ct = ContentType.objects.using(self.bank_db).get(
-                        app_label='accounts', model='businessaccount'
-                    )
-                except ContentType.DoesNotExist:
-                    # Fallback vers la base principale si pas trouvé
-                    personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-                    business_account_ct = ContentType.objects.get_for_model(BusinessAccount)
-                
-                # Mettre à jour les soldes
-                client_account.balance -= amount
-                client_account.save(using=self.bank_db)
-                
-                merchant_account.balance += amount
-                merchant_account.save(using=self.bank_db)
-                
-                # Créer la transaction de paiement
-                payment_tx = Transaction.objects.using(self.bank_db).create(
-                    type='paiement',
-                    amount=amount,
-                    source_account_type=personal_account_ct,
-                    source_account_id=client_account.id,
-                    destination_account_type=business_account_ct,
-                    destination_account_id=merchant_account.id,
-                    status='success'
-                )
-                
-                # Créer l'enregistrement des frais (ici le montant du paiement)
-                Fee.objects.using(self.bank_db).create(
-                    transaction=payment_tx,
-                    amount=amount
-                )
-                
-                return payment_tx
-                
+            return posting_service.post(self.bank_db, posting)[0]
+        except InsufficientFundsError:
+            raise serializers.ValidationError("Solde insuffisant pour effectuer le paiement.")
         except Exception as e:
             raise serializers.ValidationError(f"Erreur de paiement : {str(e)}")
 
@@ -498,15 +425,16 @@ class PreTransactionSerializer(serializers.ModelSerializer):
             user = User.objects.using(self.bank_db).get(phone_number=phone)
             account = PersonalAccount.objects.using(self.bank_db).get(user=user)
             
-            fee = self.fee_calculator.get_fee_from_db(self.bank_db, "withdrawal", float(amount))
+            fee = self.fee_calculator.get_fee_from_db(self.bank_db, "withdrawal", amount)
             if fee is None:
                 raise serializers.ValidationError("Ce type de transaction est désactivé pour cette banque.")
 
             total_required = Decimal(str(amount)) + Decimal(str(fee))
             
-            available_balance, reserved_amount = calculate_available_balance(
-                self.bank_db, phone, account.balance, self.fee_calculator
-            )
+            available_balance, reserved_amount = calculate_available_balance(account)
+            if available_balance < total_required and release_expired_holds(self.bank_db, account_id=account.pk):
+                account.refresh_from_db(using=self.bank_db, fields=['balance', 'reserved_amount'])
+                available_balance, reserved_amount = calculate_available_balance(account)
             
             if available_balance < total_required:
                 raise serializers.ValidationError(
@@ -517,8 +445,10 @@ class PreTransactionSerializer(serializers.ModelSerializer):
                     f"{total_required} MRU nécessaires."
                 )
 
-            # Ajouter l'utilisateur aux données validées
+            # Ajouter l'utilisateur et la réservation aux données validées
             data['user'] = user
+            data['account'] = account
+            data['hold_amount'] = total_required
 
         except User.DoesNotExist:
             raise serializers.ValidationError("Utilisateur introuvable.")
@@ -530,13 +460,20 @@ class PreTransactionSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        bank_db = self.bank_db
+        account = validated_data.pop('account')
+        hold_amount = validated_data.pop('hold_amount')
         
-        # Créer l'instance avec l'utilisateur
+        # Créer l'instance avec l'utilisateur et réserver montant + frais
         instance = PreTransaction(**validated_data)
         instance.is_used = False
-        instance.save(using=bank_db)
-        return instance
+        try:
+            return place_hold(self.bank_db, instance, account, hold_amount)
+        except InsufficientFundsError:
+            raise serializers.ValidationError(
+                "Solde insuffisant en tenant compte des pré-transactions actives."
+            )
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
 
 
 
@@ -544,9 +481,15 @@ class PreTransactionRetrieveSerializer(serializers.Serializer):
     client_phone = serializers.CharField(max_length=8)
     code = serializers.CharField(max_length=4)
         
-class AllPreTransactionsSerializer(serializers.Serializer):
-    
-    pass
+class AllPreTransactionsSerializer(serializers.ModelSerializer):
+    Trs_ID = serializers.CharField(source='id')
+    telephone = serializers.CharField(source='client_phone')
+    montant = serializers.DecimalField(source='amount', max_digits=10, decimal_places=2)
+    Date_et_heure = serializers.DateTimeField(source='created_at', format='%Y-%m-%d %H:%M:%S')
+
+    class Meta:
+        model = PreTransaction
+        fields = ['Trs_ID', 'code', 'telephone', 'montant', 'Date_et_heure', 'is_used', 'expires_at']
 
 
 
@@ -647,66 +590,25 @@ class DepositTransactionSerializer(serializers.ModelSerializer):
                 {"amount": "Solde insuffisant sur le compte de l'agence."}
             )
 
-        with transaction.atomic(using=self.bank_db):
-            # ContentTypes pour les comptes - récupération depuis la bonne base
-            try:
-                personal_account_ct = ContentType.objects.using(self.bank_db).get(
-                    app_label='accounts', model='personalaccount'
-                )
-                agency_account_ct = ContentType.objects.using(self.bank_db).get(
-                    app_label='accounts', model='agencyaccount'
-                )
-                intern_account_ct = ContentType.objects.using(self.bank_db).get(
-                    app_label='accounts', model='internaccount'
-                )
-            except ContentType.DoesNotExist:
-                # Fallback vers la base principale si pas trouvé
-                personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-                agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-                intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-            # Débiter le compte agence
-            agency_account.balance -= amount
-            agency_account.save(using=self.bank_db)
-
-            # Créditer le compte client
-            destination_account.balance += amount
-            destination_account.save(using=self.bank_db)
-
-            # Gestion de la commission agence si applicable
-            if deposit_percentage is not None and agency_commission > 0:
-                # Débiter le compte commission
-                commission_account.balance -= agency_commission
-                commission_account.save(using=self.bank_db)
-
-                # Créditer l'agence avec sa commission
-                agency_account.balance += agency_commission
-                agency_account.save(using=self.bank_db)
-
-                # Créer la transaction de commission
-                Transaction.objects.using(self.bank_db).create(
-                    type='paiement',
-                    amount=agency_commission,
-                    source_account_type=intern_account_ct,
-                    source_account_id=commission_account.id,
-                    destination_account_type=agency_account_ct,
-                    destination_account_id=agency_account.id,
-                    status='success'
+        posting = posting_service.deposit(
+            agency_account,
+            destination_account,
+            amount,
+            commission=commission_account,
+            agency_commission=agency_commission,
+            type=type_transaction,
+        )
+        try:
+            return posting_service.post(self.bank_db, posting)[0]
+        except InsufficientFundsError as e:
+            if e.account is commission_account:
+                raise serializers.ValidationError(
+                    {"fee": "Solde insuffisant sur le compte de commission pour couvrir la part de commission."}
                 )
-
-            # Créer la transaction principale de dépôt
-            transaction_obj = Transaction.objects.using(self.bank_db).create(
-                type=type_transaction,
-                amount=amount,
-                source_account_type=agency_account_ct,
-                source_account_id=agency_account.id,
-                destination_account_type=personal_account_ct,
-                destination_account_id=destination_account.id,
-                status='success'
+            raise serializers.ValidationError(
+                {"amount": "Solde insuffisant sur le compte de l'agence."}
             )
 
-        return transaction_obj
-
 class RetraitMarchantSerializer(serializers.ModelSerializer):
     client_phone = serializers.CharField()
     agency_phone = serializers.CharField()
@@ -806,76 +708,31 @@ class RetraitMarchantSerializer(serializers.ModelSerializer):
                 {"amount": "Solde insuffisant sur le compte de l'agence."}
             )
 
-        with transaction.atomic(using=self.bank_db):
-            # ContentTypes pour les comptes
-            business_account_ct = ContentType.objects.get_for_model(BusinessAccount)
-            agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-            intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-            # Débiter le compte business (marchand)
-            destination_account.balance -= amount
-            destination_account.save(using=self.bank_db)
-
-            # Créditer le compte agence
-            agency_account.balance += amount
-            agency_account.save(using=self.bank_db)
-
-            # Gestion de la commission agence si applicable
-            if retrai_percentage is not None and agency_commission > 0:
-                # Débiter le compte commission
-                commission_account.balance -= agency_commission
-                commission_account.save(using=self.bank_db)
-
-                # Créditer l'agence avec sa commission
-                agency_account.balance += agency_commission
-                agency_account.save(using=self.bank_db)
-
-                # Créer la transaction de commission
-                Transaction.objects.using(self.bank_db).create(
-                    type='paiement',
-                    amount=agency_commission,
-                    source_account_type=intern_account_ct,
-                    source_account_id=commission_account.id,
-                    destination_account_type=agency_account_ct,
-                    destination_account_id=agency_account.id,
-                    status='success'
+        posting = posting_service.merchant_cash_out(
+            destination_account,
+            agency_account,
+            amount,
+            commission=commission_account,
+            agency_commission=agency_commission,
+            type=type_transaction,
+        )
+        try:
+            return posting_service.post(self.bank_db, posting)[0]
+        except InsufficientFundsError as e:
+            if e.account is commission_account:
+                raise serializers.ValidationError(
+                    {"fee": "Solde insuffisant sur le compte de commission pour couvrir la part de commission."}
                 )
-
-            # Créer la transaction principale de retrait marchand
-            transaction_obj = Transaction.objects.using(self.bank_db).create(
-                type=type_transaction,
-                amount=amount,
-                source_account_type=business_account_ct,
-                source_account_id=destination_account.id,
-                destination_account_type=agency_account_ct,
-                destination_account_id=agency_account.id,
-                status='success'
+            raise serializers.ValidationError(
+                f"Solde insuffisant. Solde actuel : {destination_account.balance}"
             )
 
-        return transaction_obj
-
-def calculate_available_balance(bank_db, client_phone, account_balance, fee_calculator):
-    
-    
-    pending_pre_transactions = PreTransaction.objects.using(bank_db).filter(
-        client_phone=client_phone,
-        is_used=False
-    )
-    
-    
-    active_pre_transactions = [pt for pt in pending_pre_transactions if pt.is_active()]
-    
-    
-    reserved_amount = Decimal('0.00')
-    for pt in active_pre_transactions:
-        amount = pt.amount
-        fee = fee_calculator.get_fee_from_db(bank_db, "withdrawal", float(amount)) or 0
-        reserved_amount += amount + Decimal(str(fee))
-    
-  
-    available_balance = account_balance - reserved_amount
-    
-    return available_balance, reserved_amount
+def calculate_available_balance(account):
+    """
+    (disponible, réservé) : les réservations des pré-transactions actives sont
+    maintenues dans account.reserved_amount, aucune pré-transaction n'est relue.
+    """
+    return account.available_balance, account.reserved_amount
 
 
 class RechargeAgencySerializer(serializers.ModelSerializer):
@@ -952,48 +809,16 @@ class RechargeAgencySerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(f"Erreur lors de la validation : {str(e)}")
     
     def create(self, validated_data):
-        user = validated_data['user']
-        agency_account = validated_data['agency_account']
-        amount = validated_data['amount']
         phone_number = validated_data['phone_number']
         
-        recharge_transaction = None
-        
+        posting = posting_service.agency_recharge(
+            validated_data['agency_account'], validated_data['amount']
+        )
         try:
-            with transaction.atomic(using=self.bank_db):
-                # ContentType pour le compte d'agence
-                agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-                
-                # Créer la transaction de recharge
-                recharge_transaction = Transaction.objects.using(self.bank_db).create(
-                    type='deposit',
-                    amount=amount,
-                    source_account_type=None,  # Pas de compte source pour une recharge externe
-                    source_account_id=None,
-                    destination_account_type=agency_account_ct,
-                    destination_account_id=agency_account.id,
-                    status='pending'
-                )
-                
-                # Mettre à jour le solde de l'agence
-                agency_account.balance += amount
-                agency_account.save(using=self.bank_db)
-                
-                # Marquer la transaction comme réussie
-                recharge_transaction.status = 'success'
-                recharge_transaction.save(using=self.bank_db)
-                
-                return recharge_transaction
+            # Une recharge en échec reste tracée avec le statut 'failure'
+            return posting_service.post(self.bank_db, posting, record_failure=True)[0]
                 
         except Exception as e:
-            # Gestion des erreurs
-            if recharge_transaction:
-                try:
-                    recharge_transaction.status = 'failure'
-                    recharge_transaction.save(using=self.bank_db)
-                except Exception:
-                    pass
-            
             error_message = f"Échec de la recharge d'agence pour {phone_number}: {str(e)}"
-            print(f"ERREUR: {error_message}")
+            logger.error(error_message)
             raise serializers.ValidationError(error_message)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.metrics import metrics
+from ..models import PreTransaction
+from .hold_service import release_expired_holds
+
+logger = logging.getLogger(__name__)
+
+
+def _expired_querysets(bank_db, now):
+    """(nom, queryset des lignes expirées) pour chaque table purgée"""
+    return [
+        # Pré-transactions non utilisées et expirées dont la réservation est libérée ;
+        # les pré-transactions utilisées restent comme historique des retraits
+        ('pretransaction', PreTransaction.objects.using(bank_db).filter(
+            is_used=False, expires_at__lt=now, hold_amount=0
+        )),
+    ]
+
+
+def _delete_in_batches(queryset, batch_size, max_batches):
+    deleted = 0
+    for _ in range(max_batches):
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        deleted += queryset.model.objects.using(queryset.db).filter(pk__in=pks).delete()[0]
+        if len(pks) < batch_size:
+            break
+    return deleted
+
+
+def sweep_bank(bank_db, batch_size=None, max_batches=None):
+    """
+    Purge les lignes expirées d'une banque par lots de batch_size (au plus
+    max_batches lots par table et par passage, pour borner la durée des
+    verrous). Les réservations expirées sont libérées avant la purge des
+    pré-transactions. Retourne {table: lignes supprimées}.
+    """
+    batch_size = batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE
+    max_batches = max_batches or settings.EXPIRY_SWEEP_MAX_BATCHES
+    started = time.monotonic()
+
+    released = 0
+    for _ in range(max_batches):
+        count = release_expired_holds(bank_db, limit=batch_size)
+        released += count
+        if count < batch_size:
+            break
+
+    now = timezone.now()
+    results = {'holds_released': released}
+    for name, queryset in _expired_querysets(bank_db, now):
+        deleted = _delete_in_batches(queryset, batch_size, max_batches)
+        results[name] = deleted
+        if deleted:
+            metrics.inc('expiry_sweep_deleted_total', deleted, bank=bank_db, table=name)
+
+    duration = time.monotonic() - started
+    metrics.observe('expiry_sweep_duration_seconds', duration, bank=bank_db)
+    metrics.set('expiry_sweep_last_success_timestamp', time.time(), bank=bank_db)
+    logger.info(f"Purge des lignes expirées sur {bank_db} en {duration:.2f}s : {results}")
+    return results
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_left
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from core.cache_versions import bump_version, get_version
+from ..models import FeeRule
+
+logger = logging.getLogger(__name__)
+
+
+def _version_name(bank_db):
+    return f"fee-schedule:{bank_db}"
+
+
+def to_decimal(amount):
+    """Convertit un montant (str, int, float, Decimal) sans passer par float ; NaN et infinis refusés"""
+    if isinstance(amount, Decimal):
+        value = amount
+    else:
+        try:
+            value = Decimal(str(amount))
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Montant invalide : {amount}")
+    if not value.is_finite():
+        raise ValueError(f"Montant invalide : {amount}")
+    return value
+
+
+class CompiledFeeSchedule:
+    """
+    Barème de frais d'une banque compilé en mémoire : pour chaque type de
+    transaction, les plafonds max_amount triés et les frais correspondants.
+    Le frais d'un montant est celui de la première règle telle que
+    montant <= max_amount (même résultat que l'ancien parcours des FeeRule).
+    """
+
+    def __init__(self, rules, version):
+        self.version = version
+        self._tables = {}
+        for transaction_type, max_amount, fee_amount in rules:
+            bounds, fees = self._tables.setdefault(transaction_type, ([], []))
+            bounds.append(max_amount)
+            fees.append(fee_amount)
+        self.etag = self._fingerprint(rules)
+
+    @staticmethod
+    def _fingerprint(rules):
+        digest = hashlib.sha256()
+        for rule in rules:
+            digest.update('|'.join(str(value) for value in rule).encode())
+            digest.update(b'\n')
+        return digest.hexdigest()[:32]
+
+    def fee_for(self, transaction_type, amount):
+        """Frais en Decimal, ou None si aucune règle (type désactivé ou montant hors barème)"""
+        table = self._tables.get(transaction_type)
+        if table is None:
+            return None
+        bounds, fees = table
+        index = bisect_left(bounds, to_decimal(amount))
+        if index == len(bounds):
+            return None
+        return fees[index]
+
+    def rules(self):
+        """Barème publiable : {type: [(max_amount, fee_amount), ...]}"""
+        return {
+            transaction_type: list(zip(bounds, fees))
+            for transaction_type, (bounds, fees) in sorted(self._tables.items())
+        }
+
+
+class FeeScheduleRegistry:
+    """
+    Barèmes compilés par banque. Une écriture de FeeRule reconstruit le barème
+    après commit puis remplace la référence en une seule affectation : les
+    lectures concurrentes voient l'ancien ou le nouveau barème, jamais un
+    mélange. Les autres workers suivent via le tampon de version du cache,
+    vérifié au plus toutes les FEE_SCHEDULE_CHECK_INTERVAL secondes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._schedules = {}
+        self._checked_at = {}
+
+    def _lock_for(self, bank_db):
+        """Verrou propre à la banque : une base lente ne bloque pas les barèmes des autres"""
+        lock = self._locks.get(bank_db)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(bank_db, threading.Lock())
+        return lock
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'FEE_SCHEDULE_CHECK_INTERVAL', 5)
+
+    def _compile(self, bank_db, version):
+        rules = list(
+            FeeRule.objects.using(bank_db)
+            .order_by('transaction_type', 'max_amount', 'id')
+            .values_list('transaction_type', 'max_amount', 'fee_amount')
+        )
+        schedule = CompiledFeeSchedule(rules, version)
+        self._schedules[bank_db] = schedule
+        logger.info(f"Barème de frais compilé pour {bank_db}: {len(rules)} règle(s), version {version}")
+        return schedule
+
+    def get(self, bank_db):
+        schedule = self._schedules.get(bank_db)
+        now = time.monotonic()
+        if schedule is not None and now - self._checked_at.get(bank_db, 0) < self.check_interval:
+            return schedule
+
+        # Lecture du tampon (cache) hors verrou ; seule la compilation est sérialisée
+        version = get_version(_version_name(bank_db))
+        if schedule is not None and schedule.version == version:
+            self._checked_at[bank_db] = now
+            return schedule
+
+        with self._lock_for(bank_db):
+            schedule = self._schedules.get(bank_db)
+            if schedule is None or schedule.version != version:
+                schedule = self._compile(bank_db, version)
+            self._checked_at[bank_db] = now
+            return schedule
+
+    def refresh(self, bank_db):
+        """Publie une nouvelle version et recompile immédiatement dans ce processus"""
+        version = bump_version(_version_name(bank_db))
+        with self._lock_for(bank_db):
+            self._compile(bank_db, version)
+            self._checked_at[bank_db] = time.monotonic()
+
+    def fee_for(self, bank_db, transaction_type, amount):
+        return self.get(bank_db).fee_for(transaction_type, amount)
+
+
+fee_schedules = FeeScheduleRegistry()
@@ -0,0 +1,116 @@
+import logging
+
+from django.db import connections, transaction
+
+from apps.accounts.models import PersonalAccount
+from core.metrics import metrics
+from ..models import PreTransaction
+from .posting_service import InsufficientFundsError, apply_balance_changes, run_posting
+
+logger = logging.getLogger(__name__)
+
+
+def place_hold(bank_db, pre_transaction, account, hold_amount):
+    """
+    Crée la pré-transaction et réserve hold_amount (montant + frais) sur le
+    compte dans la même transaction. La réservation n'est acceptée que si
+    balance - reserved_amount la couvre ; en cas de refus, les réservations
+    expirées du compte sont libérées puis la réservation est retentée une fois.
+    """
+    def operation():
+        apply_balance_changes(bank_db, [], reserve_changes=[(account, hold_amount)])
+        pre_transaction.account = account
+        pre_transaction.hold_amount = hold_amount
+        pre_transaction.save(using=bank_db)
+        return pre_transaction
+
+    try:
+        return run_posting(bank_db, operation)
+    except InsufficientFundsError:
+        if not release_expired_holds(bank_db, account_id=account.pk):
+            raise
+        return run_posting(bank_db, operation)
+
+
+def _release_holds(bank_db, condition, params, limit=None, skip_locked=False):
+    """
+    Libère en une requête les réservations sélectionnées : hold_amount passe à 0
+    et reserved_amount des comptes concernés diminue d'autant. Retourne le
+    nombre de pré-transactions libérées.
+    """
+    connection = connections[bank_db]
+    quote = connection.ops.quote_name
+    pre_transactions = quote(PreTransaction._meta.db_table)
+    accounts = quote(PersonalAccount._meta.db_table)
+    lock = 'FOR UPDATE SKIP LOCKED' if skip_locked else 'FOR UPDATE'
+    limit_sql = 'LIMIT %s' if limit else ''
+
+    sql = (
+        f"WITH candidates AS ("
+        f"SELECT id, account_id, hold_amount FROM {pre_transactions} "
+        f"WHERE hold_amount > 0 AND {condition} ORDER BY id {limit_sql} {lock}"
+        f"), released AS ("
+        f"UPDATE {pre_transactions} AS pre SET hold_amount = 0 FROM candidates "
+        f"WHERE pre.id = candidates.id "
+        f"RETURNING candidates.account_id, candidates.hold_amount"
+        f"), totals AS ("
+        f"SELECT account_id, SUM(hold_amount) AS amount FROM released "
+        f"WHERE account_id IS NOT NULL GROUP BY account_id"
+        f"), accounts AS ("
+        f"UPDATE {accounts} AS account "
+        f"SET reserved_amount = GREATEST(account.reserved_amount - totals.amount, 0) "
+        f"FROM totals WHERE account.id = totals.account_id RETURNING account.id"
+        f") SELECT COUNT(*) FROM released"
+    )
+    with transaction.atomic(using=bank_db), connection.cursor() as cursor:
+        cursor.execute(sql, params + ([limit] if limit else []))
+        return cursor.fetchone()[0]
+
+
+def release_hold(bank_db, pre_transaction_id):
+    """Libère la réservation d'une pré-transaction annulée"""
+    return _release_holds(bank_db, "id = %s", [pre_transaction_id])
+
+
+def release_expired_holds(bank_db, account_id=None, limit=500):
+    """
+    Libère les réservations des pré-transactions non utilisées et expirées,
+    pour un compte ou pour toute la banque (par lots de limit lignes).
+    """
+    condition = "is_used = false AND expires_at <= now()"
+    params = []
+    if account_id is not None:
+        condition += " AND account_id = %s"
+        params.append(account_id)
+    released = _release_holds(bank_db, condition, params, limit=limit, skip_locked=True)
+    if released:
+        metrics.inc('holds_expired_total', released, bank=bank_db)
+        logger.info(f"{released} réservation(s) expirée(s) libérée(s) sur {bank_db}")
+    return released
+
+
+def claim_pre_transaction(bank_db, client_phone, code, amount=None):
+    """
+    Consomme un code de retrait en une requête conditionnelle : la ligne n'est
+    marquée utilisée (et sa réservation remise à 0) que si elle est encore
+    inutilisée et non expirée. Retourne (id, amount, hold_amount, account_id)
+    de la pré-transaction réclamée, ou None. À appeler dans la transaction qui
+    enregistre le retrait : un échec ultérieur annule aussi la réclamation.
+    """
+    connection = connections[bank_db]
+    table = connection.ops.quote_name(PreTransaction._meta.db_table)
+    condition = "client_phone = %s AND code = %s AND is_used = false AND expires_at > now()"
+    params = [client_phone, code]
+    if amount is not None:
+        condition += " AND amount = %s"
+        params.append(amount)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} AS pre SET is_used = true, hold_amount = 0 "
+            f"FROM (SELECT id, hold_amount FROM {table} WHERE {condition} FOR UPDATE) AS claimed "
+            f"WHERE pre.id = claimed.id "
+            f"RETURNING pre.id, pre.amount, claimed.hold_amount, pre.account_id",
+            params,
+        )
+        return cursor.fetchone()
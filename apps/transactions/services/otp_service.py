@@ -1,77 +1,47 @@
-import requests
-from django.conf import settings
 from ..models import OTPVerification
+from .otp_store import INVALID, LOCKED, VERIFIED, get_otp_store, otp_key
+from .sms_outbox import enqueue_sms
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Validité du code envoyé, et durée pendant laquelle un numéro vérifié peut s'inscrire
+OTP_TTL_SECONDS = 60
+VERIFIED_TTL_SECONDS = 600
+MAX_ATTEMPTS = 3
+
 class OTPService:
-    def __init__(self):
-        self.validation_key = settings.CHINGUISOFT_VALIDATION_KEY
-        self.validation_token = settings.CHINGUISOFT_VALIDATION_TOKEN
-        self.base_url = "https://chinguisoft.com/api/sms/validation"
+    """
+    OTP de vérification du numéro. Les codes vivent dans le stockage OTP
+    (services.otp_store), pas dans la base de la banque ; les SMS passent par
+    la file d'envoi puis par le client partagé de la passerelle (services.sms_gateway).
+    """
     
     def send_otp(self, phone_number, lang='fr', db_alias='default'):
         """
-        Envoie un OTP au numéro de téléphone
+        Enregistre un OTP dans le stockage OTP (durée de vie native) et met
+        son SMS en file d'envoi (commande sms_worker) : la requête n'attend pas
+        la passerelle SMS. message_id permet de suivre la livraison.
         """
         try:
             # Valider le format du numéro
             if not self._validate_phone_number(phone_number):
                 return {'success': False, 'error': 'Format de numéro invalide'}
             
-            # Supprimer les anciens OTP pour ce numéro
-            OTPVerification.objects.using(db_alias).filter(
-                phone_number=phone_number
-            ).delete()
-            
-            # Générer un nouveau code OTP
+            # Nouveau code : remplace le précédent pour ce numéro
             otp_code = OTPVerification.generate_otp()
+            get_otp_store().issue(
+                otp_key(db_alias, 'verification', phone_number), otp_code, OTP_TTL_SECONDS
+            )
+            message = enqueue_sms(db_alias, phone_number, otp_code, lang, purpose='verification')
             
-            # Préparer la requête vers Chinguisoft
-            url = f"{self.base_url}/{self.validation_key}"
-            headers = {
-                'Validation-token': self.validation_token,
-                'Content-Type': 'application/json'
-            }
-            data = {
-                'phone': phone_number,
-                'lang': lang,
-                'code': otp_code
-            }
-            
-            # Envoyer la requête
-            response = requests.post(url, headers=headers, json=data, timeout=10)
-            
-            if response.status_code == 200:
-                # Sauvegarder l'OTP dans la base de données
-                otp_verification = OTPVerification.objects.using(db_alias).create(
-                    phone_number=phone_number,
-                    otp_code=otp_code
-                )
-                
-                response_data = response.json()
-                logger.info(f"OTP envoyé avec succès pour {phone_number}")
-                
-                return {
-                    'success': True,
-                    'message': 'OTP envoyé avec succès',
-                    'balance': response_data.get('balance', 0)
-                }
-            else:
-                error_data = response.json()
-                logger.error(f"Erreur lors de l'envoi OTP: {error_data}")
-                return {
-                    'success': False,
-                    'error': self._handle_api_error(response.status_code, error_data)
-                }
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur réseau lors de l'envoi OTP: {str(e)}")
+            logger.info(f"OTP mis en file d'envoi pour {phone_number} ({message.pk})")
             return {
-                'success': False,
-                'error': 'Erreur de connexion au service SMS'
+                'success': True,
+                'message': "OTP en cours d'envoi",
+                'message_id': message.pk
             }
+                
         except Exception as e:
             logger.error(f"Erreur inattendue lors de l'envoi OTP: {str(e)}")
             return {
@@ -81,56 +51,35 @@ class OTPService:
     
     def verify_otp(self, phone_number, otp_code, db_alias='default'):
         """
-        Vérifie le code OTP
+        Vérifie le code OTP (tentative comptée et code consommé atomiquement)
         """
         try:
-            # Nettoyer les OTP expirés
-            OTPVerification.cleanup_expired(db_alias)
-            
-            # Récupérer l'OTP le plus récent pour ce numéro
-            otp_verification = OTPVerification.objects.using(db_alias).filter(
-                phone_number=phone_number,
-                is_verified=False
-            ).order_by('-created_at').first()
-            
-            if not otp_verification:
-                return {
-                    'success': False,
-                    'error': 'Aucun OTP trouvé pour ce numéro'
-                }
-            
-            if otp_verification.is_expired():
-                return {
-                    'success': False,
-                    'error': 'Le code OTP a expiré'
-                }
-            
-            if otp_verification.attempts >= 3:
-                return {
-                    'success': False,
-                    'error': 'Trop de tentatives. Demandez un nouveau code.'
-                }
-            
-            # Incrémenter le compteur de tentatives
-            otp_verification.attempts += 1
-            otp_verification.save(using=db_alias)
+            store = get_otp_store()
+            result, remaining_attempts = store.verify(
+                otp_key(db_alias, 'verification', phone_number), otp_code, MAX_ATTEMPTS
+            )
             
-            if otp_verification.otp_code == otp_code:
-                # Marquer comme vérifié
-                otp_verification.is_verified = True
-                otp_verification.save(using=db_alias)
-                
+            if result == VERIFIED:
+                store.set(otp_key(db_alias, 'verified', phone_number), '1', VERIFIED_TTL_SECONDS)
                 logger.info(f"OTP vérifié avec succès pour {phone_number}")
                 return {
                     'success': True,
                     'message': 'Code OTP vérifié avec succès'
                 }
-            else:
-                remaining_attempts = 3 - otp_verification.attempts
+            if result == INVALID:
                 return {
                     'success': False,
                     'error': f'Code OTP incorrect. {remaining_attempts} tentatives restantes.'
                 }
+            if result == LOCKED:
+                return {
+                    'success': False,
+                    'error': 'Trop de tentatives. Demandez un nouveau code.'
+                }
+            return {
+                'success': False,
+                'error': 'Aucun OTP valide pour ce numéro (expiré ou inexistant)'
+            }
                 
         except Exception as e:
             logger.error(f"Erreur lors de la vérification OTP: {str(e)}")
@@ -143,16 +92,7 @@ class OTPService:
         """
         Vérifie si un numéro de téléphone a été vérifié récemment (dans les 10 dernières minutes)
         """
-        from datetime import timedelta
-        from django.utils import timezone
-        
-        recent_time = timezone.now() - timedelta(minutes=10)
-        
-        return OTPVerification.objects.using(db_alias).filter(
-            phone_number=phone_number,
-            is_verified=True,
-            created_at__gte=recent_time
-        ).exists()
+        return get_otp_store().get(otp_key(db_alias, 'verified', phone_number)) is not None
     
     def _validate_phone_number(self, phone_number):
         """
@@ -168,17 +108,3 @@ class OTPService:
             return False
         
         return True
-    
-    def _handle_api_error(self, status_code, error_data):
-        """
-        Gère les erreurs de l'API Chinguisoft
-        """
-        error_messages = {
-            401: "Clés d'authentification invalides",
-            402: "Solde insuffisant pour envoyer le SMS",
-            422: "Données invalides",
-            429: "Trop de requêtes, veuillez ralentir",
-            503: "Service temporairement indisponible"
-        }
-        
-        return error_messages.get(status_code, f"Erreur inconnue: {error_data}")
@@ -0,0 +1,197 @@
+import hmac
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Résultats de OTPStore.verify
+VERIFIED = 'verified'
+INVALID = 'invalid'
+MISSING = 'missing'
+LOCKED = 'locked'
+
+
+class OTPStore(ABC):
+    """
+    Stockage des codes OTP hors des bases des banques : chaque entrée a une
+    durée de vie native, un compteur de tentatives, et la vérification
+    consomme le code de façon atomique (un code ne valide qu'une fois).
+    """
+
+    @abstractmethod
+    def issue(self, key, code, ttl):
+        """Enregistre un nouveau code (remplace le précédent, tentatives remises à 0)"""
+
+    @abstractmethod
+    def verify(self, key, code, max_attempts):
+        """
+        Compte une tentative et consomme le code s'il est correct.
+        Retourne (résultat, tentatives restantes).
+        """
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Écrit value sous key pour ttl secondes"""
+
+    @abstractmethod
+    def add(self, key, value, ttl):
+        """Écrit seulement si la clé n'existe pas ; True si écrite"""
+
+    @abstractmethod
+    def get(self, key):
+        """Valeur de key, ou None si absente ou expirée"""
+
+    @abstractmethod
+    def consume(self, key, value):
+        """Supprime la clé si elle vaut value ; True si supprimée"""
+
+
+class MemoryOTPStore(OTPStore):
+    """Backend en mémoire du processus : développement et instance unique"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _purge(self):
+        now = time.monotonic()
+        for key in [key for key, (_, expires) in self._data.items() if expires <= now]:
+            del self._data[key]
+
+    def _put(self, key, value, ttl):
+        if len(self._data) > 10000:
+            self._purge()
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    def issue(self, key, code, ttl):
+        with self._lock:
+            self._put(key, {'code': code, 'attempts': 0}, ttl)
+
+    def verify(self, key, code, max_attempts):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return MISSING, 0
+            record = entry[0]
+            if record['attempts'] >= max_attempts:
+                return LOCKED, 0
+            record['attempts'] += 1
+            if hmac.compare_digest(record['code'].encode(), str(code).encode()):
+                del self._data[key]
+                return VERIFIED, 0
+            return INVALID, max_attempts - record['attempts']
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def consume(self, key, value):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or not hmac.compare_digest(str(entry[0]).encode(), str(value).encode()):
+                return False
+            del self._data[key]
+            return True
+
+
+class RedisOTPStore(OTPStore):
+    """
+    Backend Redis (protocole Redis : Redis, Valkey, KeyDB...) partagé par
+    tous les workers. Les opérations composées sont des scripts Lua,
+    exécutés atomiquement par le serveur.
+    """
+
+    VERIFY_SCRIPT = """
+    local code = redis.call('HGET', KEYS[1], 'code')
+    if not code then return {'missing', 0} end
+    local max_attempts = tonumber(ARGV[2])
+    local attempts = tonumber(redis.call('HGET', KEYS[1], 'attempts'))
+    if attempts >= max_attempts then return {'locked', 0} end
+    attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+    if code == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        return {'verified', 0}
+    end
+    return {'invalid', max_attempts - attempts}
+    """
+
+    CONSUME_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._verify = client.register_script(self.VERIFY_SCRIPT)
+        self._consume = client.register_script(self.CONSUME_SCRIPT)
+
+    def issue(self, key, code, ttl):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={'code': code, 'attempts': 0})
+        pipeline.expire(key, int(ttl))
+        pipeline.execute()
+
+    def verify(self, key, code, max_attempts):
+        result, remaining = self._verify(keys=[key], args=[code, max_attempts])
+        return result, int(remaining)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=int(ttl))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(key, value, ex=int(ttl), nx=True))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def consume(self, key, value):
+        return bool(self._consume(keys=[key], args=[value]))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store():
+    """Backend choisi par OTP_STORE_BACKEND ('memory' ou 'redis')"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = settings.OTP_STORE_BACKEND
+                if backend == 'memory':
+                    _store = MemoryOTPStore()
+                elif backend == 'redis':
+                    from core.redis_client import get_redis
+                    _store = RedisOTPStore(get_redis())
+                else:
+                    raise ImproperlyConfigured(f"OTP_STORE_BACKEND inconnu : {backend}")
+    return _store
+
+
+def otp_key(bank_db, purpose, phone_number):
+    return f"otp:{bank_db}:{purpose}:{phone_number}"
@@ -1,22 +1,25 @@
 # services/password_reset_otp_service.py - Version corrigée
 
 import random
-import requests
 import logging
-from django.utils import timezone
 from django.conf import settings
-from datetime import timedelta
 from ..models import PasswordResetOTP  
+from .otp_store import INVALID, LOCKED, VERIFIED, get_otp_store, otp_key
+from .sms_outbox import enqueue_sms
 from apps.users.models import User
 
 logger = logging.getLogger(__name__)
+
+# Validité du code et du token de réinitialisation, délai minimal entre deux envois
+RESET_TTL_SECONDS = 600
+RESEND_INTERVAL_SECONDS = 60
+MAX_ATTEMPTS = 3
+
 class PasswordResetOTPService:
     def __init__(self):
-        # MÊME FORMAT QUE VOTRE OTPService QUI MARCHE
-        self.validation_key = settings.CHINGUISOFT_VALIDATION_KEY
-        self.validation_token = settings.CHINGUISOFT_VALIDATION_TOKEN
-        self.base_url = "https://chinguisoft.com/api/sms/validation"
-        
+        # Les SMS passent par la file d'envoi puis par le client partagé de la
+        # passerelle (services.sms_gateway), comme pour OTPService
+
         # MODE DÉVELOPPEMENT
         self.dev_mode = getattr(settings, 'OTP_DEV_MODE', False)
         self.dev_otp = getattr(settings, 'OTP_DEV_CODE', '123456')
@@ -47,94 +50,38 @@ class PasswordResetOTPService:
                     'error': 'Aucun compte trouvé avec ce numéro de téléphone'
                 }
 
-            # Nettoyer les anciens OTP expirés pour cet utilisateur
-            self._cleanup_expired_otps(user, bank_db)
-
             # Vérifier le délai entre les envois (anti-spam)
-            if not self._can_send_otp(user, bank_db):
+            if not self._can_send_otp(phone_number, bank_db):
                 return {
                     'success': False,
                     'error': 'Veuillez attendre avant de demander un nouveau code'
                 }
 
-            # Générer le code OTP
             if self.dev_mode:
+                # Mode développement - OTP fixe, pas d'envoi de SMS
                 otp_code = self.dev_otp
-                logger.info(f"🚀 MODE DEV RESET: Utilisation OTP fixe {otp_code}")
-            else:
-                otp_code = self._generate_otp()
-
-            # Décider si envoyer vraiment ou simuler
-            if self.dev_mode:
-                # Mode développement - simuler l'envoi
                 logger.info(f"🚀 MODE DEV RESET: SMS simulé pour {phone_number} avec code {otp_code}")
-                sms_success = True
-                response_data = {'balance': 99, 'dev_mode': True}
-            else:
-                # Mode production - utiliser EXACTEMENT le même format que votre OTPService
-                url = f"{self.base_url}/{self.validation_key}"
-                headers = {
-                    'Validation-token': self.validation_token,
-                    'Content-Type': 'application/json'
-                }
-                data = {
-                    'phone': phone_number,
-                    'lang': lang,
-                    'code': otp_code
-                }
-                
-                logger.info(f"Envoi SMS reset vers: {url}")
-                logger.info(f"Headers: {headers}")
-                logger.info(f"Data: {data}")
-                
-                # Envoyer la requête - EXACTEMENT COMME VOTRE OTPService
-                response = requests.post(url, headers=headers, json=data, timeout=10)
-                
-                logger.info(f"Response status: {response.status_code}")
-                logger.info(f"Response text: {response.text}")
-                
-                if response.status_code == 200:
-                    sms_success = True
-                    response_data = response.json()
-                elif response.status_code == 500:
-                    # Si erreur 500, basculer en mode dev temporairement
-                    logger.warning("⚠️ Erreur 500 Chinguisoft - Basculement temporaire mode dev")
-                    sms_success = True
-                    response_data = {'balance': 0, 'fallback_mode': True}
-                    otp_code = self.dev_otp  # Utiliser code fixe
-                else:
-                    sms_success = False
-                    error_data = response.json() if response.text else {}
-                    logger.error(f"Erreur lors de l'envoi OTP reset: {error_data}")
-                    return {
-                        'success': False,
-                        'error': self._handle_api_error(response.status_code, error_data)
-                    }
-            
-            if sms_success:
-                # Sauvegarder l'OTP dans la base de données spécifiée avec l'utilisateur
-                self._save_reset_otp(user, otp_code, bank_db)
-                
-                logger.info(f"✅ OTP de réinitialisation envoyé avec succès à {phone_number} (DB: {bank_db})")
-                
-                # Message de réponse
-                message = 'Code de réinitialisation envoyé avec succès'
-                if self.dev_mode or response_data.get('dev_mode') or response_data.get('fallback_mode'):
-                    message += f' (CODE: {otp_code})'
-                
+                self._save_reset_otp(phone_number, otp_code, bank_db)
                 return {
                     'success': True,
-                    'message': message,
-                    'balance': response_data.get('balance', 0),
-                    'dev_mode': self.dev_mode or response_data.get('fallback_mode', False)
+                    'message': f'Code de réinitialisation envoyé avec succès (CODE: {otp_code})',
+                    'balance': 99,
+                    'dev_mode': True
                 }
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur réseau lors de l'envoi OTP reset: {str(e)}")
+            # Mode production - le SMS part en file d'envoi (commande sms_worker)
+            otp_code = self._generate_otp()
+            self._save_reset_otp(phone_number, otp_code, bank_db)
+            message = enqueue_sms(bank_db, phone_number, otp_code, lang, purpose='password_reset')
+
+            logger.info(f"✅ OTP de réinitialisation mis en file d'envoi pour {phone_number} (DB: {bank_db})")
             return {
-                'success': False,
-                'error': 'Erreur de connexion au service SMS'
+                'success': True,
+                'message': "Code de réinitialisation en cours d'envoi",
+                'message_id': message.pk,
+                'dev_mode': False
             }
+
         except Exception as e:
             logger.error(f"Erreur dans send_reset_otp (DB: {bank_db}): {str(e)}")
             return {
@@ -166,67 +113,41 @@ class PasswordResetOTPService:
                     'verified': False
                 }
 
-            # Nettoyer les OTP expirés 
-            self._cleanup_expired_otps_all(bank_db)
-            
-            # Chercher l'OTP pour cet utilisateur dans la base de données spécifiée
-            otp_record = PasswordResetOTP.objects.using(bank_db).filter(
-                user=user,
-                is_verified=False,
-                is_used=False
-            ).order_by('-created_at').first()
-
-            if not otp_record:
-                logger.warning(f"OTP invalide pour {phone_number} (DB: {bank_db})")
-                return {
-                    'success': False,
-                    'error': 'Aucun OTP trouvé pour ce numéro',
-                    'verified': False
-                }
-
-            # Vérifier l'expiration
-            if otp_record.is_expired():
-                logger.warning(f"OTP expiré pour {phone_number} (DB: {bank_db})")
-                return {
-                    'success': False,
-                    'error': 'Le code OTP a expiré',
-                    'verified': False
-                }
-
-            # Vérifier le nombre de tentatives (comme OTPService)
-            if otp_record.attempts >= 3:
-                return {
-                    'success': False,
-                    'error': 'Trop de tentatives. Demandez un nouveau code.',
-                    'verified': False
-                }
-
-            # Incrémenter les tentatives
-            otp_record.attempts += 1
-            otp_record.save(using=bank_db)
+            # Tentative comptée et code consommé atomiquement par le stockage OTP
+            store = get_otp_store()
+            result, remaining_attempts = store.verify(
+                otp_key(bank_db, 'password_reset', phone_number), otp_code, MAX_ATTEMPTS
+            )
 
-            # Vérifier le code
-            if otp_record.otp_code == otp_code:
-                # Marquer comme vérifié et générer le token
-                otp_record.is_verified = True
-                otp_record.verified_at = timezone.now()
-                otp_record.reset_token = PasswordResetOTP.generate_reset_token()
-                otp_record.save(using=bank_db)
+            if result == VERIFIED:
+                reset_token = PasswordResetOTP.generate_reset_token()
+                store.set(otp_key(bank_db, 'reset_token', phone_number), reset_token, RESET_TTL_SECONDS)
 
                 logger.info(f"OTP vérifié avec succès pour {phone_number} (DB: {bank_db})")
                 return {
                     'success': True,
                     'message': 'Code vérifié avec succès',
                     'verified': True,
-                    'reset_token': otp_record.reset_token
+                    'reset_token': reset_token
                 }
-            else:
-                remaining_attempts = 3 - otp_record.attempts
+            if result == INVALID:
                 return {
                     'success': False,
                     'error': f'Code OTP incorrect. {remaining_attempts} tentatives restantes.',
                     'verified': False
                 }
+            if result == LOCKED:
+                return {
+                    'success': False,
+                    'error': 'Trop de tentatives. Demandez un nouveau code.',
+                    'verified': False
+                }
+            logger.warning(f"OTP invalide ou expiré pour {phone_number} (DB: {bank_db})")
+            return {
+                'success': False,
+                'error': 'Aucun OTP valide pour ce numéro (expiré ou inexistant)',
+                'verified': False
+            }
 
         except Exception as e:
             logger.error(f"Erreur dans verify_reset_otp (DB: {bank_db}): {str(e)}")
@@ -258,23 +179,9 @@ class PasswordResetOTPService:
                     'error': 'Utilisateur introuvable'
                 }
 
-            # Vérifier le token de réinitialisation pour cet utilisateur dans la base spécifiée
-            otp_record = PasswordResetOTP.objects.using(bank_db).filter(
-                user=user,
-                reset_token=reset_token,
-                is_verified=True,
-                is_used=False
-            ).first()
-
-            if not otp_record:
-                logger.warning(f"Token invalide pour {phone_number} (DB: {bank_db})")
-                return {
-                    'success': False,
-                    'error': 'Token de réinitialisation invalide ou expiré'
-                }
-
-            if not otp_record.is_valid_for_reset():
-                logger.warning(f"Token expiré pour {phone_number} (DB: {bank_db})")
+            # Le token n'est valable qu'une fois : il est consommé avant la mise à jour
+            if not reset_token or not get_otp_store().consume(otp_key(bank_db, 'reset_token', phone_number), reset_token):
+                logger.warning(f"Token invalide ou expiré pour {phone_number} (DB: {bank_db})")
                 return {
                     'success': False,
                     'error': 'Token de réinitialisation invalide ou expiré'
@@ -283,18 +190,6 @@ class PasswordResetOTPService:
             # Réinitialiser le mot de passe
             user.set_password(new_password)
             user.save(using=bank_db)
-            logger.info(f"Mot de passe mis à jour pour {phone_number}")
-
-            # Marquer le token comme utilisé
-            otp_record.is_used = True
-            otp_record.save(using=bank_db)
-            logger.info(f"Token marqué comme utilisé pour {phone_number}")
-
-            # Nettoyer tous les anciens tokens de cet utilisateur dans cette base
-            deleted_count = PasswordResetOTP.objects.using(bank_db).filter(
-                user=user
-            ).exclude(id=otp_record.id).delete()[0]
-            logger.info(f"Supprimé {deleted_count} anciens tokens pour {phone_number}")
 
             logger.info(f"Mot de passe réinitialisé avec succès pour {phone_number} (DB: {bank_db})")
             return {
@@ -323,67 +218,20 @@ class PasswordResetOTPService:
         """Génère un code OTP à 6 chiffres - IDENTIQUE À VOTRE OTPService"""
         return str(random.randint(100000, 999999))
 
-    def _can_send_otp(self, user, bank_db, min_interval_minutes=1):
-        """Vérifie si on peut envoyer un nouvel OTP pour cet utilisateur (anti-spam)"""
+    def _can_send_otp(self, phone_number, bank_db):
+        """Anti-spam : un envoi par numéro et par RESEND_INTERVAL_SECONDS (clé à durée de vie)"""
         try:
-            recent_otp = PasswordResetOTP.objects.using(bank_db).filter(
-                user=user,
-                created_at__gte=timezone.now() - timedelta(minutes=min_interval_minutes)
-            ).exists()
-            return not recent_otp
+            return get_otp_store().add(
+                otp_key(bank_db, 'password_reset_cooldown', phone_number), '1', RESEND_INTERVAL_SECONDS
+            )
         except Exception as e:
             logger.error(f"Erreur lors de la vérification anti-spam (DB: {bank_db}): {str(e)}")
             return True  # En cas d'erreur, autoriser l'envoi
 
-    def _cleanup_expired_otps(self, user, bank_db):
-        """Nettoie les anciens OTP expirés pour un utilisateur spécifique"""
-        try:
-            deleted_count = PasswordResetOTP.objects.using(bank_db).filter(
-                user=user,
-                expires_at__lt=timezone.now()
-            ).delete()[0]
-            if deleted_count > 0:
-                logger.info(f"Supprimé {deleted_count} OTP expirés pour {user.phone_number} (DB: {bank_db})")
-        except Exception as e:
-            logger.error(f"Erreur lors du nettoyage OTP (DB: {bank_db}): {str(e)}")
-
-    def _cleanup_expired_otps_all(self, bank_db):
-        """Nettoie tous les OTP expirés dans la base - comme OTPService"""
-        try:
-            deleted_count = PasswordResetOTP.objects.using(bank_db).filter(
-                expires_at__lt=timezone.now()
-            ).delete()[0]
-            if deleted_count > 0:
-                logger.info(f"Supprimé {deleted_count} OTP expirés total (DB: {bank_db})")
-        except Exception as e:
-            logger.error(f"Erreur lors du nettoyage OTP global (DB: {bank_db}): {str(e)}")
-
-    def _save_reset_otp(self, user, otp_code, bank_db):
-        """Sauvegarde l'OTP de réinitialisation pour l'utilisateur dans la base spécifiée"""
-        try:
-            PasswordResetOTP.objects.using(bank_db).create(
-                user=user,
-                otp_code=otp_code
-            )
-            logger.info(f"OTP sauvegardé pour {user.phone_number} (DB: {bank_db})")
-        except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde OTP (DB: {bank_db}): {str(e)}")
-            raise
-
-    def _handle_api_error(self, status_code, error_data):
-        """
-        Gère les erreurs de l'API Chinguisoft - IDENTIQUE À VOTRE OTPService
-        """
-        error_messages = {
-            401: "Clés d'authentification invalides",
-            402: "Solde insuffisant pour envoyer le SMS",
-            422: "Données invalides",
-            429: "Trop de requêtes, veuillez ralentir",
-            500: "Service Chinguisoft temporairement indisponible",
-            503: "Service temporairement indisponible"
-        }
-        
-        return error_messages.get(status_code, f"Erreur inconnue: {error_data}")
+    def _save_reset_otp(self, phone_number, otp_code, bank_db):
+        """Enregistre l'OTP de réinitialisation dans le stockage OTP (remplace le précédent)"""
+        get_otp_store().issue(otp_key(bank_db, 'password_reset', phone_number), otp_code, RESET_TTL_SECONDS)
+        logger.info(f"OTP enregistré pour {phone_number} (DB: {bank_db})")
 
     def _validate_phone_number(self, phone_number):
         """
@@ -0,0 +1,302 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from apps.accounts.models import PersonalAccount
+from apps.accounts.services.summary_service import account_type, apply_summary_deltas
+from core.content_types import content_type_map
+from core.metrics import metrics
+from ..models import Fee, Transaction, generate_transaction_id
+from .rollup_service import record_rollups
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE PostgreSQL : serialization_failure et deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+MAX_ATTEMPTS = 5
+
+CENT = Decimal('0.01')
+
+
+class InsufficientFundsError(Exception):
+    """Un débit conditionnel n'a touché aucune ligne : solde insuffisant"""
+
+    def __init__(self, account):
+        self.account = account
+        super().__init__(
+            f"Solde insuffisant sur le compte {account.account_number}"
+        )
+
+
+class Leg:
+    """
+    Un mouvement d'une écriture : une ligne Transaction, un débit du compte
+    source et un crédit du compte destination (None = extérieur à la banque).
+    """
+
+    def __init__(self, type, amount, source=None, destination=None):
+        self.type = type
+        self.amount = Decimal(amount).quantize(CENT)
+        self.source = source
+        self.destination = destination
+
+
+class Posting:
+    """
+    Écriture complète : ses jambes, le cas échéant le montant du Fee rattaché
+    à la première jambe (la transaction principale) et les réservations
+    (compte, montant) libérées par l'écriture.
+    """
+
+    def __init__(self, legs, fee=None, releases=None):
+        self.legs = [leg for leg in legs if leg.amount > 0]
+        self.fee = fee
+        self.releases = releases or []
+
+    def reserve_changes(self):
+        return [(account, -amount) for account, amount in self.releases]
+
+    def balance_changes(self):
+        changes = []
+        for leg in self.legs:
+            if leg.source is not None:
+                changes.append((leg.source, -leg.amount))
+            if leg.destination is not None:
+                changes.append((leg.destination, leg.amount))
+        return changes
+
+
+# ---------------------------------------------------------------------------
+# Description des opérations
+# ---------------------------------------------------------------------------
+
+def transfer(source, destination, commission, amount, fee):
+    """Transfert entre comptes personnels, frais versés au compte commission"""
+    return Posting([
+        Leg('transfer', amount, source, destination),
+        Leg('paiement', fee, source, commission),
+    ], fee=fee if fee > 0 else None)
+
+
+def withdrawal(client, agent, commission, amount, fee, hold=Decimal('0')):
+    """
+    Retrait client chez un agent : l'agent touche retrai_percentage des frais.
+    hold est la réservation de la pré-transaction consommée par ce retrait.
+    """
+    agent_fee = (fee * Decimal(agent.retrai_percentage or 0) / 100).quantize(CENT)
+    return Posting([
+        Leg('withdrawal', amount, client, agent),
+        Leg('paiement', agent_fee, client, agent),
+        Leg('paiement', fee - agent_fee, client, commission),
+    ], fee=fee, releases=[(client, hold)] if hold > 0 else None)
+
+
+def deposit(agency, client, amount, commission=None, agency_commission=Decimal('0'), type='deposit'):
+    """Dépôt d'une agence vers un client, commission agence payée par le compte commission"""
+    return Posting([
+        Leg(type, amount, agency, client),
+        Leg('paiement', agency_commission if commission is not None else 0, commission, agency),
+    ])
+
+
+def merchant_payment(client, merchant, amount):
+    """Paiement marchand (le Fee enregistre le montant du paiement)"""
+    return Posting([Leg('paiement', amount, client, merchant)], fee=amount)
+
+
+def merchant_cash_out(merchant, agency, amount, commission=None, agency_commission=Decimal('0'), type='withdrawal'):
+    """Retrait marchand chez une agence, commission agence payée par le compte commission"""
+    return Posting([
+        Leg(type, amount, merchant, agency),
+        Leg('paiement', agency_commission if commission is not None else 0, commission, agency),
+    ])
+
+
+def agency_recharge(agency, amount):
+    """Recharge d'une agence depuis l'extérieur (pas de compte source)"""
+    return Posting([Leg('deposit', amount, None, agency)])
+
+
+# ---------------------------------------------------------------------------
+# Moteur
+# ---------------------------------------------------------------------------
+
+def _sqlstate(error):
+    cause = error.__cause__
+    return getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+
+
+def lock_order(account):
+    """Ordre global des verrous : (modèle, id), identique pour toutes les écritures"""
+    return account._meta.label_lower, account.pk
+
+
+def apply_balance_changes(bank_db, changes, reserve_changes=()):
+    """
+    Applique une liste de (compte, delta) : balance = balance + delta, et
+    reserve_changes : reserved_amount = reserved_amount + delta. Un débit ou
+    une nouvelle réservation n'est appliqué que si le solde couvre encore les
+    réservations (balance >= reserved_amount après modification).
+
+    Une seule requête par table de comptes : les lignes sont d'abord verrouillées
+    par id croissant (sous-requête ORDER BY ... FOR UPDATE), et les tables sont
+    traitées dans l'ordre lock_order(). Deux écritures concurrentes verrouillent
+    donc leurs lignes communes dans le même ordre et ne peuvent pas s'interbloquer.
+    Les mouvements de solde sont reportés aux compteurs de comptes
+    (account_summary) dans la même transaction.
+    Lève InsufficientFundsError (la transaction englobante doit être annulée).
+    """
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    accounts = {}
+    for column, entries in ((0, changes), (1, reserve_changes)):
+        for account, delta in entries:
+            if account is None:
+                continue
+            key = lock_order(account)
+            totals[key][column] += Decimal(delta)
+            accounts[key] = account
+
+    by_table = defaultdict(dict)
+    for key in sorted(totals):
+        if any(totals[key]):
+            by_table[key[0]][key[1]] = totals[key]
+
+    summary_deltas = defaultdict(lambda: [0, Decimal('0')])
+    connection = connections[bank_db]
+    with connection.cursor() as cursor:
+        for label in sorted(by_table):
+            deltas = by_table[label]
+            ids = sorted(deltas)
+            meta = accounts[(label, ids[0])]._meta
+            table = connection.ops.quote_name(meta.db_table)
+            pk = connection.ops.quote_name(meta.pk.column)
+            values = ', '.join(['(%s::bigint, %s::numeric, %s::numeric)'] * len(ids))
+            params = [value for account_id in ids for value in (account_id, *deltas[account_id])]
+            cursor.execute(
+                f"UPDATE {table} AS account "
+                f"SET balance = account.balance + change.delta, "
+                f"reserved_amount = account.reserved_amount + change.reserve "
+                f"FROM (VALUES {values}) AS change(id, delta, reserve) "
+                f"WHERE account.{pk} = change.id "
+                f"AND account.{pk} IN ("
+                f"SELECT {pk} FROM {table} WHERE {pk} = ANY(%s::bigint[]) ORDER BY {pk} FOR UPDATE"
+                f") "
+                f"AND ((change.delta >= 0 AND change.reserve <= 0) "
+                f"OR account.balance + change.delta >= account.reserved_amount + change.reserve) "
+                f"RETURNING account.{pk}, account.status, account.created_at, change.delta",
+                params + [ids],
+            )
+            updated = set()
+            for account_id, account_status, created_at, delta in cursor.fetchall():
+                updated.add(account_id)
+                key = (account_type(meta.model), account_status, timezone.localdate(created_at))
+                summary_deltas[key][1] += delta
+                # L'instance garde son solde en mémoire : un save() ultérieur
+                # le réécrira, les compteurs partent donc de l'état en base
+                account = accounts[(label, account_id)]
+                if account._summary_state is not None:
+                    account._summary_state = (account_status, account._summary_state[1] + delta, key[2])
+            for account_id in ids:
+                if account_id not in updated:
+                    raise InsufficientFundsError(accounts[(label, account_id)])
+
+    apply_summary_deltas(bank_db, summary_deltas)
+
+
+def run_posting(bank_db, operation, max_attempts=MAX_ATTEMPTS):
+    """
+    Exécute operation() dans transaction.atomic(using=bank_db) et la rejoue
+    en cas d'échec de sérialisation ou d'interblocage, avec un délai aléatoire
+    croissant. Pas de rejeu si un bloc atomique englobant est déjà ouvert :
+    c'est alors à l'appelant de recommencer toute sa transaction.
+    """
+    nested = connections[bank_db].in_atomic_block
+    attempt = 1
+    while True:
+        try:
+            with transaction.atomic(using=bank_db):
+                return operation()
+        except DatabaseError as e:
+            if nested or attempt >= max_attempts or _sqlstate(e) not in RETRYABLE_SQLSTATES:
+                raise
+            metrics.inc('posting_retries_total', bank=bank_db, sqlstate=_sqlstate(e))
+            logger.warning(
+                f"Conflit de concurrence sur {bank_db} (tentative {attempt}): {str(e)}"
+            )
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+            attempt += 1
+
+
+def _build_transactions(bank_db, posting, status):
+    rows = []
+    for leg in posting.legs:
+        rows.append(Transaction(
+            id=generate_transaction_id(),
+            type=leg.type,
+            amount=leg.amount,
+            status=status,
+            source_account_type=content_type_map.get_for_model(bank_db, leg.source) if leg.source else None,
+            source_account_id=leg.source.pk if leg.source else None,
+            destination_account_type=content_type_map.get_for_model(bank_db, leg.destination) if leg.destination else None,
+            destination_account_id=leg.destination.pk if leg.destination else None,
+        ))
+    return rows
+
+
+def _release_expired_holds(bank_db, account):
+    """Libère les réservations expirées d'un compte client ; retourne le nombre libéré"""
+    from .hold_service import release_expired_holds  # import circulaire
+
+    if not isinstance(account, PersonalAccount) or account.pk is None:
+        return 0
+    return release_expired_holds(bank_db, account_id=account.pk)
+
+
+def post(bank_db, posting, before=None, record_failure=False):
+    """
+    Enregistre une écriture en un minimum de requêtes :
+    un INSERT groupé des Transaction, un INSERT du Fee éventuel, un UPDATE
+    par table de comptes touchée et un upsert des agrégats quotidiens. before() est exécuté en tête de la même
+    transaction (ex: consommer une pré-transaction).
+
+    Retourne les Transaction créées, la transaction principale en premier.
+    Un débit refusé sur un compte client est retenté une fois après libération
+    de ses réservations expirées. Avec record_failure, un échec laisse une
+    trace 'failure' des jambes.
+    """
+    def operation():
+        if before is not None:
+            before()
+        transactions = Transaction.objects.using(bank_db).bulk_create(
+            _build_transactions(bank_db, posting, 'success')
+        )
+        if posting.fee is not None:
+            Fee.objects.using(bank_db).create(transaction=transactions[0], amount=posting.fee)
+        # Les verrous sur les comptes, puis sur les agrégats, sont pris en dernier
+        # pour être tenus le moins longtemps (et toujours dans cet ordre)
+        apply_balance_changes(bank_db, posting.balance_changes(), posting.reserve_changes())
+        record_rollups(bank_db, posting.legs, transactions)
+        return transactions
+
+    try:
+        try:
+            return run_posting(bank_db, operation)
+        except InsufficientFundsError as e:
+            # Réservations expirées que le balayeur n'a pas encore libérées :
+            # elles ne doivent pas bloquer un débit, d'où une seconde tentative
+            if not _release_expired_holds(bank_db, e.account):
+                raise
+            return run_posting(bank_db, operation)
+    except Exception:
+        if record_failure and not connections[bank_db].in_atomic_block:
+            with transaction.atomic(using=bank_db):
+                failures = Transaction.objects.using(bank_db).bulk_create(
+                    _build_transactions(bank_db, posting, 'failure')
+                )
+                record_rollups(bank_db, posting.legs, failures)
+        raise
@@ -0,0 +1,109 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from apps.accounts.models import InternAccount
+from core.content_types import content_type_map
+from core.dates import day_range
+from ..models import DailyTransactionRollup, Transaction
+
+
+def _is_commission(account):
+    return isinstance(account, InternAccount) and account.purpose == 'commission'
+
+
+def record_rollups(bank_db, legs, transactions):
+    """
+    Ajoute les transactions d'une écriture aux agrégats quotidiens : un seul
+    INSERT ... ON CONFLICT DO UPDATE, à exécuter dans la transaction de
+    l'écriture. Les clés sont écrites dans un ordre fixe, sur un shard tiré
+    au hasard pour étaler la contention entre écritures simultanées.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for leg, row in zip(legs, transactions):
+        key = (timezone.localdate(row.date), row.type, row.status)
+        deltas[key][0] += 1
+        deltas[key][1] += row.amount
+        if _is_commission(leg.destination):
+            deltas[key][2] += row.amount
+    if not deltas:
+        return
+
+    shard = random.randrange(settings.TRANSACTION_ROLLUP_SHARDS)
+    keys = sorted(deltas)
+    connection = connections[bank_db]
+    table = connection.ops.quote_name(DailyTransactionRollup._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(keys))
+    params = [
+        value
+        for key in keys
+        for value in (*key, shard, *deltas[key])
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} AS rollup (day, type, status, shard, count, amount_sum, fee_sum) "
+            f"VALUES {values} "
+            f"ON CONFLICT (day, type, status, shard) DO UPDATE SET "
+            f"count = rollup.count + EXCLUDED.count, "
+            f"amount_sum = rollup.amount_sum + EXCLUDED.amount_sum, "
+            f"fee_sum = rollup.fee_sum + EXCLUDED.fee_sum",
+            params,
+        )
+
+
+def rebuild_rollups(bank_db, first_day, last_day):
+    """
+    Recalcule depuis le grand livre les agrégats des jours first_day à
+    last_day inclus. La table des agrégats est verrouillée en écriture le
+    temps du recalcul : les écritures de la période attendent au lieu d'être
+    comptées deux fois. Retourne le nombre de lignes d'agrégats écrites.
+    """
+    connection = connections[bank_db]
+    quote = connection.ops.quote_name
+    rollup_table = quote(DailyTransactionRollup._meta.db_table)
+    transaction_table = quote(Transaction._meta.db_table)
+    intern_table = quote(InternAccount._meta.db_table)
+    start, end = day_range(first_day, last_day)
+
+    with transaction.atomic(using=bank_db), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {rollup_table} IN SHARE ROW EXCLUSIVE MODE")
+        DailyTransactionRollup.objects.using(bank_db).filter(day__gte=first_day, day__lte=last_day).delete()
+        cursor.execute(
+            f"INSERT INTO {rollup_table} (day, type, status, shard, count, amount_sum, fee_sum) "
+            f"SELECT (t.date AT TIME ZONE %s)::date, t.type, t.status, 0, COUNT(*), SUM(t.amount), "
+            f"COALESCE(SUM(t.amount) FILTER (WHERE t.destination_account_type_id = %s "
+            f"AND t.destination_account_id IN (SELECT id FROM {intern_table} WHERE purpose = 'commission')), 0) "
+            f"FROM {transaction_table} t "
+            f"WHERE t.date >= %s AND t.date < %s "
+            f"GROUP BY 1, 2, 3",
+            [
+                timezone.get_current_timezone_name(),
+                content_type_map.get_id(bank_db, InternAccount),
+                start,
+                end,
+            ],
+        )
+        return cursor.rowcount
+
+
+def ledger_bounds(bank_db):
+    """Premier et dernier jour présents dans le grand livre, ou (None, None)"""
+    first = Transaction.objects.using(bank_db).order_by('date', 'id').values_list('date', flat=True).first()
+    if first is None:
+        return None, None
+    last = Transaction.objects.using(bank_db).order_by('-date', '-id').values_list('date', flat=True).first()
+    return timezone.localdate(first), timezone.localdate(last)
+
+
+def iter_day_batches(first_day, last_day, batch_days):
+    """Découpe [first_day, last_day] en périodes de batch_days jours"""
+    day = first_day
+    while day <= last_day:
+        batch_end = min(day + timedelta(days=batch_days - 1), last_day)
+        yield day, batch_end
+        day = batch_end + timedelta(days=1)
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Passerelle SMS considérée indisponible : appel refusé sans requête HTTP"""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur sur le taux d'erreur des derniers appels : au-delà de
+    failure_rate (sur au moins min_calls appels de la fenêtre), il s'ouvre et
+    refuse les appels pendant reset_timeout secondes, puis laisse passer un
+    seul appel d'essai (semi-ouvert) qui le referme ou le rouvre.
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=10, reset_timeout=30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._publish()
+
+    def _publish(self):
+        metrics.set('sms_gateway_circuit_state', STATE_VALUES[self._state], gateway=self.name)
+
+    def _transition(self, state):
+        if state != self._state:
+            logger.warning(f"Disjoncteur {self.name}: {self._state} -> {state}")
+            if state == OPEN:
+                metrics.inc('sms_gateway_circuit_opened_total', gateway=self.name)
+            self._state = state
+            self._publish()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            return self._state
+
+    def allow_request(self):
+        """True si un appel peut partir ; en semi-ouvert, un seul appel d'essai à la fois"""
+        state = self.state
+        with self._lock:
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._results.clear()
+                if success:
+                    self._transition(CLOSED)
+                else:
+                    self._opened_at = time.monotonic()
+                    self._transition(OPEN)
+                return
+
+            self._results.append(success)
+            failures = self._results.count(False)
+            if (
+                self._state == CLOSED
+                and len(self._results) >= self.min_calls
+                and failures / len(self._results) >= self.failure_rate
+            ):
+                self._opened_at = time.monotonic()
+                self._results.clear()
+                self._transition(OPEN)
+
+
+class SmsGateway:
+    """
+    Client partagé de l'API de validation Chinguisoft : une Session requests
+    par processus (connexions keep-alive réutilisées, pool dimensionné sur le
+    nombre de threads d'envoi), délais de connexion et de lecture séparés,
+    disjoncteur et métriques de latence et d'erreurs.
+    """
+
+    name = 'chinguisoft'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._breaker = None
+
+    @property
+    def breaker(self):
+        if self._breaker is None:
+            with self._lock:
+                if self._breaker is None:
+                    self._breaker = CircuitBreaker(
+                        self.name,
+                        failure_rate=settings.SMS_CIRCUIT_FAILURE_RATE,
+                        window=settings.SMS_CIRCUIT_WINDOW,
+                        min_calls=settings.SMS_CIRCUIT_MIN_CALLS,
+                        reset_timeout=settings.SMS_CIRCUIT_RESET_TIMEOUT,
+                    )
+        return self._breaker
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Pas de reprise au niveau HTTP : les reprises sont gérées par la file d'envoi
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=settings.SMS_GATEWAY_POOL_SIZE,
+                        max_retries=0,
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers.update({
+                        'Validation-token': settings.CHINGUISOFT_VALIDATION_TOKEN,
+                        'Content-Type': 'application/json'
+                    })
+                    self._session = session
+        return self._session
+
+    def available(self):
+        """False tant que le disjoncteur est ouvert (inutile de réclamer des messages)"""
+        return self.breaker.state != OPEN
+
+    def send_validation_code(self, phone_number, code, lang='fr'):
+        """
+        Envoie un code de validation. Retourne la réponse HTTP ; lève
+        CircuitOpenError si le disjoncteur refuse l'appel ; toute autre
+        exception (erreur réseau requests comprise) est comptée comme un
+        échec par le disjoncteur puis relancée.
+        """
+        if not self.breaker.allow_request():
+            metrics.inc('sms_gateway_rejected_total', gateway=self.name)
+            raise CircuitOpenError(f"Passerelle {self.name} indisponible (disjoncteur ouvert)")
+
+        url = f"{settings.CHINGUISOFT_BASE_URL}/{settings.CHINGUISOFT_VALIDATION_KEY}"
+        started = time.monotonic()
+        try:
+            response = self.session.post(
+                url,
+                json={'phone': phone_number, 'lang': lang, 'code': code},
+                timeout=(settings.CHINGUISOFT_CONNECT_TIMEOUT, settings.CHINGUISOFT_TIMEOUT),
+            )
+        except Exception as e:
+            # Toute exception compte comme un échec : une sonde HALF_OPEN doit
+            # toujours être libérée, sinon le disjoncteur reste bloqué
+            self.breaker.record(False)
+            metrics.inc('sms_gateway_requests_total', gateway=self.name, outcome=type(e).__name__)
+            raise
+        finally:
+            metrics.observe('sms_gateway_request_seconds', time.monotonic() - started, gateway=self.name)
+
+        # 429 et 5xx signalent une passerelle en difficulté ; les autres 4xx concernent le message
+        self.breaker.record(not (response.status_code == 429 or response.status_code >= 500))
+        metrics.inc('sms_gateway_requests_total', gateway=self.name, outcome=str(response.status_code))
+        return response
+
+
+sms_gateway = SmsGateway()
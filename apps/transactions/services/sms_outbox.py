@@ -0,0 +1,171 @@
+import logging
+import math
+import random
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.metrics import metrics
+from ..models import SmsOutbox
+from .sms_gateway import CircuitOpenError, sms_gateway
+
+logger = logging.getLogger(__name__)
+
+# Durée de validité du code envoyé, par usage (voir OTP_TTL_SECONDS et RESET_TTL_SECONDS)
+CODE_TTL = {
+    'verification': timedelta(minutes=1),
+    'password_reset': timedelta(minutes=10),
+}
+
+API_ERRORS = {
+    401: "Clés d'authentification invalides",
+    402: "Solde insuffisant pour envoyer le SMS",
+    422: "Données invalides",
+    429: "Trop de requêtes, veuillez ralentir",
+    500: "Service Chinguisoft temporairement indisponible",
+    503: "Service temporairement indisponible",
+}
+
+# Erreurs définitives : inutile de réessayer
+PERMANENT_STATUSES = {401, 402, 422}
+
+
+def enqueue_sms(bank_db, phone_number, code, lang='fr', purpose='verification'):
+    """
+    Ajoute un SMS à la file d'envoi de la banque, une fois le code enregistré
+    dans le stockage OTP. Le code n'est gardé en clair dans la file que le
+    temps de l'envoi : il est effacé dès que le message est envoyé, en échec
+    ou expiré.
+    """
+    message = SmsOutbox(
+        phone_number=phone_number,
+        code=code,
+        lang=lang,
+        purpose=purpose,
+        expires_at=timezone.now() + CODE_TTL[purpose],
+    )
+    message.save(using=bank_db)
+    metrics.inc('sms_outbox_enqueued_total', bank=bank_db, purpose=purpose)
+    return message
+
+
+def lease_seconds(limit, threads):
+    """
+    Bail d'un lot de limit messages envoyés par threads threads : vagues
+    d'envois successives, chacune bornée par les délais de connexion et de
+    lecture de la passerelle, plus la marge SMS_LEASE_SECONDS
+    """
+    waves = math.ceil(limit / max(threads, 1))
+    request_timeout = settings.CHINGUISOFT_CONNECT_TIMEOUT + settings.CHINGUISOFT_TIMEOUT
+    return waves * request_timeout + settings.SMS_LEASE_SECONDS
+
+
+def claim_due_messages(bank_db, limit, threads=1):
+    """
+    Réserve jusqu'à limit messages à envoyer (SKIP LOCKED : plusieurs workers
+    se partagent la file sans se bloquer). Un message réclamé passe en
+    'sending' avec un bail couvrant l'envoi du lot par threads threads : si
+    le worker meurt, il redevient éligible à l'expiration du bail. La fin du
+    bail est reportée dans next_attempt_at des messages retournés (voir
+    record_result).
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=lease_seconds(limit, threads))
+    with transaction.atomic(using=bank_db):
+        messages = list(
+            SmsOutbox.objects.using(bank_db)
+            .select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:limit]
+        )
+        if messages:
+            SmsOutbox.objects.using(bank_db).filter(pk__in=[m.pk for m in messages]).update(
+                status='sending',
+                next_attempt_at=lease_until,
+            )
+            for message in messages:
+                message.status = 'sending'
+                message.next_attempt_at = lease_until
+    return messages
+
+
+def deliver(message):
+    """
+    Envoie un message par la passerelle partagée. Retourne
+    (envoyé, à réessayer, erreur, tentative comptée) : un refus du
+    disjoncteur ne consomme pas de tentative. N'accède pas à la base :
+    appelable depuis un thread du pool d'envoi.
+    """
+    try:
+        response = sms_gateway.send_validation_code(message.phone_number, message.code, message.lang)
+    except CircuitOpenError as e:
+        return False, True, str(e), False
+    except requests.exceptions.RequestException as e:
+        return False, True, f"Erreur de connexion au service SMS: {str(e)}", True
+
+    if response.status_code == 200:
+        return True, False, '', True
+    error = API_ERRORS.get(response.status_code, f"Erreur inconnue: HTTP {response.status_code}")
+    return False, response.status_code not in PERMANENT_STATUSES, error, True
+
+
+def backoff_delay(attempts):
+    """Délai avant la tentative suivante : exponentiel, plafonné, avec gigue"""
+    delay = min(settings.SMS_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.SMS_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1)
+
+
+def record_result(bank_db, message, sent, retryable, error, attempted=True):
+    """
+    Enregistre le résultat d'un envoi et planifie une reprise si besoin.
+    L'écriture n'a lieu que si le message est toujours sous le bail de cette
+    réclamation : bail expiré et message repris par un autre worker, le
+    résultat est ignoré et None est retourné.
+    """
+    now = timezone.now()
+    attempts = message.attempts + 1 if attempted else message.attempts
+    updates = {'attempts': attempts, 'last_error': error}
+
+    if sent:
+        updates.update(status='sent', sent_at=now, code='')
+    elif retryable and attempts < settings.SMS_MAX_ATTEMPTS and now < message.expires_at:
+        delay = backoff_delay(attempts) if attempted else settings.SMS_CIRCUIT_RESET_TIMEOUT
+        updates.update(status='pending', next_attempt_at=now + timedelta(seconds=delay))
+    else:
+        updates.update(status='failed', code='')
+
+    recorded = SmsOutbox.objects.using(bank_db).filter(
+        pk=message.pk, status='sending', next_attempt_at=message.next_attempt_at,
+    ).update(**updates)
+    if not recorded:
+        metrics.inc('sms_lease_lost_total', bank=bank_db)
+        logger.warning(f"Bail du SMS {message.pk} ({bank_db}) perdu avant l'enregistrement du résultat")
+        return None
+
+    if updates['status'] == 'sent':
+        metrics.inc('sms_delivered_total', bank=bank_db, purpose=message.purpose)
+    elif updates['status'] == 'pending':
+        metrics.inc('sms_delivery_retries_total', bank=bank_db)
+    else:
+        metrics.inc('sms_delivery_failures_total', bank=bank_db, purpose=message.purpose)
+        logger.error(f"Échec définitif de l'envoi du SMS {message.pk} ({bank_db}): {error}")
+    return updates['status']
+
+
+def expire_message(bank_db, message):
+    """
+    Code périmé avant envoi : le message est abandonné. Même garde de bail
+    que record_result : None si le message a été repris entre-temps.
+    """
+    expired = SmsOutbox.objects.using(bank_db).filter(
+        pk=message.pk, status='sending', next_attempt_at=message.next_attempt_at,
+    ).update(status='failed', code='', last_error="Code expiré avant l'envoi")
+    if not expired:
+        metrics.inc('sms_lease_lost_total', bank=bank_db)
+        logger.warning(f"Bail du SMS {message.pk} ({bank_db}) perdu avant son expiration")
+        return None
+    metrics.inc('sms_delivery_failures_total', bank=bank_db, purpose=message.purpose)
+    return 'failed'
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeeRule
+from .services.fee_schedule import fee_schedules
+
+
+@receiver([post_save, post_delete], sender=FeeRule)
+def refresh_fee_schedule(sender, using, **kwargs):
+    """Nouvelle version du barème de la banque, publiée une fois l'écriture validée"""
+    transaction.on_commit(lambda: fee_schedules.refresh(using), using=using)
@@ -1,3 +1,469 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from psycopg import errors as pg_errors
+
+from apps.accounts.models import AgencyAccount, BusinessAccount, InternAccount, PersonalAccount
+from apps.transactions.models import Fee, PreTransaction, Transaction, generate_transaction_id
+from apps.transactions.serializer import calculate_available_balance
+from apps.transactions.services.hold_service import (
+    claim_pre_transaction, place_hold, release_expired_holds, release_hold,
+)
+from apps.transactions.services.posting_service import (
+    InsufficientFundsError, merchant_payment, post, run_posting, transfer, withdrawal,
+)
+from apps.users.models import User
+from core.content_types import content_type_map
+from core.dates import day_range, day_start
+from core.ids import generate_id
+
+# Base d'une banque de recette déjà migrée (code de la banque). Le jeu de données
+# est inséré dans une transaction annulée à la fin : la base n'est pas modifiée.
+EXPLAIN_BANK = os.environ.get('EXPLAIN_BANK')
+
+SEED_USERS = 2000
+SEED_TRANSACTIONS = 50000
+SEED_PRE_TRANSACTIONS = 5000
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+@unittest.skipUnless(EXPLAIN_BANK, "EXPLAIN_BANK non défini (base PostgreSQL de recette requise)")
+class HotQueryPlanTests(unittest.TestCase):
+    """
+    Vérifie par EXPLAIN que les requêtes fréquentes (historiques, statistiques
+    par période, comptes, pré-transactions) restent servies par un index et ne
+    retombent pas sur un parcours séquentiel des tables volumineuses.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = EXPLAIN_BANK
+        if connections[cls.db].vendor != 'postgresql':
+            raise unittest.SkipTest("EXPLAIN attendu au format PostgreSQL")
+        cls._atomic = transaction.atomic(using=cls.db)
+        cls._atomic.__enter__()
+        try:
+            cls._seed()
+        except Exception:
+            cls._rollback()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._rollback()
+        super().tearDownClass()
+
+    @classmethod
+    def _rollback(cls):
+        transaction.set_rollback(True, using=cls.db)
+        cls._atomic.__exit__(None, None, None)
+
+    @classmethod
+    def _seed(cls):
+        rng = random.Random(42)
+        users = User.objects.using(cls.db).bulk_create([
+            User(username=f'explain-{i}', phone_number=f'9{i:07d}', email=f'explain-{i}@example.com')
+            for i in range(SEED_USERS)
+        ])
+        accounts = PersonalAccount.objects.using(cls.db).bulk_create([
+            PersonalAccount(
+                user=user,
+                account_number=f'EXPLAIN{i:010d}',
+                balance=Decimal('1000'),
+                status=rng.choice(['ACTIVE', 'ACTIVE', 'ACTIVE', 'BLOCKED']),
+            )
+            for i, user in enumerate(users)
+        ])
+        cls.account = accounts[0]
+        cls.account_ct = content_type_map.get_for_model(cls.db, PersonalAccount)
+
+        transactions = Transaction.objects.using(cls.db).bulk_create([
+            Transaction(
+                id=generate_transaction_id(),
+                type=rng.choice(['transfer', 'withdrawal', 'deposit', 'paiement']),
+                status='success',
+                amount=Decimal(rng.randint(10, 5000)),
+                source_account_type=cls.account_ct,
+                source_account_id=rng.choice(accounts).id,
+                destination_account_type=cls.account_ct,
+                destination_account_id=rng.choice(accounts).id,
+            )
+            for _ in range(SEED_TRANSACTIONS)
+        ], batch_size=5000)
+
+        PreTransaction.objects.using(cls.db).bulk_create([
+            PreTransaction(
+                id=generate_id('PT'),
+                user=rng.choice(users),
+                code=f'{rng.randint(1000, 9999)}',
+                client_phone=f'9{i:07d}',
+                amount=Decimal('100'),
+                is_used=True,
+                expires_at=timezone.now() - timedelta(days=rng.randint(1, 90)),
+            )
+            for i in range(SEED_PRE_TRANSACTIONS)
+        ], batch_size=5000)
+
+        with connections[cls.db].cursor() as cursor:
+            # date est en auto_now_add : étaler l'historique sur six mois après insertion
+            cursor.execute(
+                "UPDATE transactions_transaction "
+                "SET date = now() - (random() * interval '180 days') WHERE id = ANY(%s)",
+                [[t.id for t in transactions]],
+            )
+            for model in (User, PersonalAccount, Transaction, PreTransaction):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            raw = cursor.fetchone()[0]
+        plan = json.loads(raw) if isinstance(raw, str) else raw
+        return list(_plan_nodes(plan[0]['Plan']))
+
+    def assertNoSeqScan(self, queryset, model):
+        table = model._meta.db_table
+        nodes = self.explain(queryset)
+        scans = [n for n in nodes if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') == table]
+        self.assertFalse(scans, f"Parcours séquentiel de {table} : {[n['Node Type'] for n in nodes]}")
+
+    def test_history_sent_and_received(self):
+        for prefix in ('source', 'destination'):
+            queryset = Transaction.objects.using(self.db).filter(**{
+                f'{prefix}_account_type': self.account_ct,
+                f'{prefix}_account_id': self.account.id,
+            }).order_by('-date', '-id')[:51]
+            with self.subTest(prefix=prefix):
+                self.assertNoSeqScan(queryset, Transaction)
+
+    def test_history_union_page(self):
+        ordering = ('-date', '-id')
+        sent = Transaction.objects.using(self.db).filter(
+            source_account_type=self.account_ct, source_account_id=self.account.id,
+        ).order_by(*ordering)[:51]
+        received = Transaction.objects.using(self.db).filter(
+            destination_account_type=self.account_ct, destination_account_id=self.account.id,
+        ).order_by(*ordering)[:51]
+        self.assertNoSeqScan(sent.union(received).order_by(*ordering)[:51], Transaction)
+
+    def test_period_statistics_use_range_predicates(self):
+        today = timezone.now().date()
+        day_from, day_to = day_range(today - timedelta(days=1))
+        for queryset in (
+            Transaction.objects.using(self.db).filter(date__gte=day_from, date__lt=day_to),
+            Transaction.objects.using(self.db).filter(date__gte=day_start(today - timedelta(days=3))),
+            Transaction.objects.using(self.db).filter(type='deposit', date__gte=day_start(today)),
+        ):
+            with self.subTest(sql=str(queryset.query)):
+                self.assertNoSeqScan(queryset.values('id'), Transaction)
+
+    def test_account_by_user_and_status(self):
+        queryset = PersonalAccount.objects.using(self.db).filter(user_id=self.account.user_id, status='ACTIVE')
+        self.assertNoSeqScan(queryset, PersonalAccount)
+
+    def test_pre_transaction_lookups(self):
+        for queryset in (
+            PreTransaction.objects.using(self.db).filter(client_phone='90000042', code='1234', is_used=False),
+            PreTransaction.objects.using(self.db).filter(client_phone='90000042').order_by('-created_at', '-id')[:20],
+            PreTransaction.objects.using(self.db).order_by('-created_at', '-id')[:20],
+            PreTransaction.objects.using(self.db).filter(is_used=False, expires_at__lte=timezone.now()),
+        ):
+            with self.subTest(sql=str(queryset.query)):
+                self.assertNoSeqScan(queryset, PreTransaction)
+
+
+# ---------------------------------------------------------------------------
+# Moteur d'écritures et réservations, sur la banque des tests (test_bank)
+# ---------------------------------------------------------------------------
+
+TEST_BANK = settings.TEST_BANK_DATABASE
+
+_sequence = itertools.count(1)
+
+
+def create_account(model, balance='0', **fields):
+    """Compte de la banque des tests, avec son utilisateur"""
+    n = next(_sequence)
+    user = User.objects.using(TEST_BANK).create(username=f'test-{n}', phone_number=f'4{n:07d}')
+    return model.objects.using(TEST_BANK).create(
+        user=user, account_number=f'TEST{n:010d}', balance=Decimal(balance), **fields
+    )
+
+
+def reload(account):
+    return type(account).objects.using(TEST_BANK).get(pk=account.pk)
+
+
+class PostingDescriptionTests(SimpleTestCase):
+    """Jambes et frais des écritures, sans base"""
+
+    def setUp(self):
+        self.customer = PersonalAccount(pk=1, account_number='C1')
+        self.other = PersonalAccount(pk=2, account_number='C2')
+        self.agent = AgencyAccount(pk=1, account_number='A1', retrai_percentage=Decimal('30'))
+        self.commission = InternAccount(pk=1, account_number='I1', purpose='commission')
+        self.merchant = BusinessAccount(pk=1, account_number='B1')
+
+    def legs(self, posting):
+        return [(leg.type, leg.amount, leg.source, leg.destination) for leg in posting.legs]
+
+    def test_withdrawal_splits_fee_between_agent_and_commission(self):
+        posting = withdrawal(
+            self.customer, self.agent, self.commission, Decimal('1000'), Decimal('10'), hold=Decimal('1010'),
+        )
+        self.assertEqual(self.legs(posting), [
+            ('withdrawal', Decimal('1000.00'), self.customer, self.agent),
+            ('paiement', Decimal('3.00'), self.customer, self.agent),
+            ('paiement', Decimal('7.00'), self.customer, self.commission),
+        ])
+        self.assertEqual(posting.fee, Decimal('10'))
+        self.assertEqual(posting.reserve_changes(), [(self.customer, Decimal('-1010'))])
+
+    def test_withdrawal_fee_split_keeps_every_cent(self):
+        posting = withdrawal(self.customer, self.agent, self.commission, Decimal('100'), Decimal('0.05'))
+        agent_fee, commission_fee = posting.legs[1].amount, posting.legs[2].amount
+        self.assertEqual(agent_fee, Decimal('0.02'))
+        self.assertEqual(agent_fee + commission_fee, Decimal('0.05'))
+
+    def test_withdrawal_without_agent_percentage_pays_commission_only(self):
+        self.agent.retrai_percentage = None
+        posting = withdrawal(self.customer, self.agent, self.commission, Decimal('100'), Decimal('4'))
+        self.assertEqual(self.legs(posting), [
+            ('withdrawal', Decimal('100.00'), self.customer, self.agent),
+            ('paiement', Decimal('4.00'), self.customer, self.commission),
+        ])
+        self.assertEqual(posting.reserve_changes(), [])
+
+    def test_merchant_payment_records_amount_as_fee(self):
+        posting = merchant_payment(self.customer, self.merchant, Decimal('50'))
+        self.assertEqual(self.legs(posting), [('paiement', Decimal('50.00'), self.customer, self.merchant)])
+        self.assertEqual(posting.fee, Decimal('50'))
+
+    def test_transfer_without_fee_has_a_single_leg(self):
+        posting = transfer(self.customer, self.other, self.commission, Decimal('100'), Decimal('0'))
+        self.assertEqual(len(posting.legs), 1)
+        self.assertIsNone(posting.fee)
+        self.assertEqual(posting.balance_changes(), [
+            (self.customer, Decimal('-100.00')), (self.other, Decimal('100.00')),
+        ])
+
+
+class PostingEngineTests(TestCase):
+    """post() : mises à jour conditionnelles des soldes, Fee et refus pour solde insuffisant"""
+
+    databases = {'default', TEST_BANK}
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type_map.invalidate(TEST_BANK)
+        cls.customer = create_account(PersonalAccount, '5000')
+        cls.other = create_account(PersonalAccount)
+        cls.commission = create_account(InternAccount, purpose='commission')
+        cls.agent = create_account(AgencyAccount, retrai_percentage=Decimal('30'))
+        cls.merchant = create_account(BusinessAccount)
+
+    def assertBalances(self, expected):
+        for account, balance in expected:
+            with self.subTest(account=account.account_number):
+                self.assertEqual(reload(account).balance, Decimal(balance))
+
+    def test_transfer_moves_balances_and_records_fee(self):
+        transactions = post(
+            TEST_BANK, transfer(self.customer, self.other, self.commission, Decimal('100'), Decimal('2')),
+        )
+        self.assertBalances([(self.customer, '4898'), (self.other, '100'), (self.commission, '2')])
+        self.assertEqual([t.type for t in transactions], ['transfer', 'paiement'])
+        self.assertEqual(Fee.objects.using(TEST_BANK).get(transaction=transactions[0]).amount, Decimal('2'))
+
+    def test_insufficient_funds_changes_nothing(self):
+        with self.assertRaises(InsufficientFundsError) as raised:
+            post(TEST_BANK, transfer(self.customer, self.other, self.commission, Decimal('5000'), Decimal('2')))
+        self.assertEqual(raised.exception.account.pk, self.customer.pk)
+        self.assertBalances([(self.customer, '5000'), (self.other, '0'), (self.commission, '0')])
+        self.assertFalse(Transaction.objects.using(TEST_BANK).exists())
+        self.assertFalse(Fee.objects.using(TEST_BANK).exists())
+
+    def test_debit_cannot_spend_reserved_amount(self):
+        PersonalAccount.objects.using(TEST_BANK).filter(pk=self.customer.pk).update(reserved_amount=Decimal('4950'))
+        with self.assertRaises(InsufficientFundsError):
+            post(TEST_BANK, transfer(self.customer, self.other, self.commission, Decimal('100'), Decimal('2')))
+        post(TEST_BANK, transfer(self.customer, self.other, self.commission, Decimal('40'), Decimal('2')))
+        self.assertBalances([(self.customer, '4958'), (self.other, '40')])
+
+    def test_credit_is_applied_whatever_the_reservations(self):
+        PersonalAccount.objects.using(TEST_BANK).filter(pk=self.other.pk).update(reserved_amount=Decimal('100'))
+        post(TEST_BANK, transfer(self.customer, self.other, self.commission, Decimal('10'), Decimal('0')))
+        self.assertBalances([(self.other, '10')])
+
+    def test_withdrawal_pays_agent_and_commission_and_releases_hold(self):
+        PersonalAccount.objects.using(TEST_BANK).filter(pk=self.customer.pk).update(reserved_amount=Decimal('1010'))
+        post(TEST_BANK, withdrawal(
+            self.customer, self.agent, self.commission, Decimal('1000'), Decimal('10'), hold=Decimal('1010'),
+        ))
+        self.assertBalances([(self.customer, '3990'), (self.agent, '1003'), (self.commission, '7')])
+        self.assertEqual(reload(self.customer).reserved_amount, Decimal('0'))
+
+    def test_merchant_payment(self):
+        transactions = post(TEST_BANK, merchant_payment(self.customer, self.merchant, Decimal('50')))
+        self.assertBalances([(self.customer, '4950'), (self.merchant, '50')])
+        self.assertEqual(Fee.objects.using(TEST_BANK).get(transaction=transactions[0]).amount, Decimal('50'))
+
+
+class PostingRetryTests(TransactionTestCase):
+    """run_posting() : rejeu des échecs de sérialisation et des interblocages"""
+
+    databases = {'default', TEST_BANK}
+
+    def setUp(self):
+        # flush entre les tests : les ContentType sont recréés avec d'autres id
+        content_type_map.invalidate(TEST_BANK)
+        sleep = mock.patch('apps.transactions.services.posting_service.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def failing(self, error_class, failures):
+        """Opération qui échoue failures fois avec error_class, puis réussit"""
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            if failures is None or len(attempts) <= failures:
+                raise OperationalError('conflit') from error_class()
+            return len(attempts)
+        return operation, attempts
+
+    def test_retries_serialization_failures_and_deadlocks(self):
+        for error_class in (pg_errors.SerializationFailure, pg_errors.DeadlockDetected):
+            with self.subTest(sqlstate=error_class.sqlstate):
+                operation, attempts = self.failing(error_class, 2)
+                self.assertEqual(run_posting(TEST_BANK, operation), 3)
+
+    def test_gives_up_after_max_attempts(self):
+        operation, attempts = self.failing(pg_errors.SerializationFailure, None)
+        with self.assertRaises(OperationalError):
+            run_posting(TEST_BANK, operation, max_attempts=3)
+        self.assertEqual(len(attempts), 3)
+
+    def test_other_errors_are_not_retried(self):
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            raise IntegrityError('doublon') from pg_errors.UniqueViolation()
+
+        with self.assertRaises(IntegrityError):
+            run_posting(TEST_BANK, operation)
+        self.assertEqual(len(attempts), 1)
+
+    def test_no_retry_inside_an_enclosing_transaction(self):
+        operation, attempts = self.failing(pg_errors.SerializationFailure, 1)
+        with self.assertRaises(OperationalError), transaction.atomic(using=TEST_BANK):
+            run_posting(TEST_BANK, operation)
+        self.assertEqual(len(attempts), 1)
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        first = create_account(PersonalAccount, '1000')
+        second = create_account(PersonalAccount, '1000')
+        commission = create_account(InternAccount, purpose='commission')
+
+        def transfers(source, destination):
+            try:
+                for _ in range(20):
+                    post(TEST_BANK, transfer(source, destination, commission, Decimal('1'), Decimal('1')))
+            finally:
+                connections[TEST_BANK].close()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(transfers, first, second), executor.submit(transfers, second, first)]
+        for future in futures:
+            future.result()
+        self.assertEqual(reload(first).balance, Decimal('980'))
+        self.assertEqual(reload(second).balance, Decimal('980'))
+        self.assertEqual(reload(commission).balance, Decimal('40'))
+
+
+class HoldTests(TestCase):
+    """Réservations des pré-transactions et réclamation atomique des codes de retrait"""
+
+    databases = {'default', TEST_BANK}
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type_map.invalidate(TEST_BANK)
+        cls.customer = create_account(PersonalAccount, '1000')
+        cls.agent = create_account(AgencyAccount, retrai_percentage=Decimal('30'))
+        cls.commission = create_account(InternAccount, purpose='commission')
+        cls.phone = cls.customer.user.phone_number
+
+    def hold(self, amount='100', hold_amount='102', **fields):
+        pre_transaction = PreTransaction(
+            user=self.agent.user, client_phone=self.phone, amount=Decimal(amount), **fields
+        )
+        return place_hold(TEST_BANK, pre_transaction, self.customer, Decimal(hold_amount))
+
+    def test_place_hold_reserves_amount_and_fee(self):
+        pre_transaction = self.hold()
+        customer = reload(self.customer)
+        self.assertEqual(customer.reserved_amount, Decimal('102'))
+        self.assertEqual(calculate_available_balance(customer), (Decimal('898'), Decimal('102')))
+        self.assertEqual(pre_transaction.account_id, self.customer.pk)
+        self.assertEqual(pre_transaction.hold_amount, Decimal('102'))
+
+    def test_place_hold_refused_beyond_available_balance(self):
+        self.hold(hold_amount='900')
+        with self.assertRaises(InsufficientFundsError):
+            self.hold(hold_amount='101')
+        self.assertEqual(PreTransaction.objects.using(TEST_BANK).count(), 1)
+        self.assertEqual(calculate_available_balance(reload(self.customer)), (Decimal('100'), Decimal('900')))
+
+    def test_release_hold_returns_reservation_once(self):
+        pre_transaction = self.hold()
+        self.assertEqual(release_hold(TEST_BANK, pre_transaction.pk), 1)
+        self.assertEqual(release_hold(TEST_BANK, pre_transaction.pk), 0)
+        self.assertEqual(reload(self.customer).reserved_amount, Decimal('0'))
+
+    def test_claim_consumes_a_code_once(self):
+        pre_transaction = self.hold()
+        claimed = claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code)
+        self.assertEqual(claimed, (pre_transaction.pk, Decimal('100.00'), Decimal('102.00'), self.customer.pk))
+        self.assertIsNone(claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code))
+        pre_transaction.refresh_from_db(using=TEST_BANK)
+        self.assertTrue(pre_transaction.is_used)
+        self.assertEqual(pre_transaction.hold_amount, Decimal('0'))
+
+    def test_claim_requires_the_requested_amount(self):
+        pre_transaction = self.hold()
+        self.assertIsNone(claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code, amount=Decimal('50')))
+        self.assertIsNotNone(claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code, amount=Decimal('100')))
+
+    def test_expired_code_cannot_be_claimed_and_its_hold_is_released(self):
+        pre_transaction = self.hold(expires_at=timezone.now() - timedelta(days=1))
+        self.assertIsNone(claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code))
+        self.assertEqual(release_expired_holds(TEST_BANK, account_id=self.customer.pk), 1)
+        self.assertEqual(reload(self.customer).reserved_amount, Decimal('0'))
+
+    def test_cash_out_of_a_claimed_code(self):
+        pre_transaction = self.hold(amount='100', hold_amount='110')
+        _, amount, hold, _ = claim_pre_transaction(TEST_BANK, self.phone, pre_transaction.code)
+        post(TEST_BANK, withdrawal(self.customer, self.agent, self.commission, amount, Decimal('10'), hold=hold))
+        customer = reload(self.customer)
+        self.assertEqual((customer.balance, customer.reserved_amount), (Decimal('890'), Decimal('0')))
+        self.assertEqual(reload(self.agent).balance, Decimal('103'))
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import TransferTransactionView,RechargeAgancyView,RetrieveAllPreTransactionsView,RetraiMarchantView,RetrievePaymentRequestView,CreatePaymentRequestView,MerchantPaymentView,CancelPreTransactionView,DepositTransactionView,RetraiTransactionView,CreatePreTransactionView,RetrievePreTransactionView
+from .views import TransferTransactionView,RechargeAgancyView,RetrieveAllPreTransactionsView,RetraiMarchantView,RetrievePaymentRequestView,CreatePaymentRequestView,MerchantPaymentView,CancelPreTransactionView,DepositTransactionView,RetraiTransactionView,CreatePreTransactionView,RetrievePreTransactionView,ClaimWithdrawalView
 urlpatterns = [
     path('transactions/rechargeagancy/', RechargeAgancyView.as_view(), name='transaction-recharge'),
     path('transactions/depose/', DepositTransactionView.as_view(), name='transaction-create'),
     path('transactions/retrai/', RetraiTransactionView.as_view(), name='transaction-retrai'),
+    path('transactions/retrai/claim/', ClaimWithdrawalView.as_view(), name='transaction-retrai-claim'),
     path('transactions/retrai/marchant', RetraiMarchantView.as_view(), name='retrai-marchant'),
     path('pre-transaction/', CreatePreTransactionView.as_view(), name='pre-transaction'),
     path('cancel-pretransaction/<str:code>/', CancelPreTransactionView.as_view(), name='cancel-pretransaction'),
@@ -1,6 +1,7 @@
 from rest_framework import status,serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework import generics
 from .models import PreTransaction
 from .models import PaymentRequest
 from apps.accounts.models import BusinessAccount
@@ -10,7 +11,10 @@ from rest_framework.permissions import IsAuthenticated
 from .permissions import AgencyAccountPermission,PersonnelAccountPermission,BusinessAccountPermission,AllAccountTypesPermission
 from datetime import timedelta
 from django.utils import timezone
-from .serializer import TransferTransactionSerializer,RechargeAgencySerializer,AllPreTransactionsSerializer,RetraitMarchantSerializer,MerchantPaymentSerializer,DepositTransactionSerializer,PreTransactionRetrieveSerializer,RetraitTransactionSerializer,PreTransactionSerializer
+from django.db import transaction
+from .serializer import TransferTransactionSerializer,RechargeAgencySerializer,AllPreTransactionsSerializer,RetraitMarchantSerializer,MerchantPaymentSerializer,DepositTransactionSerializer,PreTransactionRetrieveSerializer,RetraitTransactionSerializer,PreTransactionSerializer,ClaimWithdrawalSerializer
+from .services.hold_service import release_hold
+from .paginations import PreTransactionCursorPagination
 #from rest_framework.permissions import IsAuthenticated
 #from apps.users.serializer import CustomJWTAuthentication
 
@@ -63,6 +67,24 @@ class RetraiTransactionView(APIView):
             return Response({"message": "retrai réussie"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ClaimWithdrawalView(APIView):
+    """Retrait agent en un appel : réclamation du code + écriture atomiques"""
+    permission_classes = [IsAuthenticated, AgencyAccountPermission]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ClaimWithdrawalSerializer(
+            data=request.data,
+            context={'bank_db': request.source_bank_db, 'agent_user': request.user},
+        )
+        if serializer.is_valid():
+            withdrawal = serializer.save()
+            return Response({
+                "message": "retrai réussie",
+                "transaction_id": withdrawal.id,
+                "montant": withdrawal.amount,
+            }, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 class RetraiMarchantView(APIView):
       def post(self, request, *args, **kwargs):
         serializer = RetraitMarchantSerializer(data=request.data, context={'bank_db': request.source_bank_db})
@@ -110,11 +132,13 @@ class RetrievePreTransactionView(APIView):
             
             
             try:
-                pre_transaction = PreTransaction.objects.using(bank_db).get(
+                # Un code utilisé peut être réattribué au même client : l'active,
+                # sinon la plus récente (created_at : les id anciens et nouveaux
+                # ne se comparent pas)
+                pre_transaction = PreTransaction.objects.using(bank_db).filter(
                     client_phone=client_phone,
                     code=code,
-                
-                )
+                ).order_by('is_used', '-created_at', '-id')[:1].get()
                 created_at_formatted = pre_transaction.created_at.strftime('%Y-%m-%d %H:%M:%S')
                 response_data = {
                     "Trs_ID": pre_transaction.id,
@@ -134,8 +158,14 @@ class CancelPreTransactionView(APIView):
     def delete(self, request,code):
         bank_db = request.source_bank_db
         try:
-            pre_transaction = PreTransaction.objects.using(bank_db).get(code=code)
-            pre_transaction.delete(using=bank_db)
+            # Les codes ne sont uniques que par client : annuler celle de l'utilisateur
+            pre_transaction = PreTransaction.objects.using(bank_db).get(
+                code=code, user_id=request.user.pk, is_used=False
+            )
+            # Libérer la réservation et supprimer dans la même transaction
+            with transaction.atomic(using=bank_db):
+                release_hold(bank_db, pre_transaction.pk)
+                pre_transaction.delete(using=bank_db)
             return Response({"message": "Pré-transaction annulée avec succès."}, status=status.HTTP_200_OK)
         except PreTransaction.DoesNotExist:
             return Response({"error": "Pré-transaction introuvable."}, status=status.HTTP_404_NOT_FOUND) 
@@ -221,40 +251,40 @@ class RetrievePaymentRequestView(APIView):
             return Response({"error": str(e)}, status=500)        
 
 
-class RetrieveAllPreTransactionsView(APIView):
-    def post(self, request):
-      
-        bank_db = request.source_bank_db
-        serializer = AllPreTransactionsSerializer(data=request.data)
-        
-        if serializer.is_valid():
-            try:
-              
-                pre_transactions = PreTransaction.objects.using(bank_db).all()
-                if not pre_transactions.exists():
-                    return Response({"message": "Aucune pré-transaction trouvée dans la base de données."},
-                                  status=status.HTTP_404_NOT_FOUND)
-                
-              
-                response_data = []
-                for transaction in pre_transactions:
-                    created_at_formatted = transaction.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                    transaction_data = {
-                        "Trs_ID": transaction.id,
-                        "code": transaction.code,
-                        "telephone": transaction.client_phone,
-                        "montant": transaction.amount,
-                        "Date_et_heure": created_at_formatted
-                    }
-                    response_data.append(transaction_data)
-                
-                return Response(response_data, status=status.HTTP_200_OK)
-                
-            except Exception as e:
-                return Response({"error": f"Une erreur s'est produite: {str(e)}"},
-                              status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class RetrieveAllPreTransactionsView(generics.ListAPIView):
+    """
+    Liste paginée par curseur des pré-transactions de la banque.
+    Filtres : client_phone, status=active|used|expired.
+    """
+    serializer_class = AllPreTransactionsSerializer
+    pagination_class = PreTransactionCursorPagination
+
+    def get_queryset(self):
+        bank_db = self.request.source_bank_db
+        params = self.request.query_params
+        queryset = PreTransaction.objects.using(bank_db).only(
+            'id', 'code', 'client_phone', 'amount', 'created_at', 'is_used', 'expires_at'
+        )
+
+        client_phone = params.get('client_phone')
+        if client_phone:
+            queryset = queryset.filter(client_phone=client_phone)
+
+        status_filter = params.get('status')
+        now = timezone.now()
+        if status_filter == 'active':
+            queryset = queryset.filter(is_used=False, expires_at__gt=now)
+        elif status_filter == 'expired':
+            queryset = queryset.filter(is_used=False, expires_at__lte=now)
+        elif status_filter == 'used':
+            queryset = queryset.filter(is_used=True)
+        elif status_filter:
+            raise serializers.ValidationError({"status": "Valeurs possibles : active, used, expired."})
+        return queryset
+
+    def post(self, request, *args, **kwargs):
+        # Ancien appel en POST : mêmes paramètres (query string), même réponse paginée
+        return self.list(request, *args, **kwargs)
     
 class RechargeAgancyView(APIView):
       def post(self, request, *args, **kwargs):
@@ -9,6 +9,7 @@ from django.contrib.auth.hashers import check_password as django_check_password
 from django.contrib.auth import authenticate
 
 from decimal import Decimal
+from core.tenants import resolve_bank
 
 
 
@@ -223,7 +224,11 @@ class CustomJWTAuthentication(JWTAuthentication):
         auth_result = super().authenticate(request)
         if auth_result is not None:
             user, token = auth_result
-            request.source_bank_db = token.get('bank_db')
+            bank = resolve_bank(token.get('bank_db'))
+            if bank is None:
+                raise AuthenticationFailed('Bank not found')
+            request.source_bank = bank
+            request.source_bank_db = bank.code
             request.user_account_type = token.get('account_type') 
             
         return auth_result
@@ -265,7 +270,11 @@ class CustomJWTAuthentication(JWTAuthentication):
         auth_result = super().authenticate(request)
         if auth_result is not None:
             user, token = auth_result
-            request.source_bank_db = token.get('bank_db')
+            bank = resolve_bank(token.get('bank_db'))
+            if bank is None:
+                raise AuthenticationFailed('Bank not found')
+            request.source_bank = bank
+            request.source_bank_db = bank.code
             request.user_account_type = token.get('account_type') 
         return auth_result
 
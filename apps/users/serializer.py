@@ -5,10 +5,12 @@ from django.db.models import Q
 from django.contrib.auth.hashers import check_password
 from apps.accounts.models import PersonalAccount,BusinessAccount,InternAccount,AgencyAccount
 from apps.transactions.models import Transaction
-from django.contrib.contenttypes.models import ContentType
+from core.content_types import content_type_map
 
+import base64
 import uuid
 import logging
+from datetime import datetime
 # from rest_framework import serializers
 # from keycloak import KeycloakOpenID
 # from django.conf import settings
@@ -282,7 +284,148 @@ class UserAccountSerializer(serializers.Serializer):
             
         }    
 
-class TransactionSerializer(serializers.Serializer):
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+class TransactionHistorySerializer(serializers.Serializer):
+    """
+    Historique des transactions d'un compte, paginé par curseur sur (date, id) :
+    chaque page est une lecture d'index bornée, quel que soit l'âge du compte.
+    Les sous-classes fournissent account_model, placent le compte dans
+    attrs['account'] puis appellent super().validate(attrs).
+    - cursor : page suivante (next_cursor de la réponse précédente)
+    - since / until : bornes de date ; types : filtre sur le type
+    - since_id : mode delta, seulement les transactions postérieures à celle-ci
+      (ordre chronologique, reprendre avec le latest_id de la réponse) ;
+      incompatible avec cursor
+    """
+    account_model = None
+
+    cursor = serializers.CharField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    types = serializers.ListField(
+        child=serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES), required=False
+    )
+    since_id = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=HISTORY_MAX_PAGE_SIZE)
+
+    @staticmethod
+    def encode_cursor(transaction):
+        raw = f"{transaction.date.isoformat()}|{transaction.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def validate_cursor(self, value):
+        try:
+            date, transaction_id = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+            date = datetime.fromisoformat(date)
+        except ValueError:
+            raise serializers.ValidationError("Curseur invalide.")
+        return date, transaction_id
+
+    def validate(self, attrs):
+        """
+        Appelé par les sous-classes une fois attrs['account'] résolu : since_id
+        doit désigner une transaction émise ou reçue par ce compte.
+        """
+        if 'cursor' in attrs and 'since_id' in attrs:
+            raise serializers.ValidationError("cursor et since_id ne peuvent pas être utilisés ensemble.")
+        if 'since_id' in attrs:
+            transaction_id = attrs['since_id']
+            account = attrs['account']
+            account_ct = content_type_map.get_for_model(self.bank_db, self.account_model)
+            date = Transaction.objects.using(self.bank_db).filter(
+                Q(source_account_type=account_ct, source_account_id=account.id)
+                | Q(destination_account_type=account_ct, destination_account_id=account.id),
+                pk=transaction_id,
+            ).values_list('date', flat=True).first()
+            if date is None:
+                raise serializers.ValidationError({'since_id': f"Transaction {transaction_id} introuvable."})
+            attrs['since_id'] = date, transaction_id
+        return attrs
+
+    def _account_transactions(self, account):
+        """
+        Transactions émises UNION transactions reçues : chaque branche suit son
+        propre index (compte, date, id) au lieu d'un OR qui impose un tri de
+        tout l'historique. Les commissions sont exclues.
+        """
+        account_ct = content_type_map.get_for_model(self.bank_db, self.account_model)
+        intern_account_ct = content_type_map.get_for_model(self.bank_db, InternAccount)
+        data = self.validated_data
+        page_size = data.get('page_size', HISTORY_PAGE_SIZE)
+
+        base = Transaction.objects.using(self.bank_db).exclude(
+            destination_account_type=intern_account_ct,
+            destination_account_id__in=InternAccount.objects.using(self.bank_db)
+            .filter(purpose='commission').values('id'),
+        )
+        if 'since' in data:
+            base = base.filter(date__gte=data['since'])
+        if 'until' in data:
+            base = base.filter(date__lt=data['until'])
+        if data.get('types'):
+            base = base.filter(type__in=data['types'])
+
+        if 'since_id' in data:
+            date, transaction_id = data['since_id']
+            base = base.filter(Q(date__gt=date) | Q(date=date, id__gt=transaction_id))
+            ordering = ('date', 'id')
+        else:
+            if 'cursor' in data:
+                date, transaction_id = data['cursor']
+                base = base.filter(Q(date__lt=date) | Q(date=date, id__lt=transaction_id))
+            ordering = ('-date', '-id')
+
+        sent = base.filter(source_account_type=account_ct, source_account_id=account.id)
+        received = base.filter(destination_account_type=account_ct, destination_account_id=account.id)
+        rows = list(
+            sent.order_by(*ordering)[:page_size + 1]
+            .union(received.order_by(*ordering)[:page_size + 1])
+            .order_by(*ordering)[:page_size + 1]
+        )
+        return rows[:page_size], len(rows) > page_size
+
+    def to_representation(self, instance):
+        account = self.validated_data['account']
+        transactions, has_more = self._account_transactions(account)
+        account_ct = content_type_map.get_for_model(self.bank_db, self.account_model)
+
+        response = {
+            'transactions': [
+                {
+                    'id': transaction.id,
+                    'type': transaction.type,
+                    'date': transaction.date,
+                    'amount': str(transaction.amount),
+                    'source': self.determine_source(transaction, account, account_ct),
+                }
+                for transaction in transactions
+            ],
+            'has_more': has_more,
+        }
+        if 'since_id' in self.validated_data:
+            response['latest_id'] = transactions[-1].id if transactions else self.validated_data['since_id'][1]
+        else:
+            response['next_cursor'] = self.encode_cursor(transactions[-1]) if has_more else None
+        return response
+
+    def determine_source(self, transaction, account, account_ct):
+        # Vérifier si le compte est la source de la transaction
+        if (transaction.source_account_type_id == account_ct.id and
+            transaction.source_account_id == account.id):
+            return 'sent'
+        # Vérifier si le compte est la destination de la transaction
+        elif (transaction.destination_account_type_id == account_ct.id and
+              transaction.destination_account_id == account.id):
+            return 'received'
+        else:
+            return 'unknown'
+
+
+class TransactionSerializer(TransactionHistorySerializer):
+    account_model = PersonalAccount
     phone_number = serializers.CharField()
 
     def __init__(self, *args, **kwargs):
@@ -308,67 +451,7 @@ class TransactionSerializer(serializers.Serializer):
                 f"Aucun compte personnel trouvé pour l'utilisateur {user.phone_number}."
             )
 
-        return attrs
-
-    def to_representation(self, instance):
-        account = self.validated_data['account']
-        
-        # ContentTypes pour filtrer les transactions
-        personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-        intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-        # Récupérer les IDs des comptes de commission pour les exclure
-        commission_account_ids = list(
-            InternAccount.objects.using(self.bank_db)
-            .filter(purpose='commission')
-            .values_list('id', flat=True)
-        )
-
-        # Construire la requête avec exclusion des comptes de commission
-        exclude_condition = Q()
-        if commission_account_ids:
-            exclude_condition = Q(
-                destination_account_type=intern_account_ct,
-                destination_account_id__in=commission_account_ids
-            )
-
-        # Filtrer les transactions liées au compte personnel
-        account_transactions = Transaction.objects.using(self.bank_db).filter(
-            Q(
-                source_account_type=personal_account_ct,
-                source_account_id=account.id
-            ) | Q(
-                destination_account_type=personal_account_ct,
-                destination_account_id=account.id
-            )
-        ).exclude(exclude_condition).order_by('-date')
-
-        return {
-            'transactions': [
-                {
-                    'type': transaction.type,
-                    'date': transaction.date,
-                    'amount': str(transaction.amount),
-                    'source': self.determine_source(transaction, account),
-                }
-                for transaction in account_transactions
-            ]
-        }
-
-    def determine_source(self, transaction, account):
-        # ContentType pour le compte personnel
-        personal_account_ct = ContentType.objects.get_for_model(PersonalAccount)
-        
-        # Vérifier si le compte est la source de la transaction
-        if (transaction.source_account_type == personal_account_ct and 
-            transaction.source_account_id == account.id):
-            return 'sent'
-        # Vérifier si le compte est la destination de la transaction
-        elif (transaction.destination_account_type == personal_account_ct and 
-              transaction.destination_account_id == account.id):
-            return 'received'
-        else:
-            return 'unknown'
+        return super().validate(attrs)
 
 
 # class AllAccountsSerializer(serializers.Serializer):
@@ -390,7 +473,8 @@ class TransactionSerializer(serializers.Serializer):
 #             ]
 #         } 
 
-class TransactionAganceSerialiser(serializers.Serializer):
+class TransactionAganceSerialiser(TransactionHistorySerializer):
+    account_model = AgencyAccount
     phone_number = serializers.CharField()
 
     def __init__(self, *args, **kwargs):
@@ -416,74 +500,11 @@ class TransactionAganceSerialiser(serializers.Serializer):
                 f"Aucun compte d'agence trouvé pour l'utilisateur {user.phone_number}."
             )
 
-        return attrs
+        return super().validate(attrs)
 
-    def to_representation(self, instance):
-        account = self.validated_data['account']
-        
-        # ContentTypes pour filtrer les transactions
-        agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-        intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-        # Filtrer les transactions liées au compte d'agence
-        account_transactions = Transaction.objects.using(self.bank_db).filter(
-            Q(
-                source_account_type=agency_account_ct,
-                source_account_id=account.id
-            ) | Q(
-                destination_account_type=agency_account_ct,
-                destination_account_id=account.id
-            )
-        ).order_by('-date')
-
-        # CORRECTION : Filtrer les transactions de commission APRÈS la requête principale
-        # car on ne peut pas utiliser GenericForeignKey dans exclude() directement
-        filtered_transactions = []
-        for transaction in account_transactions:
-            # Vérifier si c'est une transaction vers un compte de commission
-            if (transaction.destination_account_type == intern_account_ct):
-                try:
-                    # Récupérer le compte de destination pour vérifier le purpose
-                    destination_account = InternAccount.objects.using(self.bank_db).get(
-                        id=transaction.destination_account_id
-                    )
-                    # Exclure les transactions vers les comptes de commission
-                    if destination_account.purpose == 'commission':
-                        continue
-                except InternAccount.DoesNotExist:
-                    # Si le compte n'existe pas, ignorer cette vérification
-                    pass
-            
-            # Ajouter la transaction si elle n'est pas exclue
-            filtered_transactions.append(transaction)
 
-        return {
-            'transactions': [
-                {
-                    'type': transaction.type,
-                    'date': transaction.date,
-                    'amount': str(transaction.amount),
-                    'source': self.determine_source(transaction, account),
-                }
-                for transaction in filtered_transactions
-            ]
-        }
-
-    def determine_source(self, transaction, account):
-        # ContentType pour le compte d'agence
-        agency_account_ct = ContentType.objects.get_for_model(AgencyAccount)
-        
-        # Vérifier si le compte est la source de la transaction
-        if (transaction.source_account_type == agency_account_ct and 
-            transaction.source_account_id == account.id):
-            return 'sent'
-        # Vérifier si le compte est la destination de la transaction
-        elif (transaction.destination_account_type == agency_account_ct and 
-              transaction.destination_account_id == account.id):
-            return 'received'
-        else:
-            return 'unknown'        
-class TransactionBusinessSerialiser(serializers.Serializer):
+class TransactionBusinessSerialiser(TransactionHistorySerializer):
+    account_model = BusinessAccount
     phone_number = serializers.CharField()
 
     def __init__(self, *args, **kwargs):
@@ -509,74 +530,8 @@ class TransactionBusinessSerialiser(serializers.Serializer):
                 f"Aucun compte business trouvé pour l'utilisateur {user.phone_number}."
             )
 
-        return attrs
-
-    def to_representation(self, instance):
-        account = self.validated_data['account']
-        
-        # ContentTypes pour filtrer les transactions
-        business_account_ct = ContentType.objects.get_for_model(BusinessAccount)
-        intern_account_ct = ContentType.objects.get_for_model(InternAccount)
-
-        # Filtrer les transactions liées au compte business
-        account_transactions = Transaction.objects.using(self.bank_db).filter(
-            Q(
-                source_account_type=business_account_ct,
-                source_account_id=account.id
-            ) | Q(
-                destination_account_type=business_account_ct,
-                destination_account_id=account.id
-            )
-        ).order_by('-date')
-
-        # CORRECTION : Filtrer les transactions de commission APRÈS la requête principale
-        # car on ne peut pas utiliser GenericForeignKey dans exclude() directement
-        filtered_transactions = []
-        for transaction in account_transactions:
-            # Vérifier si c'est une transaction vers un compte de commission
-            if (transaction.destination_account_type == intern_account_ct):
-                try:
-                    # Récupérer le compte de destination pour vérifier le purpose
-                    destination_account = InternAccount.objects.using(self.bank_db).get(
-                        id=transaction.destination_account_id
-                    )
-                    # Exclure les transactions vers les comptes de commission
-                    if destination_account.purpose == 'commission':
-                        continue
-                except InternAccount.DoesNotExist:
-                    # Si le compte n'existe pas, ignorer cette vérification
-                    pass
-            
-            # Ajouter la transaction si elle n'est pas exclue
-            filtered_transactions.append(transaction)
+        return super().validate(attrs)
 
-        return {
-            'transactions': [
-                {
-                    'type': transaction.type,
-                    'date': transaction.date,
-                    'amount': str(transaction.amount),
-                    'source': self.determine_source(transaction, account),
-                }
-                for transaction in filtered_transactions
-            ]
-        }
-
-    def determine_source(self, transaction, account):
-        # ContentType pour le compte business
-        business_account_ct = ContentType.objects.get_for_model(BusinessAccount)
-        
-        # Vérifier si le compte est la source de la transaction
-        if (transaction.source_account_type == business_account_ct and 
-            transaction.source_account_id == account.id):
-            return 'sent'
-        # Vérifier si le compte est la destination de la transaction
-        elif (transaction.destination_account_type == business_account_ct and 
-              transaction.destination_account_id == account.id):
-            return 'received'
-        else:
-            return 'unknown'
-        
 
 
 
@@ -1,10 +1,11 @@
 from django.urls import path
-from .views import UserRegistrationView,SendPasswordResetOTPView,ResetPasswordView,VerifyPasswordResetOTPView,SendOTPView,VerifyOTPView,AganceProfileView,TransactinBussnessView,ComercantProfileView,TransactinAganceView,TransactionHistoryView,AddBusinessOrAgencyAccountView,UserProfileView,CustomTokenObtainPairView,RegistrationAcounteAgancyBisenessView,MerchantCodeValidationView,PhoneValidationView,PasswordValidationView
+from .views import UserRegistrationView,SendPasswordResetOTPView,ResetPasswordView,VerifyPasswordResetOTPView,SendOTPView,VerifyOTPView,SmsStatusView,AganceProfileView,TransactinBussnessView,ComercantProfileView,TransactinAganceView,TransactionHistoryView,AddBusinessOrAgencyAccountView,UserProfileView,CustomTokenObtainPairView,RegistrationAcounteAgancyBisenessView,MerchantCodeValidationView,PhoneValidationView,PasswordValidationView
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('send-otp/', SendOTPView.as_view(), name='send_otp'),
     path('verify-otp/', VerifyOTPView.as_view(), name='verify_otp'),
+    path('sms-status/<str:message_id>/', SmsStatusView.as_view(), name='sms_status'),
 
     path('send-reset-otp/', SendPasswordResetOTPView.as_view(), name='send_reset_otp'),
     path('verify-reset-otp/', VerifyPasswordResetOTPView.as_view(), name='verify_reset_otp'),
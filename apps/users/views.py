@@ -13,9 +13,9 @@ from django.views.decorators.csrf import csrf_exempt
 from apps.transactions.services.password_reset_otp_service import PasswordResetOTPService
 import logging
 from apps.transactions.permissions import BusinessAccountPermission,AgencyOrBusinessPermission,AgencyAccountPermission,PersonnelAccountPermission,AllAccountTypesPermission
-from django.utils import timezone
-from apps.transactions.models import PasswordResetOTP
+from apps.transactions.models import SmsOutbox
 from apps.users.models import User
+from core.ratelimit import IPRateThrottle, PhoneRateThrottle
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,8 @@ class SendPasswordResetOTPView(APIView):
     Envoie un OTP pour la réinitialisation de mot de passe
     Adapté pour la nouvelle conception avec relation User
     """
+    throttle_classes = [IPRateThrottle, PhoneRateThrottle]
+    ratelimit_scope = 'password_reset_send'
     
     def post(self, request, *args, **kwargs):
         logger.info(f"SendPasswordResetOTPView - Données reçues: {request.data}")
@@ -62,7 +64,8 @@ class SendPasswordResetOTPView(APIView):
             if result['success']:
                 # Réponse enrichie avec informations utilisateur si disponible
                 response_data = {
-                    'message': result['message']
+                    'message': result['message'],
+                    'message_id': result.get('message_id')
                 }
                 
                 # Ajouter des informations supplémentaires en mode dev
@@ -90,6 +93,8 @@ class VerifyPasswordResetOTPView(APIView):
     Vérifie l'OTP de réinitialisation et génère un token de reset
     Adapté pour la nouvelle conception avec relation User
     """
+    throttle_classes = [IPRateThrottle, PhoneRateThrottle]
+    ratelimit_scope = 'password_reset_verify'
     
     def post(self, request, *args, **kwargs):
         logger.info(f"VerifyPasswordResetOTPView - Données reçues: {request.data}")
@@ -196,7 +201,8 @@ class ResetPasswordView(APIView):
             
             if result['success']:
                 response_data = {
-                    'message': result['message']
+                    'message': result['message'],
+                    'message_id': result.get('message_id')
                 }
                 
                 # Ajouter des informations supplémentaires si disponibles
@@ -219,150 +225,19 @@ class ResetPasswordView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-# Vue utilitaire pour nettoyer les anciens OTP - Adaptée à la nouvelle conception
-@method_decorator(csrf_exempt, name='dispatch')
-class CleanupExpiredOTPView(APIView):
-    """
-    Nettoie les OTP expirés de la base spécifiée
-    Adapté pour la nouvelle conception avec relation User
-    """
-    
-    def post(self, request, *args, **kwargs):
-        logger.info(f"CleanupExpiredOTPView - Nettoyage demandé")
-        logger.info(f"Headers: X-Source-Bank-Code={request.META.get('HTTP_X_SOURCE_BANK_CODE')}")
-        
-        # Récupérer la base de données depuis l'en-tête
-        bank_db = getattr(request, 'source_bank_db', None)
-        
-        if not bank_db:
-            logger.error("En-tête X-Source-Bank-Code manquant pour le nettoyage")
-            return Response(
-                {'error': 'En-tête X-Source-Bank-Code requis'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        logger.info(f"Nettoyage de la base de données: {bank_db}")
-        
-        try:
-            
-            
-            # Compter d'abord les OTP expirés
-            expired_count = PasswordResetOTP.objects.using(bank_db).filter(
-                expires_at__lt=timezone.now()
-            ).count()
-            
-            logger.info(f"Trouvé {expired_count} OTP expirés dans la base {bank_db}")
-            
-            # Supprimer tous les OTP expirés de la base spécifiée
-            deleted_count = PasswordResetOTP.objects.using(bank_db).filter(
-                expires_at__lt=timezone.now()
-            ).delete()[0]
-            
-            logger.info(f" Supprimé {deleted_count} OTP expirés de la base {bank_db}")
-            
-            # Optionnel: nettoyer aussi les OTP utilisés plus anciens que 24h
-            old_used_count = PasswordResetOTP.objects.using(bank_db).filter(
-                is_used=True,
-                created_at__lt=timezone.now() - timezone.timedelta(hours=24)
-            ).delete()[0]
-            
-            if old_used_count > 0:
-                logger.info(f"Supprimé {old_used_count} anciens OTP utilisés de la base {bank_db}")
-            
-            total_cleaned = deleted_count + old_used_count
-            
-            return Response({
-                'message': f'Nettoyage terminé: {deleted_count} OTP expirés et {old_used_count} anciens OTP utilisés supprimés',
-                'expired_deleted': deleted_count,
-                'old_used_deleted': old_used_count,
-                'total_cleaned': total_cleaned,
-                'database': bank_db
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            logger.error(f" Erreur lors du nettoyage de la base {bank_db}: {str(e)}")
-            return Response(
-                {'error': f'Erreur serveur lors du nettoyage: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-    def get(self, request, *args, **kwargs):
-        """
-        Méthode GET pour obtenir des statistiques sur les OTP sans les supprimer
-        Adaptée à la nouvelle conception avec relation User
-        """
-        logger.info(f"CleanupExpiredOTPView - Statistiques demandées")
-        
-        # Récupérer la base de données depuis l'en-tête
-        bank_db = getattr(request, 'source_bank_db', None)
-        
-        if not bank_db:
-            return Response(
-                {'error': 'En-tête X-Source-Bank-Code requis'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        try:
-            
-            
-            # Statistiques des OTP avec informations utilisateur
-            total_otps = PasswordResetOTP.objects.using(bank_db).count()
-            expired_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                expires_at__lt=timezone.now()
-            ).count()
-            verified_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                is_verified=True
-            ).count()
-            used_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                is_used=True
-            ).count()
-            pending_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                is_verified=False,
-                is_used=False,
-                expires_at__gte=timezone.now()
-            ).count()
-            
-            # Statistiques utilisateur avec OTP actifs
-            users_with_active_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                is_verified=False,
-                is_used=False,
-                expires_at__gte=timezone.now()
-            ).values_list('user_id', flat=True).distinct().count()
-            
-            # Statistiques sur les tentatives
-            high_attempts_otps = PasswordResetOTP.objects.using(bank_db).filter(
-                attempts__gte=2
-            ).count()
-            
-            return Response({
-                'database': bank_db,
-                'statistics': {
-                    'total_otps': total_otps,
-                    'expired_otps': expired_otps,
-                    'verified_otps': verified_otps,
-                    'used_otps': used_otps,
-                    'pending_otps': pending_otps,
-                    'users_with_active_otps': users_with_active_otps,
-                    'high_attempts_otps': high_attempts_otps
-                },
-                'message': f'Statistiques pour la base {bank_db} (nouvelle conception avec User)'
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération des statistiques {bank_db}: {str(e)}")
-            return Response(
-                {'error': f'Erreur serveur: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
 #//////////////////////////////////////////////
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [IPRateThrottle, PhoneRateThrottle]
+    ratelimit_scope = 'login'
 
 logger = logging.getLogger(__name__)
 
 class SendOTPView(APIView):
+    throttle_classes = [IPRateThrottle, PhoneRateThrottle]
+    ratelimit_scope = 'otp_send'
+
     def post(self, request, *args, **kwargs):
         phone_number = request.data.get('phone_number')
         lang = request.data.get('lang', 'fr')  # Par défaut français
@@ -386,7 +261,7 @@ class SendOTPView(APIView):
         if result['success']:
             return Response({
                 'message': result['message'],
-                'balance': result.get('balance')
+                'message_id': result.get('message_id')
             }, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -394,7 +269,34 @@ class SendOTPView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class SmsStatusView(APIView):
+    """
+    État de livraison d'un SMS mis en file par send-otp / send-reset-otp.
+    Seuls les messages envoyés au numéro de l'utilisateur sont visibles :
+    ceux des autres répondent 404, comme un identifiant inconnu.
+    """
+
+    def get(self, request, message_id, *args, **kwargs):
+        message = SmsOutbox.objects.using(request.source_bank_db).filter(
+            pk=message_id, phone_number=request.user.phone_number
+        ).only('status', 'attempts', 'last_error', 'sent_at').first()
+        if message is None:
+            return Response({'error': 'Message introuvable'}, status=status.HTTP_404_NOT_FOUND)
+
+        response_data = {
+            'message_id': message_id,
+            'status': message.status,
+            'attempts': message.attempts,
+            'sent_at': message.sent_at,
+        }
+        if message.status == 'failed':
+            response_data['error'] = message.last_error
+        return Response(response_data, status=status.HTTP_200_OK)
+
 class VerifyOTPView(APIView):
+    throttle_classes = [IPRateThrottle, PhoneRateThrottle]
+    ratelimit_scope = 'otp_verify'
+
     def post(self, request, *args, **kwargs):
       #  logger.info(f"VerifyOTPView - Données reçues: {request.data}")
         
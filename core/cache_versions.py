@@ -0,0 +1,44 @@
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = 'version-stamp'
+
+
+def _key(name):
+    return f"{VERSION_KEY_PREFIX}:{name}"
+
+
+def get_version(name):
+    """
+    Retourne le numéro de version courant d'une donnée mise en cache en mémoire.
+    Le compteur est dans le cache Django : partagé entre workers seulement avec
+    CACHE_BACKEND='redis' ; avec le cache en mémoire, chaque processus a le
+    sien et ne voit que ses propres invalidations.
+    Cache injoignable : None (les données en mémoire restent servies).
+    """
+    try:
+        version = cache.get(_key(name))
+        if version is None:
+            cache.add(_key(name), 1, timeout=None)
+            version = cache.get(_key(name), 1)
+        return version
+    except Exception as e:
+        logger.error(f"Version {name} illisible dans le cache: {str(e)}")
+        return None
+
+
+def bump_version(name):
+    """Incrémente la version pour forcer le rechargement dans tous les workers"""
+    try:
+        try:
+            return cache.incr(_key(name))
+        except ValueError:
+            # Clé absente (cache vidé ou jamais initialisé)
+            cache.set(_key(name), 2, timeout=None)
+            return 2
+    except Exception as e:
+        logger.error(f"Version {name} non publiée dans le cache: {str(e)}")
+        return None
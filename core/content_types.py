@@ -0,0 +1,76 @@
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+
+
+class TenantContentTypes:
+    """
+    Table des ContentType de chaque base, chargée en une requête au premier
+    usage d'un alias puis servie depuis la mémoire du processus.
+
+    Les identifiants de ContentType diffèrent d'une base de banque à l'autre :
+    ContentType.objects.get_for_model() sans db_manager répond avec ceux de
+    'default'. Toute résolution modèle <-> identifiant d'une banque passe donc
+    par cette table, avec l'alias de la banque.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model = {}
+        self._by_id = {}
+
+    def _load(self, alias):
+        by_model = {}
+        by_id = {}
+        for content_type in ContentType.objects.using(alias).all():
+            by_model[(content_type.app_label, content_type.model)] = content_type
+            by_id[content_type.id] = content_type
+        with self._lock:
+            self._by_model[alias] = by_model
+            self._by_id[alias] = by_id
+
+    def _ensure_loaded(self, alias):
+        if alias not in self._by_id:
+            self._load(alias)
+
+    def get_for_model(self, alias, model):
+        """ContentType d'un modèle (ou d'une instance) dans la base alias"""
+        opts = model._meta.concrete_model._meta
+        key = (opts.app_label, opts.model_name)
+        self._ensure_loaded(alias)
+        content_type = self._by_model[alias].get(key)
+        if content_type is None:
+            # Type absent au chargement : créé depuis (post_migrate, nouveau modèle)
+            content_type = ContentType.objects.db_manager(alias).get_for_model(model)
+            with self._lock:
+                self._by_model[alias][key] = content_type
+                self._by_id[alias][content_type.id] = content_type
+        return content_type
+
+    def get_id(self, alias, model):
+        return self.get_for_model(alias, model).id
+
+    def get_by_id(self, alias, content_type_id):
+        """ContentType d'un identifiant de la base alias, ou None s'il n'existe pas"""
+        self._ensure_loaded(alias)
+        content_type = self._by_id[alias].get(content_type_id)
+        if content_type is None:
+            self._load(alias)
+            content_type = self._by_id[alias].get(content_type_id)
+        return content_type
+
+    def model_for_id(self, alias, content_type_id):
+        content_type = self.get_by_id(alias, content_type_id)
+        return content_type.model_class() if content_type else None
+
+    def invalidate(self, alias=None):
+        with self._lock:
+            if alias is None:
+                self._by_model.clear()
+                self._by_id.clear()
+            else:
+                self._by_model.pop(alias, None)
+                self._by_id.pop(alias, None)
+
+
+content_type_map = TenantContentTypes()
@@ -0,0 +1,31 @@
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def to_date(day):
+    """date depuis une date, un datetime ou 'AAAA-MM-JJ' (ValueError sinon)"""
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    parsed = parse_date(day)
+    if parsed is None:
+        raise ValueError(f"Date invalide : {day}")
+    return parsed
+
+
+def day_start(day):
+    """
+    Début (minuit, fuseau courant) d'un jour donné en date ou 'AAAA-MM-JJ'.
+    À utiliser à la place de date__date=... : un filtre de plage sur la colonne
+    brute reste indexable, le cast en date ne l'est pas.
+    """
+    return timezone.make_aware(datetime.combine(to_date(day), time.min))
+
+
+def day_range(first_day, last_day=None):
+    """Plage demi-ouverte [début de first_day, début du lendemain de last_day)"""
+    last_day = to_date(last_day if last_day is not None else first_day)
+    return day_start(first_day), day_start(last_day + timedelta(days=1))
@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+# Identifiant 63 bits : | 41 bits millisecondes | 10 bits nœud | 12 bits séquence |
+# encodé en base 36 sur 13 caractères (largeur fixe : l'ordre alphabétique
+# suit l'ordre chronologique). "TR" + 13 = 15 caractères, sous max_length=20.
+# Les identifiants antérieurs (TR2025..., PT2025...) se classent après ces
+# identifiants (TR0..., PT0...) : sur une table qui mélange les deux formats,
+# l'ordre des id n'est pas chronologique. Trier sur la date, id ne sert qu'à
+# départager.
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WIDTH = 13
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def _encode(value):
+    chars = []
+    while value:
+        value, remainder = divmod(value, 36)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars)).rjust(WIDTH, '0')
+
+
+def _decode(text):
+    return int(text, 36)
+
+
+class NodeLease:
+    """
+    Numéro de nœud loué dans Redis : clé id-generator:node:<n> posée avec NX et
+    une durée de vie, renouvelée par un thread toutes les ttl/3 secondes. Deux
+    processus vivants, sur la même machine ou non, ne tiennent jamais le même
+    numéro. Un bail qui n'a pas pu être renouvelé avant sa fin est considéré
+    perdu : le générateur en reloue un autre avant de produire un identifiant.
+    """
+
+    KEY = 'id-generator:node:{}'
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    def __init__(self, client, ttl):
+        self._client = client
+        self._ttl_ms = int(ttl * 1000)
+        self._renew = client.register_script(self.RENEW_SCRIPT)
+        self._token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._valid_until = 0.0
+        self.node = None
+
+    @property
+    def valid(self):
+        return self.node is not None and time.monotonic() < self._valid_until
+
+    def acquire(self):
+        start = random.randrange(MAX_NODE + 1)
+        for offset in range(MAX_NODE + 1):
+            node = (start + offset) % (MAX_NODE + 1)
+            started = time.monotonic()
+            if self._client.set(self.KEY.format(node), self._token, nx=True, px=self._ttl_ms):
+                self.node = node
+                self._valid_until = started + self._ttl_ms / 1000
+                threading.Thread(target=self._keep_alive, args=(node,), daemon=True).start()
+                return node
+        raise ImproperlyConfigured("Aucun numéro de nœud libre pour le générateur d'identifiants")
+
+    def _keep_alive(self, node):
+        while self.node == node:
+            time.sleep(self._ttl_ms / 3000)
+            started = time.monotonic()
+            try:
+                renewed = self._renew(keys=[self.KEY.format(node)], args=[self._token, self._ttl_ms])
+            except Exception as e:
+                logger.error(f"Bail du nœud {node} non renouvelé: {str(e)}")
+                continue
+            if not renewed:
+                logger.error(f"Bail du nœud {node} perdu")
+                return
+            self._valid_until = started + self._ttl_ms / 1000
+
+
+def default_node():
+    """
+    Nœud fixé par ID_GENERATOR_NODE, ou None : le nœud est alors loué dans
+    Redis (NodeLease). Un nœud fixe ne convient qu'à un processus écrivain
+    unique ; plusieurs workers lancés avec la même configuration doivent louer.
+    """
+    node = getattr(settings, 'ID_GENERATOR_NODE', None)
+    if node is None:
+        return None
+    node = int(node)
+    if not 0 <= node <= MAX_NODE:
+        raise ImproperlyConfigured(f"ID_GENERATOR_NODE doit être entre 0 et {MAX_NODE}")
+    return node
+
+
+def lease_node():
+    """Nouveau bail de nœud dans Redis (ImproperlyConfigured si Redis est indisponible)"""
+    from core.redis_client import get_redis
+
+    try:
+        lease = NodeLease(get_redis(), settings.ID_NODE_LEASE_TTL)
+        lease.acquire()
+    except ImproperlyConfigured:
+        raise
+    except Exception as e:
+        raise ImproperlyConfigured(
+            f"Nœud du générateur d'identifiants : définir ID_GENERATOR_NODE ou rendre Redis joignable ({str(e)})"
+        )
+    return lease
+
+
+class IdGenerator:
+    """
+    Générateur d'identifiants triés dans le temps, sans aller-retour en base.
+    Monotone par nœud : si l'horloge recule ou si les 4096 valeurs d'une
+    milliseconde sont épuisées, on continue sur la milliseconde suivante.
+    """
+
+    def __init__(self, node=None):
+        self._lock = threading.Lock()
+        self._node = node
+        self._lease = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    @property
+    def node(self):
+        if self._node is None:
+            self._node = default_node()
+        if self._node is not None:
+            return self._node
+        lease = self._lease
+        if lease is None or not lease.valid:
+            with self._lock:
+                if self._lease is None or not self._lease.valid:
+                    if self._lease is not None:
+                        self._lease.node = None
+                    self._lease = lease_node()
+                lease = self._lease
+        return lease.node
+
+    def reset(self, node=None):
+        """Après un fork : le bail du parent n'est pas hérité, nouvelle séquence"""
+        self._lock = threading.Lock()
+        self._node = node
+        self._lease = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_value(self):
+        node = self.node
+        with self._lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | (node << SEQUENCE_BITS) | self._sequence
+
+    def next_id(self, prefix):
+        return f"{prefix}{_encode(self.next_value())}"
+
+
+id_generator = IdGenerator()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=id_generator.reset)
+
+
+def generate_id(prefix):
+    """Ex: generate_id('TR') -> 'TR0K2V9ZQ4E8001'"""
+    return id_generator.next_id(prefix)
+
+
+def id_timestamp_ms(value, prefix_length=2):
+    """Horodatage (ms Unix) encodé dans un identifiant"""
+    raw = _decode(value[prefix_length:])
+    return (raw >> (NODE_BITS + SEQUENCE_BITS)) + EPOCH_MS
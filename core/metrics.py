@@ -0,0 +1,125 @@
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Registre de métriques en mémoire du processus, exporté au format texte
+    Prometheus. Les compteurs et jauges sont étiquetés (ex: bank="rasidi").
+    Les collecteurs enregistrés sont appelés à chaque export pour les valeurs
+    lues à la demande (statistiques des pools de connexions, etc.).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._types = {}
+        self._help = {}
+        self._collectors = []
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, metric_type, help_text=''):
+        self._types[name] = metric_type
+        if help_text:
+            self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur"""
+        self._types.setdefault(name, 'counter')
+        with self._lock:
+            self._values[self._key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        """Fixe la valeur d'une jauge"""
+        self._types.setdefault(name, 'gauge')
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Enregistre une durée ou une taille : produit name_count et name_sum"""
+        self._types.setdefault(name, 'summary')
+        with self._lock:
+            self._values[self._key(f'{name}_count', labels)] += 1
+            self._values[self._key(f'{name}_sum', labels)] += value
+
+    def register_collector(self, collector):
+        """
+        collector() retourne des tuples (name, labels, value, type). Un même
+        collecteur n'est enregistré qu'une fois.
+        """
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def collect(self):
+        """Retourne la liste des échantillons (name, labels, value)"""
+        with self._lock:
+            samples = [
+                (name, dict(labels), value)
+                for (name, labels), value in self._values.items()
+            ]
+        for collector in list(self._collectors):
+            for name, labels, value, metric_type in collector():
+                self._types.setdefault(name, metric_type)
+                samples.append((name, labels, value))
+        return samples
+
+    def _family(self, sample_name):
+        for suffix in ('_count', '_sum'):
+            base = sample_name[:-len(suffix)]
+            if sample_name.endswith(suffix) and self._types.get(base) == 'summary':
+                return base
+        return sample_name
+
+    def render_prometheus(self):
+        families = defaultdict(list)
+        for name, labels, value in self.collect():
+            families[self._family(name)].append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            if family in self._help:
+                lines.append(f'# HELP {family} {self._help[family]}')
+            lines.append(f'# TYPE {family} {self._types.get(family, "untyped")}')
+            for name, labels, value in sorted(families[family], key=lambda s: (s[0], sorted(s[1].items()))):
+                if labels:
+                    rendered = ','.join(
+                        f'{key}="{_escape(val)}"' for key, val in sorted(labels.items())
+                    )
+                    lines.append(f'{name}{{{rendered}}} {value}')
+                else:
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """
+    Expose le registre sur un port dédié, dans un thread de fond : pour les
+    workers lancés en commande de gestion, hors du serveur web et de /metrics/.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
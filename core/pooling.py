@@ -0,0 +1,70 @@
+import logging
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.postgresql.base import DatabaseWrapper
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statistiques psycopg_pool cumulées depuis l'ouverture du pool
+POOL_COUNTERS = {
+    'requests_num': 'tenant_db_pool_checkouts_total',
+    'requests_queued': 'tenant_db_pool_queued_total',
+    'requests_wait_ms': 'tenant_db_pool_wait_ms_total',
+    'requests_errors': 'tenant_db_pool_timeouts_total',
+    'usage_ms': 'tenant_db_pool_checkout_ms_total',
+    'connections_num': 'tenant_db_pool_connects_total',
+    'connections_ms': 'tenant_db_pool_connect_ms_total',
+    'connections_errors': 'tenant_db_pool_connect_errors_total',
+    'connections_lost': 'tenant_db_pool_connections_lost_total',
+    'returns_bad': 'tenant_db_pool_returns_bad_total',
+}
+
+# Valeurs instantanées
+POOL_GAUGES = {
+    'pool_min': 'tenant_db_pool_min_size',
+    'pool_max': 'tenant_db_pool_max_size',
+    'pool_size': 'tenant_db_pool_size',
+    'pool_available': 'tenant_db_pool_available',
+    'requests_waiting': 'tenant_db_pool_waiting',
+}
+
+
+def tenant_pools():
+    """Retourne {alias: ConnectionPool} pour les pools ouverts dans ce processus"""
+    return {
+        alias: pool
+        for alias, pool in list(DatabaseWrapper._connection_pools.items())
+        if alias != DEFAULT_DB_ALIAS
+    }
+
+
+def close_tenant_pool(alias):
+    """Ferme le pool d'une banque (banque supprimée, reconfigurée ou inactive)"""
+    pool = DatabaseWrapper._connection_pools.pop(alias, None)
+    if pool is not None:
+        pool.close()
+        logger.info(f"Pool de connexions fermé pour la banque {alias}")
+
+
+def collect_pool_metrics():
+    """
+    Collecteur core.metrics : attente, durée d'emprunt et saturation par banque.
+    La durée moyenne d'emprunt vaut checkout_ms_total / checkouts_total.
+    """
+    for alias, pool in tenant_pools().items():
+        stats = pool.get_stats()
+        labels = {'bank': alias}
+        for key, name in POOL_COUNTERS.items():
+            yield name, labels, stats.get(key, 0), 'counter'
+        for key, name in POOL_GAUGES.items():
+            yield name, labels, stats.get(key, 0), 'gauge'
+
+        pool_max = stats.get('pool_max') or pool.max_size
+        in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+        saturation = in_use / pool_max if pool_max else 0
+        yield 'tenant_db_pool_saturation', labels, round(saturation, 4), 'gauge'
+
+
+metrics.register_collector(collect_pool_metrics)
@@ -0,0 +1,175 @@
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/min' -> (capacité 5, recharge 5/60 jeton par seconde) ; '3/10m' accepté"""
+    count, period = rate.split('/')
+    multiplier = ''.join(ch for ch in period if ch.isdigit()) or '1'
+    unit = period.lstrip('0123456789')[:1]
+    if unit not in PERIODS:
+        raise ImproperlyConfigured(f"Débit invalide : {rate}")
+    return int(count), int(count) / (int(multiplier) * PERIODS[unit])
+
+
+class MemoryBucketStore:
+    """Seaux en mémoire du processus (une seule instance, développement)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > 50000:
+                # Seaux pleins depuis longtemps : équivalents à une absence de seau
+                self._buckets = {
+                    k: (tokens, ts) for k, (tokens, ts) in self._buckets.items()
+                    if now - ts < capacity / refill_rate
+                }
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / refill_rate
+
+
+class RedisBucketStore:
+    """
+    Seaux partagés entre workers dans un serveur Redis. Recharge et prélèvement
+    dans un script Lua atomique, à l'heure du serveur (pas de dérive d'horloge
+    entre workers) ; la clé expire quand le seau serait de nouveau plein.
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, client):
+        self._script = client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        allowed, wait = self._script(keys=[key], args=[capacity, refill_rate, cost])
+        return bool(allowed), float(wait)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """Backend choisi par RATELIMIT_BACKEND ('memory' ou 'redis')"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = settings.RATELIMIT_BACKEND
+                if backend == 'memory':
+                    _store = MemoryBucketStore()
+                elif backend == 'redis':
+                    from core.redis_client import get_redis
+                    _store = RedisBucketStore(get_redis())
+                else:
+                    raise ImproperlyConfigured(f"RATELIMIT_BACKEND inconnu : {backend}")
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle, ABC):
+    """
+    Throttle DRF à seau à jetons, par banque et par sujet (numéro, IP...).
+    La vue déclare ratelimit_scope ; le débit vient de
+    RATELIMITS[scope][subject_name]. Un refus donne une réponse 429 avec
+    Retry-After (DRF). Si le stockage est injoignable, la requête passe.
+    """
+
+    subject_name = None
+
+    def __init__(self):
+        self._wait = None
+
+    @abstractmethod
+    def get_subject(self, request, view):
+        """Sujet limité pour cette requête ; None : pas de limite"""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'ratelimit_scope', None)
+        rate = settings.RATELIMITS.get(scope, {}).get(self.subject_name) if scope else None
+        if not settings.RATELIMIT_ENABLED or rate is None:
+            return True
+        subject = self.get_subject(request, view)
+        if not subject:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        bank = getattr(request, 'source_bank_db', None) or '-'
+        key = f"rl:{scope}:{self.subject_name}:{bank}:{subject}"
+        try:
+            allowed, self._wait = get_bucket_store().consume(key, capacity, refill_rate)
+        except Exception as e:
+            metrics.inc('ratelimit_errors_total', scope=scope)
+            logger.error(f"Limiteur de débit indisponible ({scope}): {str(e)}")
+            return True
+
+        outcome = 'allowed' if allowed else 'rejected'
+        metrics.inc(f'ratelimit_{outcome}_total', scope=scope, subject=self.subject_name, bank=bank)
+        return allowed
+
+    def wait(self):
+        return math.ceil(self._wait) if self._wait else None
+
+
+class PhoneRateThrottle(TokenBucketThrottle):
+    """Par numéro de téléphone du corps de la requête"""
+
+    subject_name = 'phone'
+
+    def get_subject(self, request, view):
+        phone_number = request.data.get('phone_number') if hasattr(request.data, 'get') else None
+        return str(phone_number).strip() if phone_number else None
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    """
+    Par adresse IP du client : REMOTE_ADDR, ou X-Forwarded-For derrière
+    NUM_PROXIES proxys de confiance (l'en-tête seul est falsifiable)
+    """
+
+    subject_name = 'ip'
+
+    def get_subject(self, request, view):
+        return self.get_ident(request)
@@ -0,0 +1,36 @@
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import redis
+except ImportError:  # dépendance optionnelle : seulement pour les backends Redis
+    redis = None
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def get_redis(url=None):
+    """
+    Client Redis partagé par URL (pool de connexions interne à redis-py).
+    Tout serveur parlant le protocole Redis convient (Redis, Valkey, KeyDB...).
+    """
+    if redis is None:
+        raise ImproperlyConfigured("Le paquet 'redis' est requis pour utiliser un backend Redis.")
+    url = url or settings.REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                client = redis.Redis.from_url(
+                    url,
+                    decode_responses=True,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    health_check_interval=30,
+                )
+                _clients[url] = client
+    return client
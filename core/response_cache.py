@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'response-cache'
+# Intervalle d'attente (secondes) de l'entrée calculée par un autre worker
+POLL_INTERVAL = 0.05
+
+
+class _Flight:
+    """Calcul en cours pour une clé : les requêtes identiques attendent son résultat"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class ResponseCache:
+    """
+    Cache stale-while-revalidate de réponses calculées (tableaux de bord), par
+    point d'accès, banque et paramètres, dans le cache Django :
+
+    - entrée fraîche (âge < DASHBOARD_CACHE_FRESH_TTL) : servie telle quelle ;
+    - entrée périmée (jusqu'à DASHBOARD_CACHE_STALE_TTL de plus) : servie
+      telle quelle, et un seul recalcul est lancé en arrière-plan ;
+    - entrée absente : un seul calcul. Les requêtes identiques du processus
+      attendent son résultat ; celles des autres workers voient le verrou
+      posé dans le cache et attendent que l'entrée apparaisse.
+
+    Entrées et verrous ne sont partagés entre workers qu'avec un cache commun
+    (CACHE_BACKEND='redis'). Avec 'memory', chaque processus a son propre
+    cache : le regroupement des calculs ne vaut qu'au sein du processus, et
+    chaque worker calcule la réponse une fois par période de fraîcheur.
+
+    Un cache injoignable ne fait pas échouer la requête : le calcul est fait
+    directement.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    @staticmethod
+    def make_key(endpoint, bank_db, params=()):
+        """Clé : point d'accès + banque + paramètres triés"""
+        signature = hashlib.sha1(urlencode(sorted(params)).encode()).hexdigest()
+        return f"{KEY_PREFIX}:{endpoint}:{bank_db}:{signature}"
+
+    def get_or_compute(self, endpoint, bank_db, compute, params=()):
+        """Réponse en cache pour (endpoint, bank_db, params), sinon compute()"""
+        key = self.make_key(endpoint, bank_db, params)
+        labels = {'endpoint': endpoint, 'bank': bank_db}
+
+        entry = self._read(key, labels)
+        if entry is not None:
+            age = max(time.time() - entry['computed_at'], 0)
+            metrics.observe('response_cache_age_seconds', age, **labels)
+            if age < settings.DASHBOARD_CACHE_FRESH_TTL:
+                metrics.inc('response_cache_requests_total', result='hit', **labels)
+            else:
+                metrics.inc('response_cache_requests_total', result='stale', **labels)
+                self._refresh_in_background(key, compute, labels)
+            return entry['data']
+
+        return self._single_flight(key, compute, labels)
+
+    def _single_flight(self, key, compute, labels):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            metrics.inc('response_cache_requests_total', result='coalesced', **labels)
+            if flight.done.wait(settings.DASHBOARD_CACHE_WAIT_TIMEOUT) and not flight.failed:
+                return flight.result
+            # Calcul partagé en échec ou trop long : calcul propre à la requête
+            return compute()
+
+        metrics.inc('response_cache_requests_total', result='miss', **labels)
+        try:
+            acquired = self._acquire(key, labels)
+            if not acquired:
+                entry = self._wait_for_entry(key, labels)
+                if entry is not None:
+                    flight.result = entry['data']
+                    return flight.result
+            try:
+                flight.result = self._compute_and_store(key, compute, labels)
+            finally:
+                if acquired:
+                    self._release(key)
+            return flight.result
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _refresh_in_background(self, key, compute, labels):
+        with self._lock:
+            if key in self._flights:
+                return
+            flight = self._flights[key] = _Flight()
+        if not self._acquire(key, labels):
+            # Recalcul déjà en cours dans un autre worker
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+            return
+
+        def refresh():
+            try:
+                flight.result = self._compute_and_store(key, compute, labels)
+            except Exception as e:
+                flight.failed = True
+                metrics.inc('response_cache_refresh_errors_total', **labels)
+                logger.error(f"Échec du recalcul en arrière-plan de {key}: {str(e)}")
+            finally:
+                self._release(key)
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight.done.set()
+                # Connexions ouvertes par ce thread : elles ne lui survivent pas
+                connections.close_all()
+
+        threading.Thread(target=refresh, name=f'refresh-{key}', daemon=True).start()
+
+    def _compute_and_store(self, key, compute, labels):
+        started = time.monotonic()
+        data = compute()
+        metrics.observe('response_cache_compute_seconds', time.monotonic() - started, **labels)
+        timeout = settings.DASHBOARD_CACHE_FRESH_TTL + settings.DASHBOARD_CACHE_STALE_TTL
+        try:
+            cache.set(key, {'data': data, 'computed_at': time.time()}, timeout)
+        except Exception as e:
+            metrics.inc('response_cache_errors_total', **labels)
+            logger.error(f"Cache des réponses indisponible ({key}): {str(e)}")
+        return data
+
+    def _read(self, key, labels):
+        try:
+            return cache.get(key)
+        except Exception as e:
+            metrics.inc('response_cache_errors_total', **labels)
+            logger.error(f"Cache des réponses indisponible ({key}): {str(e)}")
+            return None
+
+    def _acquire(self, key, labels):
+        """Verrou de calcul partagé entre workers ; True aussi si le cache est injoignable"""
+        try:
+            return cache.add(f'{key}:lock', 1, settings.DASHBOARD_CACHE_LOCK_TIMEOUT)
+        except Exception as e:
+            metrics.inc('response_cache_errors_total', **labels)
+            logger.error(f"Cache des réponses indisponible ({key}): {str(e)}")
+            return True
+
+    def _release(self, key):
+        try:
+            cache.delete(f'{key}:lock')
+        except Exception:
+            pass
+
+    def _wait_for_entry(self, key, labels):
+        """Entrée écrite par le worker qui détient le verrou, ou None après DASHBOARD_CACHE_WAIT_TIMEOUT"""
+        deadline = time.monotonic() + settings.DASHBOARD_CACHE_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = self._read(key, labels)
+            if entry is not None:
+                return entry
+        return None
+
+
+response_cache = ResponseCache()
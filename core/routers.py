@@ -34,6 +34,11 @@
 #     # Permet les migrations sur les autres bases de données configurées
 #      return db in ['default', 'rasidi', 'gaza','sedad']
 
+from django.conf import settings
+
+from core.tenants import tenant_registry
+
+
 class TenantRouter:
     
     class DatabaseNotFoundError(Exception):
@@ -56,7 +61,11 @@ class TenantRouter:
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         
-        
+        # Une base qui n'appartient à aucune banque enregistrée ne reçoit rien
+        # (sauf la banque des tests, créée par le lanceur de tests)
+        if db not in ('default', settings.TEST_BANK_DATABASE) and not tenant_registry.is_tenant_database(db):
+            return False
+
         # Permet les migrations sur la base de données par défaut pour l'application 'banks'
         if app_label == 'banks':
             return db == 'default'
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TenantTimeout(Exception):
+    """Échéance de l'appel multi-banques dépassée avant le début du travail d'une banque"""
+
+
+class TenantResult:
+    """Résultat d'une banque : status 'ok', 'timeout' ou 'error', durée en secondes"""
+
+    def __init__(self, status, data=None, error=None, duration=None):
+        self.status = status
+        self.data = data
+        self.error = error
+        self.duration = duration
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de threads borné (PLATFORM_FANOUT_WORKERS), partagé par le processus"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PLATFORM_FANOUT_WORKERS,
+                    thread_name_prefix='tenant-fanout',
+                )
+    return _executor
+
+
+@contextmanager
+def statement_timeout(alias, seconds):
+    """
+    Transaction sur alias dont les requêtes sont annulées par PostgreSQL après
+    seconds secondes (SET LOCAL : le réglage disparaît avec la transaction)
+    """
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Au moins 1 ms : 0 désactiverait la limite
+                milliseconds = max(int(seconds * 1000), 1)
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [f'{milliseconds}ms'])
+        yield
+
+
+def fan_out(task, aliases, timeout=None):
+    """
+    Exécute task(alias, remaining) pour chaque banque en parallèle et retourne
+    {alias: TenantResult}. remaining est le temps (secondes) qui reste avant
+    l'échéance commune, à reporter sur les requêtes de la banque (voir
+    statement_timeout). Une banque qui ne répond pas dans timeout secondes est
+    marquée 'timeout' sans retarder les autres : la durée totale est celle de
+    la banque la plus lente, bornée par timeout ; une banque dont le tour
+    arrive après l'échéance n'est pas interrogée. Une erreur sur une banque
+    est rapportée dans son résultat, jamais levée.
+    """
+    timeout = settings.PLATFORM_TENANT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+
+    def run(alias):
+        started = time.monotonic()
+        remaining = deadline - started
+        if remaining <= 0:
+            raise TenantTimeout(f"Pas de réponse en {timeout}s")
+        try:
+            return task(alias, remaining), time.monotonic() - started
+        finally:
+            # Connexion du thread rendue au pool : elle ne lui survit pas
+            connections[alias].close()
+
+    executor = get_executor()
+    futures = {alias: executor.submit(run, alias) for alias in aliases}
+    wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+
+    results = {}
+    for alias, future in futures.items():
+        if not future.done():
+            # Pas encore démarrée : retirée de la file ; en cours : abandonnée
+            # (statement_timeout côté base libère le thread)
+            future.cancel()
+            results[alias] = TenantResult('timeout', error=f"Pas de réponse en {timeout}s", duration=timeout)
+        elif isinstance(future.exception(), TenantTimeout):
+            results[alias] = TenantResult('timeout', error=str(future.exception()), duration=timeout)
+        elif future.exception() is not None:
+            error = future.exception()
+            logger.error(f"Échec de la requête multi-banques sur {alias}: {str(error)}")
+            results[alias] = TenantResult('error', error=str(error))
+        else:
+            data, duration = future.result()
+            results[alias] = TenantResult('ok', data=data, duration=duration)
+            metrics.observe('tenant_fanout_seconds', duration, bank=alias)
+        metrics.inc('tenant_fanout_results_total', bank=alias, status=results[alias].status)
+    return results
@@ -0,0 +1,267 @@
+import copy
+import logging
+import threading
+import time
+
+from decouple import config
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+
+from core.cache_versions import bump_version, get_version
+from core.pooling import close_tenant_pool, tenant_pools
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_VERSION_NAME = 'tenant-registry'
+
+
+class TenantRegistry:
+    """
+    Registre en mémoire des banques (tenants) et de leurs fonctionnalités.
+
+    Les lignes Bank / BankFeature sont chargées une seule fois depuis la base
+    'default' puis servies depuis la mémoire du processus. L'invalidation se fait
+    par les signaux post_save / post_delete (processus courant) et par un tampon
+    de version dans le cache Django (autres workers, avec CACHE_BACKEND='redis'),
+    vérifié au plus toutes les TENANT_REGISTRY_CHECK_INTERVAL secondes.
+
+    Chaque chargement synchronise aussi les alias de connexion : une banque
+    ajoutée devient utilisable via .using(code) sans redémarrage, une banque
+    supprimée disparaît de connections.settings.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (banques, fonctionnalités) publiés ensemble ; None = à recharger
+        self._state = None
+        self._databases = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'TENANT_REGISTRY_CHECK_INTERVAL', 5)
+
+    def _load(self):
+        from apps.banks.models import Bank
+
+        banks = {}
+        features = {}
+        for bank in Bank.objects.using('default').prefetch_related('features'):
+            banks[bank.code] = bank
+            features[bank.code] = {
+                feature.feature_name: feature.is_active
+                for feature in bank.features.all()
+            }
+
+        self._sync_databases({
+            code: build_database_config(bank) for code, bank in banks.items()
+        })
+        self._state = (banks, features)
+        logger.info(f"Registre des tenants chargé: {len(banks)} banque(s)")
+
+    def _ensure_loaded(self):
+        """
+        Retourne l'état (banques, fonctionnalités) à jour. Les lecteurs
+        travaillent sur cet instantané : un invalidate() concurrent ne le
+        modifie pas.
+        """
+        state = self._state
+        if state is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return state
+
+        with self._lock:
+            now = time.monotonic()
+            if self._state is not None and now - self._checked_at < self.check_interval:
+                return self._state
+
+            version = get_version(REGISTRY_VERSION_NAME)
+            if self._state is None or version != self._version:
+                self._load()
+                self._version = version
+            self._checked_at = now
+            return self._state
+
+    def _sync_databases(self, databases):
+        """
+        Aligne connections.settings sur la table Bank. Aucune connexion n'est
+        ouverte ici : Django crée le DatabaseWrapper au premier connections[alias].
+        """
+        registered = connections.settings
+        for alias in set(self._databases) - set(databases):
+            registered.pop(alias, None)
+            close_tenant_pool(alias)
+            logger.info(f"Base du tenant {alias} retirée")
+        for alias, database in databases.items():
+            if self._databases.get(alias) != database:
+                if alias in self._databases:
+                    close_tenant_pool(alias)
+                registered[alias] = copy.deepcopy(database)
+        self._databases = databases
+
+    def get(self, code):
+        """Retourne la banque correspondant au code, ou None"""
+        if not code:
+            return None
+        banks, _ = self._ensure_loaded()
+        return banks.get(code)
+
+    def all(self):
+        """Retourne toutes les banques connues, triées par nom"""
+        banks, _ = self._ensure_loaded()
+        return sorted(banks.values(), key=lambda bank: bank.name)
+
+    def codes(self):
+        banks, _ = self._ensure_loaded()
+        return list(banks)
+
+    def features(self, code):
+        """Retourne {feature_name: is_active} pour une banque"""
+        _, features = self._ensure_loaded()
+        return dict(features.get(code, {}))
+
+    def has_feature(self, code, feature_name):
+        return self.features(code).get(feature_name, False)
+
+    def is_tenant_database(self, alias):
+        """Vrai si l'alias correspond à la base d'une banque enregistrée"""
+        return alias != DEFAULT_DB_ALIAS and self.get(alias) is not None
+
+    def invalidate(self, broadcast=True):
+        """
+        Vide le registre local et, si broadcast, incrémente la version partagée
+        pour que les autres workers rechargent aussi.
+        """
+        with self._lock:
+            # self._databases est conservé pour que le prochain chargement
+            # puisse retirer les alias des banques supprimées
+            self._state = None
+            self._version = None
+            self._checked_at = 0.0
+        if broadcast:
+            bump_version(REGISTRY_VERSION_NAME)
+
+
+def build_database_config(bank):
+    """
+    Construit la configuration de connexion d'une banque à partir de la base
+    'default' (moteur, identifiants, options), surchargée par TENANT_DATABASE
+    puis par les champs de la banque ou les variables DB_*_<CODE>.
+    """
+    suffix = bank.code.upper()
+    overrides = copy.deepcopy(getattr(settings, 'TENANT_DATABASE', {}))
+    database = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+    database['OPTIONS'] = {**database.get('OPTIONS', {}), **overrides.pop('OPTIONS', {})}
+    database.update(overrides)
+    database['NAME'] = bank.db_name or config(f'DB_NAME_{suffix}', default=bank.code)
+    database['HOST'] = bank.db_host or config(f'DB_HOST_{suffix}', default=database['HOST'])
+    database['PORT'] = str(bank.db_port or config(f'DB_PORT_{suffix}', default=database['PORT']))
+    database['TEST'] = {**database.get('TEST', {}), 'NAME': None}
+    return database
+
+
+class TenantDatabases(dict):
+    """
+    Remplace connections.settings : un alias inconnu est cherché dans le
+    registre avant de lever ConnectionDoesNotExist, ce qui permet d'utiliser
+    une banque créée par un autre worker dès la propagation de la version.
+    """
+
+    def __contains__(self, alias):
+        if super().__contains__(alias):
+            return True
+        if alias == DEFAULT_DB_ALIAS or not isinstance(alias, str):
+            return False
+        try:
+            tenant_registry.get(alias)
+        except DatabaseError:
+            return False
+        return super().__contains__(alias)
+
+    def __missing__(self, alias):
+        if alias in self:
+            return super().__getitem__(alias)
+        raise KeyError(alias)
+
+    def __iter__(self):
+        # Copie des clés : un autre thread peut enregistrer une banque pendant
+        # que connections.all() parcourt les alias
+        return iter(list(super().keys()))
+
+
+tenant_registry = TenantRegistry()
+
+
+def install_tenant_databases():
+    """Branche TenantDatabases sur le gestionnaire de connexions (AppConfig.ready)"""
+    if isinstance(connections.settings, TenantDatabases):
+        return
+    databases = TenantDatabases(connections.settings)
+    connections.settings = databases
+    settings.DATABASES = databases
+
+
+# Dernière utilisation de chaque alias, tous threads confondus (pools)
+_last_used = {}
+
+
+def _track_usage(execute, sql, params, many, context):
+    connection = context['connection']
+    connection.tenant_last_used = _last_used[connection.alias] = time.monotonic()
+    return execute(sql, params, many, context)
+
+
+def _connection_created(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS:
+        return
+    connection.tenant_last_used = _last_used[connection.alias] = time.monotonic()
+    if _track_usage not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_usage)
+
+
+def close_idle_tenant_connections(idle_timeout=None):
+    """
+    Ferme et libère les connexions tenant du thread courant restées inutilisées
+    plus de TENANT_IDLE_TIMEOUT secondes (ou déjà fermées par CONN_MAX_AGE),
+    pour qu'un worker ne garde pas un socket ouvert vers chaque banque. En mode
+    pool, le pool d'une banque inactive depuis ce délai est lui aussi fermé.
+    """
+    if idle_timeout is None:
+        idle_timeout = getattr(settings, 'TENANT_IDLE_TIMEOUT', 300)
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        alias = connection.alias
+        if alias == DEFAULT_DB_ALIAS or connection.in_atomic_block:
+            continue
+        last_used = getattr(connection, 'tenant_last_used', now)
+        if connection.connection is not None and now - last_used < idle_timeout:
+            continue
+        connection.close()
+        del connections[alias]
+
+    for alias in tenant_pools():
+        if now - _last_used.get(alias, now) >= idle_timeout:
+            close_tenant_pool(alias)
+            _last_used.pop(alias, None)
+
+
+def _request_finished(sender, **kwargs):
+    close_idle_tenant_connections()
+
+
+connection_created.connect(_connection_created, dispatch_uid='tenant-connection-created')
+request_finished.connect(_request_finished, dispatch_uid='tenant-idle-connections')
+
+
+def resolve_bank(code):
+    """
+    Résout un code banque via le registre. Retourne None si la base 'default'
+    est indisponible ou si la banque n'existe pas.
+    """
+    try:
+        return tenant_registry.get(code)
+    except DatabaseError as e:
+        logger.error(f"Impossible de charger le registre des tenants: {str(e)}")
+        return None
@@ -0,0 +1,26 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.metrics import metrics
+
+
+def metrics_view(request):
+    """
+    Export Prometheus des métriques du processus (pools de connexions par
+    banque, etc.). Protégé par METRICS_TOKEN ; sans jeton configuré, l'export
+    n'est ouvert qu'en DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided, token):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
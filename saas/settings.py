@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -87,6 +89,79 @@ AUTHENTICATION_BACKENDS = [
 
 CHINGUISOFT_VALIDATION_KEY = 'bOD4fydSCjVCfH8d'
 CHINGUISOFT_VALIDATION_TOKEN = '7139PpwryaEXTVPcSi3T3kqsHVX3B0VC'
+# URL de l'API de validation (le faux serveur fake_chinguisoft en local)
+CHINGUISOFT_BASE_URL = config('CHINGUISOFT_BASE_URL', default='https://chinguisoft.com/api/sms/validation')
+# Délais (secondes) : établissement de la connexion, puis attente de la réponse
+CHINGUISOFT_CONNECT_TIMEOUT = config('CHINGUISOFT_CONNECT_TIMEOUT', default=3, cast=float)
+CHINGUISOFT_TIMEOUT = config('CHINGUISOFT_TIMEOUT', default=5, cast=float)
+
+# Stockage des codes OTP (apps.transactions.services.otp_store) : 'memory'
+# (un seul processus, développement) ou 'redis' (partagé entre workers)
+OTP_STORE_BACKEND = config('OTP_STORE_BACKEND', default='memory')
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', default=1, cast=float)
+
+# Cache Django : 'memory' (propre à chaque processus, développement) ou 'redis'
+# (REDIS_URL). Les tampons de version (registre des banques, barèmes de frais)
+# et les verrous du cache des réponses ne sont partagés entre workers qu'avec
+# 'redis' : obligatoire dès que plusieurs processus servent l'application
+CACHE_BACKEND = config('CACHE_BACKEND', default='memory')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'saas',
+            'OPTIONS': {
+                'socket_timeout': REDIS_SOCKET_TIMEOUT,
+                'socket_connect_timeout': REDIS_SOCKET_TIMEOUT,
+            },
+        },
+    }
+elif CACHE_BACKEND == 'memory':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+else:
+    raise ImproperlyConfigured(f"CACHE_BACKEND inconnu : {CACHE_BACKEND}")
+
+# Limitation de débit (core.ratelimit) : seaux à jetons par banque, numéro et
+# IP, en mémoire ou dans Redis. Débits 'N/période' : s, m, h, d (ex. '3/10m')
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_BACKEND = config('RATELIMIT_BACKEND', default='memory')
+# Nombre de proxys de confiance devant l'application : l'IP du client est lue
+# à cette position depuis la fin de X-Forwarded-For. 0 : REMOTE_ADDR seul,
+# l'en-tête (modifiable par le client) est ignoré
+NUM_PROXIES = config('NUM_PROXIES', default=0, cast=int)
+RATELIMITS = {
+    'otp_send': {'phone': '3/10m', 'ip': '20/m'},
+    'otp_verify': {'phone': '5/m', 'ip': '30/m'},
+    'password_reset_send': {'phone': '3/10m', 'ip': '20/m'},
+    'password_reset_verify': {'phone': '5/m', 'ip': '30/m'},
+    'login': {'phone': '10/m', 'ip': '60/m'},
+}
+
+# File d'envoi des SMS (commande sms_worker) : threads d'envoi, tentatives,
+# backoff exponentiel (secondes) et marge (secondes) ajoutée au bail d'un lot
+# réclamé, lui-même dimensionné sur les délais de la passerelle (voir
+# apps.transactions.services.sms_outbox.lease_seconds)
+SMS_WORKER_THREADS = config('SMS_WORKER_THREADS', default=8, cast=int)
+SMS_MAX_ATTEMPTS = config('SMS_MAX_ATTEMPTS', default=5, cast=int)
+SMS_RETRY_BASE_DELAY = config('SMS_RETRY_BASE_DELAY', default=2, cast=float)
+SMS_RETRY_MAX_DELAY = config('SMS_RETRY_MAX_DELAY', default=60, cast=float)
+SMS_LEASE_SECONDS = config('SMS_LEASE_SECONDS', default=30, cast=int)
+
+# Client de la passerelle SMS (apps.transactions.services.sms_gateway) :
+# connexions keep-alive conservées, et disjoncteur ouvert pendant
+# SMS_CIRCUIT_RESET_TIMEOUT secondes quand au moins SMS_CIRCUIT_FAILURE_RATE
+# des SMS_CIRCUIT_WINDOW derniers appels échouent (minimum SMS_CIRCUIT_MIN_CALLS)
+SMS_GATEWAY_POOL_SIZE = config('SMS_GATEWAY_POOL_SIZE', default=SMS_WORKER_THREADS, cast=int)
+SMS_CIRCUIT_FAILURE_RATE = config('SMS_CIRCUIT_FAILURE_RATE', default=0.5, cast=float)
+SMS_CIRCUIT_WINDOW = config('SMS_CIRCUIT_WINDOW', default=20, cast=int)
+SMS_CIRCUIT_MIN_CALLS = config('SMS_CIRCUIT_MIN_CALLS', default=10, cast=int)
+SMS_CIRCUIT_RESET_TIMEOUT = config('SMS_CIRCUIT_RESET_TIMEOUT', default=30, cast=float)
 
 
 ROOT_URLCONF = 'saas.urls'
@@ -134,6 +209,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'NUM_PROXIES': NUM_PROXIES,
     
 }
 SIMPLE_JWT = {
@@ -213,34 +289,105 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT_SAAS'),
-    },
-    'rasidi': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME_RASIDI'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST_RASIDI'),
-        'PORT': config('DB_PORT_RASIDI'),
-    },
-    'gaza': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME_GAZA'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST_GAZA'),
-        'PORT': config('DB_PORT_GAZA'),
-    },
-    'sedad': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME_SEDAD'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST_SEDAD'),
-        'PORT': config('DB_PORT_SEDAD'),
     }
 }
 
+# Banque des tests : avec manage.py test, le lanceur de tests crée en plus la
+# base test_bank (serveur de 'default'), la migre comme une banque puis la
+# supprime. Les tests du moteur d'écritures et des réservations s'y exécutent.
+TEST_BANK_DATABASE = 'test_bank'
+if sys.argv[1:2] == ['test']:
+    DATABASES[TEST_BANK_DATABASE] = {**DATABASES['default'], 'TEST': {'NAME': TEST_BANK_DATABASE}}
+
 DATABASE_ROUTERS = ['core.routers.TenantRouter']
+
+# Registre des tenants (core.tenants) : intervalle en secondes entre deux
+# vérifications du tampon de version partagé dans le cache
+TENANT_REGISTRY_CHECK_INTERVAL = config('TENANT_REGISTRY_CHECK_INTERVAL', default=5, cast=int)
+# Les bases des banques ne sont plus déclarées ici : chaque ligne Bank devient
+# un alias (son code) qui hérite de 'default' surchargé par TENANT_DATABASE,
+# puis par Bank.db_name/db_host/db_port ou DB_NAME_<CODE>/DB_HOST_<CODE>/DB_PORT_<CODE>
+TENANT_DATABASE = {
+    'CONN_HEALTH_CHECKS': config('TENANT_DB_HEALTH_CHECKS', default=True, cast=bool),
+    'CONN_MAX_AGE': config('TENANT_DB_CONN_MAX_AGE', default=0, cast=int),
+}
+
+# Pool psycopg par banque (core.pooling) : une connexion empruntée par requête
+# au lieu d'une poignée de main TCP + authentification. Incompatible avec
+# CONN_MAX_AGE, forcé à 0 dans ce mode.
+TENANT_DB_POOL = config('TENANT_DB_POOL', default=False, cast=bool)
+if TENANT_DB_POOL:
+    TENANT_DATABASE['CONN_MAX_AGE'] = 0
+    TENANT_DATABASE['OPTIONS'] = {
+        'pool': {
+            'min_size': config('TENANT_DB_POOL_MIN_SIZE', default=1, cast=int),
+            'max_size': config('TENANT_DB_POOL_MAX_SIZE', default=10, cast=int),
+            # Attente maximale d'une connexion libre avant erreur (secondes)
+            'timeout': config('TENANT_DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('TENANT_DB_POOL_MAX_IDLE', default=300, cast=float),
+            'max_lifetime': config('TENANT_DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+        },
+    }
+
+# Derrière PgBouncer en mode "transaction pooling" : pas de curseurs serveur
+# ni de requêtes préparées, qui ne survivent pas à un changement de backend
+TENANT_DB_PGBOUNCER = config('TENANT_DB_PGBOUNCER', default=False, cast=bool)
+if TENANT_DB_PGBOUNCER:
+    TENANT_DATABASE['DISABLE_SERVER_SIDE_CURSORS'] = True
+    TENANT_DATABASE.setdefault('OPTIONS', {})['prepare_threshold'] = None
+
+# Jeton attendu par /metrics/ (en-tête "Authorization: Bearer <jeton>")
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Connexion tenant fermée et libérée après ce délai d'inactivité (secondes)
+TENANT_IDLE_TIMEOUT = config('TENANT_IDLE_TIMEOUT', default=300, cast=int)
+
+# Cache des réponses du tableau de bord (core.response_cache), par banque et
+# par paramètres : fraîcheur (secondes) pendant laquelle une réponse est servie
+# sans recalcul, puis durée supplémentaire pendant laquelle elle reste servie
+# pendant qu'un seul recalcul tourne en arrière-plan
+DASHBOARD_CACHE_FRESH_TTL = config('DASHBOARD_CACHE_FRESH_TTL', default=30, cast=int)
+DASHBOARD_CACHE_STALE_TTL = config('DASHBOARD_CACHE_STALE_TTL', default=300, cast=int)
+# Attente maximale (secondes) du calcul en cours d'une requête identique, et
+# durée de vie du verrou de calcul partagé entre workers (CACHE_BACKEND='redis'
+# uniquement : avec 'memory', chaque processus calcule de son côté)
+DASHBOARD_CACHE_WAIT_TIMEOUT = config('DASHBOARD_CACHE_WAIT_TIMEOUT', default=10, cast=float)
+DASHBOARD_CACHE_LOCK_TIMEOUT = config('DASHBOARD_CACHE_LOCK_TIMEOUT', default=60, cast=int)
+
+# Tableau de bord multi-banques (core.tenant_fanout) : threads interrogeant les
+# banques en parallèle (au moins le nombre de banques pour ne pas les mettre en
+# file), et délai (secondes) au-delà duquel une banque est rapportée absente
+PLATFORM_FANOUT_WORKERS = config('PLATFORM_FANOUT_WORKERS', default=8, cast=int)
+PLATFORM_TENANT_TIMEOUT = config('PLATFORM_TENANT_TIMEOUT', default=5.0, cast=float)
+
+# Générateur d'identifiants (core.ids) : numéro de nœud 0..1023, unique par
+# processus écrivain. Sans Redis (CACHE_BACKEND='memory' : développement,
+# processus unique), nœud fixe 0. Avec Redis, loué dans REDIS_URL pour
+# ID_NODE_LEASE_TTL secondes et renouvelé en continu : si Redis reste
+# injoignable plus longtemps, le bail est perdu et aucun identifiant n'est
+# produit tant qu'un nouveau bail n'est pas obtenu (unicité d'abord).
+# Définir ID_GENERATOR_NODE pour imposer un nœud fixe.
+ID_GENERATOR_NODE = config('ID_GENERATOR_NODE', default=None if CACHE_BACKEND == 'redis' else 0)
+ID_NODE_LEASE_TTL = config('ID_NODE_LEASE_TTL', default=60, cast=int)
+
+# Barème de frais compilé (apps.transactions.services.fee_schedule) : délai
+# max en secondes avant qu'un worker voie une modification faite par un autre
+# (tampon de version dans le cache : CACHE_BACKEND='redis' entre processus)
+FEE_SCHEDULE_CHECK_INTERVAL = config('FEE_SCHEDULE_CHECK_INTERVAL', default=5, cast=int)
+
+# Purge des lignes expirées (commande sweep_expired) : taille d'un lot DELETE,
+# lots max par table et par passage, délai entre deux passages en mode --loop
+EXPIRY_SWEEP_BATCH_SIZE = config('EXPIRY_SWEEP_BATCH_SIZE', default=500, cast=int)
+EXPIRY_SWEEP_MAX_BATCHES = config('EXPIRY_SWEEP_MAX_BATCHES', default=20, cast=int)
+EXPIRY_SWEEP_INTERVAL = config('EXPIRY_SWEEP_INTERVAL', default=60, cast=float)
+
+# Agrégats quotidiens des transactions (transaction_daily_rollup) : lignes par
+# clé (jour, type, statut) entre lesquelles se répartissent les écritures
+TRANSACTION_ROLLUP_SHARDS = config('TRANSACTION_ROLLUP_SHARDS', default=8, cast=int)
+
+# Compteurs de comptes (account_summary) : lignes par clé (type, statut, jour
+# de création) entre lesquelles se répartissent les mouvements de solde
+ACCOUNT_SUMMARY_SHARDS = config('ACCOUNT_SUMMARY_SHARDS', default=8, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -4,9 +4,11 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path,include
 from rest_framework_simplejwt.views import TokenObtainPairView,TokenRefreshView
+from core.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     # path('api/transactions/', include('apps.transactions.urls')),
     path('api/', include('apps.users.urls')),
     path('api/', include('apps.accounts.urls')),